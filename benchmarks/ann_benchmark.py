@@ -0,0 +1,234 @@
+import argparse
+import csv
+import json
+import os
+import sys
+import tempfile
+import time
+
+import faiss
+import numpy as np
+
+from bedrock_standin import add_config_arguments, config_from_arguments
+from bedrock_standin import serve_in_background
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+SAMPLE_CSV = os.path.join(REPO_ROOT, "datasets", "well_arch_text_sample.csv")
+
+
+def read_passages(max_chars=1000):
+    """
+    Splits the Well-Architected sample into passages of up to max_chars,
+    breaking on paragraph boundaries where possible.
+    """
+    csv.field_size_limit(sys.maxsize)
+    passages = []
+    with open(SAMPLE_CSV, newline="", encoding="utf-8") as csv_file:
+        for row in csv.DictReader(csv_file):
+            passage = ""
+            for paragraph in row["page_content"].split("\n\n"):
+                paragraph = paragraph.strip()
+                if not paragraph:
+                    continue
+                if passage and len(passage) + len(paragraph) + 2 > max_chars:
+                    passages.append(passage)
+                    passage = ""
+                passage = f"{passage}\n\n{paragraph}" if passage else paragraph
+                while len(passage) > max_chars:
+                    passages.append(passage[:max_chars])
+                    passage = passage[max_chars:]
+            if passage:
+                passages.append(passage)
+    return list(dict.fromkeys(passages))
+
+
+def embed_passages(passages, model_id, cache_dir, max_workers):
+    """Embeds the passages, reusing vectors cached by earlier runs."""
+    from bedrock_client import SINGLE_ATTEMPT, get_client
+    from embedding_cache import CachedEmbeddings
+    from embedding_engine import EmbeddingEngine
+
+    engine = EmbeddingEngine(
+        get_client("bedrock-runtime", "us-east-1", **SINGLE_ATTEMPT),
+        model_id,
+        max_workers=max_workers,
+    )
+    embeddings = CachedEmbeddings(engine, model_id, cache_dir=cache_dir)
+    start_time = time.perf_counter()
+    vectors = np.asarray(embeddings.embed_documents(passages), dtype=np.float32)
+    print(
+        f"Embedded {len(passages)} passages in {time.perf_counter() - start_time:.1f}s "
+        f"({embeddings.stats()})"
+    )
+    return vectors
+
+
+def split_queries(vectors, query_count, scale, seed=0):
+    """
+    Holds query_count vectors out of the corpus to use as queries. With
+    scale, the corpus is grown to that many rows with noisy copies of the
+    real vectors, to see how the indexes behave on a larger corpus.
+    """
+    rng = np.random.default_rng(seed)
+    order = rng.permutation(len(vectors))
+    queries = vectors[order[:query_count]]
+    corpus = vectors[order[query_count:]]
+    if scale and scale > len(corpus):
+        noise = corpus.std() * 0.1
+        copies = corpus[rng.integers(0, len(corpus), scale - len(corpus))]
+        copies = copies + rng.normal(0, noise, copies.shape).astype(np.float32)
+        corpus = np.concatenate([corpus, copies])
+    return np.ascontiguousarray(corpus), np.ascontiguousarray(queries)
+
+
+def search_one_by_one(index, queries, k):
+    """Searches the queries one at a time, as a RAG request does."""
+    found = np.empty((len(queries), k), dtype=np.int64)
+    latencies = []
+    for position, query in enumerate(queries):
+        start_time = time.perf_counter()
+        _, neighbours = index.search(query[None, :], k)
+        latencies.append(time.perf_counter() - start_time)
+        found[position] = neighbours[0]
+    return found, latencies
+
+
+def recall_at_k(found, truth):
+    k = truth.shape[1]
+    hits = sum(len(set(row) & set(expected)) for row, expected in zip(found, truth))
+    return hits / (len(truth) * k)
+
+
+def run_benchmarks(corpus, queries, k, index_types, nprobes, ef_searches):
+    """
+    Builds every index type and searches it at each search setting.
+    Returns one report per (index type, setting).
+    """
+    from ann_index import build_ann_index, index_bytes, set_search_params
+    from model_router import percentile
+
+    exact = faiss.IndexFlatL2(corpus.shape[1])
+    exact.add(corpus)
+    _, truth = exact.search(queries, k)
+
+    results = []
+    for index_type in index_types:
+        start_time = time.perf_counter()
+        try:
+            index = build_ann_index(corpus, index_type)
+        except ValueError as error:
+            print(f"Skipping {index_type}: {error}")
+            continue
+        build_seconds = time.perf_counter() - start_time
+        memory = index_bytes(index)
+
+        if index_type in ("ivf_flat", "ivf_pq"):
+            settings = [{"nprobe": nprobe} for nprobe in nprobes]
+        elif index_type == "hnsw":
+            settings = [{"ef_search": ef_search} for ef_search in ef_searches]
+        else:
+            settings = [{}]
+
+        for setting in settings:
+            set_search_params(index, **setting)
+            found, latencies = search_one_by_one(index, queries, k)
+            report = {
+                "index_type": index_type,
+                **setting,
+                "rows": len(corpus),
+                f"recall@{k}": recall_at_k(found, truth),
+                "qps": len(latencies) / sum(latencies),
+                "p50_ms": percentile(latencies, 0.5) * 1000,
+                "p99_ms": percentile(latencies, 0.99) * 1000,
+                "memory_mb": memory / 2**20,
+                "build_seconds": build_seconds,
+            }
+            print_report(report, k)
+            results.append(report)
+    return results
+
+
+def print_report(report, k):
+    setting = ", ".join(
+        f"{name}={report[name]}" for name in ("nprobe", "ef_search") if name in report
+    )
+    print(
+        f"{report['index_type']:<9} {setting:<14} "
+        f"recall@{k} {report[f'recall@{k}']:.3f}  "
+        f"{report['qps']:9.0f} q/s  "
+        f"p50 {report['p50_ms']:.3f} ms  p99 {report['p99_ms']:.3f} ms  "
+        f"{report['memory_mb']:8.1f} MB  build {report['build_seconds']:.1f}s",
+        flush=True,
+    )
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Compare recall, speed and size of ANN index types on the "
+        "Well-Architected sample embeddings."
+    )
+    parser.add_argument("--model-id", default="amazon.titan-embed-text-v1")
+    parser.add_argument(
+        "--standin",
+        action="store_true",
+        help="Embed with an in-process Bedrock stand-in (synthetic vectors).",
+    )
+    parser.add_argument("--endpoint-url", help="Embed with a running stand-in.")
+    parser.add_argument("--index-types", default="flat,ivf_flat,ivf_pq,hnsw")
+    parser.add_argument("--nprobe", default="1,4,16,64")
+    parser.add_argument("--ef-search", default="16,32,64,128")
+    parser.add_argument("--k", type=int, default=10)
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument(
+        "--scale", type=int, help="Grow the corpus to this many rows with copies."
+    )
+    parser.add_argument(
+        "--threads", type=int, default=1, help="faiss threads per search."
+    )
+    parser.add_argument("--max-workers", type=int, default=16)
+    parser.add_argument("--output", help="Write the results as JSON to this path.")
+    add_config_arguments(parser)
+    args = parser.parse_args()
+
+    sys.path.insert(0, os.path.join(REPO_ROOT, "rag_examples"))
+    sys.path.insert(0, os.path.join(REPO_ROOT, "full_code"))
+
+    endpoint_url = args.endpoint_url
+    if args.standin and endpoint_url is None:
+        server = serve_in_background(config_from_arguments(args))
+        endpoint_url = server.url
+        print(f"Bedrock stand-in listening on {endpoint_url}")
+    cache_dir = None
+    if endpoint_url:
+        os.environ["BEDROCK_ENDPOINT_URL"] = endpoint_url
+        os.environ.setdefault("AWS_ACCESS_KEY_ID", "standin")
+        os.environ.setdefault("AWS_SECRET_ACCESS_KEY", "standin")
+        # Synthetic vectors must not end up in the real embedding cache.
+        cache_dir = tempfile.mkdtemp(prefix="ann_benchmark_")
+
+    from embedding_cache import DEFAULT_CACHE_DIR
+
+    passages = read_passages()
+    vectors = embed_passages(
+        passages, args.model_id, cache_dir or DEFAULT_CACHE_DIR, args.max_workers
+    )
+    corpus, queries = split_queries(vectors, args.queries, args.scale)
+    print(
+        f"{len(corpus)} vectors of {corpus.shape[1]} dimensions, "
+        f"{len(queries)} queries"
+    )
+
+    faiss.omp_set_num_threads(args.threads)
+    results = run_benchmarks(
+        corpus,
+        queries,
+        args.k,
+        [name for name in args.index_types.split(",") if name],
+        [int(value) for value in args.nprobe.split(",")],
+        [int(value) for value in args.ef_search.split(",")],
+    )
+
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as output_file:
+            json.dump(results, output_file, indent=2)
+        print(f"Results written to {args.output}")
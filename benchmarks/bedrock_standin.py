@@ -0,0 +1,712 @@
+import argparse
+import base64
+import hashlib
+import io
+import itertools
+import json
+import math
+import posixpath
+import random
+import re
+import struct
+import threading
+import time
+import zlib
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, unquote, urlparse
+from xml.sax.saxutils import escape
+
+
+def _tiny_png():
+    """Builds a valid 1x1 white PNG so image responses decode cleanly."""
+
+    def chunk(kind, data):
+        return (
+            struct.pack("!I", len(data))
+            + kind
+            + data
+            + struct.pack("!I", zlib.crc32(kind + data))
+        )
+
+    header = struct.pack("!IIBBBBB", 1, 1, 8, 2, 0, 0, 0)
+    pixels = zlib.compress(b"\x00\xff\xff\xff")
+    png = (
+        b"\x89PNG\r\n\x1a\n"
+        + chunk(b"IHDR", header)
+        + chunk(b"IDAT", pixels)
+        + chunk(b"IEND", b"")
+    )
+    return base64.b64encode(png).decode("utf-8")
+
+
+# Returned by image models.
+TINY_PNG = _tiny_png()
+
+WORDS = (
+    "amazon bedrock model token latency prompt answer document summary "
+    "service region request stream cache index vector chunk embedding"
+).split()
+
+JOB_ARN_PREFIX = "arn:aws:bedrock:us-east-1:000000000000:model-invocation-job"
+
+EMBEDDING_DIMENSIONS = {
+    "amazon.titan-embed-text-v1": 1536,
+    "amazon.titan-embed-text-v2:0": 1024,
+}
+
+
+class StandinConfig:
+    """
+    Behaviour of the stand-in. Latencies are log-normal with the given
+    median (seconds) and sigma, so the tail can be tuned independently.
+    """
+
+    def __init__(
+        self,
+        latency_median=0.5,
+        latency_sigma=0.5,
+        ttft_median=0.2,
+        ttft_sigma=0.4,
+        tokens_per_second=80.0,
+        stream_chunk_tokens=4,
+        output_tokens=60,
+        throttle_rate=0.0,
+        error_rate=0.0,
+        seed=0,
+    ):
+        self.latency_median = latency_median
+        self.latency_sigma = latency_sigma
+        self.ttft_median = ttft_median
+        self.ttft_sigma = ttft_sigma
+        self.tokens_per_second = tokens_per_second
+        self.stream_chunk_tokens = stream_chunk_tokens
+        self.output_tokens = output_tokens
+        self.throttle_rate = throttle_rate
+        self.error_rate = error_rate
+        self.seed = seed
+        self._rng = random.Random(seed)
+        self._rng_lock = threading.Lock()
+
+    def sample(self, median, sigma):
+        """Draws a log-normal delay; a median of 0 disables the delay."""
+        if median <= 0:
+            return 0.0
+        with self._rng_lock:
+            return median * math.exp(self._rng.gauss(0, sigma))
+
+    def roll(self, rate):
+        with self._rng_lock:
+            return self._rng.random() < rate
+
+
+def estimate_tokens(text):
+    return max(1, len(text) // 4)
+
+
+def synthetic_text(seed_bytes, tokens):
+    """Deterministic filler text: the same request always gets the same answer."""
+    rng = random.Random(hashlib.sha256(seed_bytes).digest())
+    return " ".join(rng.choice(WORDS) for _ in range(tokens))
+
+
+def synthetic_embedding(text, dimensions):
+    rng = random.Random(hashlib.sha256(text.encode("utf-8")).digest())
+    vector = [rng.gauss(0, 1) for _ in range(dimensions)]
+    norm = math.sqrt(sum(value * value for value in vector)) or 1.0
+    return [value / norm for value in vector]
+
+
+def synthetic_tool_input(schema, rng, request_text, name=None):
+    """Builds a value that satisfies a JSON schema, for forced tool use."""
+    schema_type = schema.get("type")
+    if "enum" in schema:
+        return rng.choice(schema["enum"])
+    if schema_type == "object":
+        return {
+            key: synthetic_tool_input(value, rng, request_text, key)
+            for key, value in schema.get("properties", {}).items()
+        }
+    if schema_type == "array":
+        # Numbered questions ("1. ...") get one item each.
+        numbers = re.findall(r"^(\d+)\. ", request_text, re.MULTILINE) or ["1"]
+        items = []
+        for number in numbers:
+            item = synthetic_tool_input(schema.get("items", {}), rng, request_text)
+            if isinstance(item, dict) and "id" in item:
+                item["id"] = int(number)
+            items.append(item)
+        return items
+    if schema_type == "integer":
+        return rng.randint(1, 10)
+    if schema_type == "number":
+        minimum = schema.get("minimum", 0.0)
+        maximum = schema.get("maximum", 1.0)
+        return round(rng.uniform(minimum, maximum), 3)
+    if schema_type == "boolean":
+        return rng.random() < 0.5
+    return " ".join(rng.choice(WORDS) for _ in range(6))
+
+
+def encode_event(event_type, payload):
+    """Encodes one message in the AWS event stream binary format."""
+    headers = b""
+    for name, value in (
+        (":event-type", event_type),
+        (":content-type", "application/json"),
+        (":message-type", "event"),
+    ):
+        name_bytes = name.encode("utf-8")
+        value_bytes = value.encode("utf-8")
+        headers += struct.pack("!B", len(name_bytes)) + name_bytes
+        # Header value type 7 is a string with a 2-byte length prefix.
+        headers += struct.pack("!BH", 7, len(value_bytes)) + value_bytes
+
+    payload_bytes = json.dumps(payload).encode("utf-8")
+    total_length = 12 + len(headers) + len(payload_bytes) + 4
+    prelude = struct.pack("!II", total_length, len(headers))
+    prelude = prelude + struct.pack("!I", zlib.crc32(prelude))
+    message = prelude + headers + payload_bytes
+    return message + struct.pack("!I", zlib.crc32(message))
+
+
+def _request_text(body):
+    """Concatenates every text block of a converse request."""
+    texts = [block.get("text", "") for block in body.get("system", [])]
+    for message in body.get("messages", []):
+        texts.extend(block.get("text", "") for block in message.get("content", []))
+    return "\n".join(texts)
+
+
+def usage_block(input_tokens, output_tokens):
+    return {
+        "inputTokens": input_tokens,
+        "outputTokens": output_tokens,
+        "totalTokens": input_tokens + output_tokens,
+    }
+
+
+def invoke_response(config, model_id, body, raw_body):
+    """
+    Builds the invoke_model response body for a request.
+    Returns (payload, latency_factor), the factor scaling the sampled latency.
+    """
+    if model_id.startswith("amazon.titan-embed"):
+        text = body.get("inputText", "")
+        dimensions = body.get("dimensions", EMBEDDING_DIMENSIONS.get(model_id, 1024))
+        payload = {
+            "embedding": synthetic_embedding(text, dimensions),
+            "inputTextTokenCount": estimate_tokens(text),
+        }
+        # Embeddings are much faster than generation.
+        return payload, 0.1
+
+    if "taskType" in body:
+        count = body.get("imageGenerationConfig", {}).get("numberOfImages", 1)
+        return {"images": [TINY_PNG] * count}, 4
+
+    if "anthropic_version" in body:
+        output_tokens = min(config.output_tokens, body.get("max_tokens", 4096))
+        payload = {
+            "type": "message",
+            "role": "assistant",
+            "content": [
+                {"type": "text", "text": synthetic_text(raw_body, output_tokens)}
+            ],
+            "stop_reason": "end_turn",
+            "usage": {
+                "input_tokens": estimate_tokens(raw_body.decode("utf-8")),
+                "output_tokens": output_tokens,
+            },
+        }
+        return payload, 1
+
+    # Nova "messages-v1" invoke format.
+    max_tokens = body.get("inferenceConfig", {}).get("maxTokens")
+    output_tokens = min(config.output_tokens, max_tokens or config.output_tokens)
+    payload = {
+        "output": {
+            "message": {
+                "role": "assistant",
+                "content": [{"text": synthetic_text(raw_body, output_tokens)}],
+            }
+        },
+        "stopReason": "end_turn",
+        "usage": usage_block(estimate_tokens(_request_text(body)), output_tokens),
+    }
+    return payload, 1
+
+
+def _read_chunks(stream):
+    """Reads a chunked body (HTTP or aws-chunked) up to its last chunk."""
+    body = b""
+    while True:
+        size_line = stream.readline().split(b";")[0].strip()
+        size = int(size_line or b"0", 16)
+        if size == 0:
+            # Skip trailers, e.g. x-amz-checksum-crc32, up to the blank line.
+            while stream.readline().strip():
+                pass
+            return body
+        body += stream.read(size)
+        stream.readline()
+
+
+def parse_s3_uri(uri):
+    """Splits "s3://bucket/prefix" into (bucket, prefix)."""
+    bucket, _, prefix = uri.removeprefix("s3://").partition("/")
+    return bucket, prefix
+
+
+class StandinHandler(BaseHTTPRequestHandler):
+    """
+    Serves the subset of the Bedrock runtime REST API the workshop uses, plus
+    path-style S3 objects and batch inference jobs from the control plane.
+    """
+
+    protocol_version = "HTTP/1.1"
+    server_version = "BedrockStandin/1.0"
+
+    def log_message(self, format, *args):
+        pass
+
+    @property
+    def config(self):
+        return self.server.config
+
+    def _read_body(self):
+        if "chunked" in self.headers.get("Transfer-Encoding", ""):
+            body = _read_chunks(self.rfile)
+        else:
+            length = int(self.headers.get("Content-Length") or 0)
+            body = self.rfile.read(length) if length else b""
+        # S3 uploads with checksums wrap the payload in aws-chunked framing.
+        if "aws-chunked" in self.headers.get("Content-Encoding", ""):
+            body = _read_chunks(io.BytesIO(body))
+        return body
+
+    def _send_json(self, status, payload, extra_headers=None):
+        body = json.dumps(payload).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        for key, value in (extra_headers or {}).items():
+            self.send_header(key, value)
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _send_error(self, status, error_type, message):
+        self._send_json(
+            status,
+            {"message": message},
+            {"x-amzn-ErrorType": f"{error_type}:http://internal.amazon.com/coral/"},
+        )
+
+    def _injected_failure(self):
+        """Returns True (and responds) if this request should fail."""
+        if self.config.roll(self.config.throttle_rate):
+            self._send_error(429, "ThrottlingException", "Too many requests")
+            return True
+        if self.config.roll(self.config.error_rate):
+            self._send_error(500, "InternalServerException", "Injected failure")
+            return True
+        return False
+
+    def _send_s3_error(self, status, code, message):
+        body = (
+            f"<Error><Code>{code}</Code><Message>{escape(message)}</Message></Error>"
+        ).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/xml")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _s3_get(self, url):
+        """GetObject, or ListObjectsV2 when the path is only a bucket."""
+        bucket, _, key = unquote(url.path).lstrip("/").partition("/")
+        if key:
+            data = self.server.get_object(bucket, key)
+            if data is None:
+                self._send_s3_error(404, "NoSuchKey", f"No object {key}")
+                return
+            self.send_response(200)
+            self.send_header("Content-Type", "application/octet-stream")
+            self.send_header("Content-Length", str(len(data)))
+            self.end_headers()
+            self.wfile.write(data)
+            return
+
+        prefix = parse_qs(url.query).get("prefix", [""])[0]
+        contents = "".join(
+            f"<Contents><Key>{escape(object_key)}</Key><Size>{size}</Size>"
+            "<LastModified>2024-01-01T00:00:00.000Z</LastModified></Contents>"
+            for object_key, size in self.server.list_objects(bucket, prefix)
+        )
+        body = (
+            '<?xml version="1.0" encoding="UTF-8"?>'
+            '<ListBucketResult xmlns="http://s3.amazonaws.com/doc/2006-03-01/">'
+            f"<Name>{escape(bucket)}</Name><Prefix>{escape(prefix)}</Prefix>"
+            f"<IsTruncated>false</IsTruncated>{contents}</ListBucketResult>"
+        ).encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", "application/xml")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _create_job(self, request):
+        job = self.server.create_job(request)
+        self._send_json(200, {"jobArn": job["jobArn"]})
+
+    def _get_job(self, job_identifier):
+        job = self.server.get_job(job_identifier)
+        if job is None:
+            self._send_error(
+                404, "ResourceNotFoundException", f"No job {job_identifier}"
+            )
+            return
+        self._send_json(200, job)
+
+    def do_GET(self):
+        url = urlparse(self.path)
+        if url.path == "/async-invoke":
+            self._send_json(200, {"asyncInvokeSummaries": []})
+        elif url.path.startswith("/model-invocation-job/"):
+            self._get_job(unquote(url.path[len("/model-invocation-job/") :]))
+        else:
+            self._s3_get(url)
+
+    def do_PUT(self):
+        raw_body = self._read_body()
+        bucket, _, key = unquote(urlparse(self.path).path).lstrip("/").partition("/")
+        if key:
+            self.server.put_object(bucket, key, raw_body)
+        etag = hashlib.md5(raw_body).hexdigest()
+        self.send_response(200)
+        self.send_header("ETag", f'"{etag}"')
+        self.send_header("Content-Length", "0")
+        self.end_headers()
+
+    def do_POST(self):
+        raw_body = self._read_body()
+        path = urlparse(self.path).path
+        if path == "/model-invocation-job":
+            self._create_job(json.loads(raw_body))
+            return
+        match = re.fullmatch(r"/model/(.+)/(converse|converse-stream|invoke)", path)
+        if match is None:
+            self._send_error(404, "ResourceNotFoundException", f"No route for {path}")
+            return
+
+        model_id = unquote(match.group(1))
+        operation = match.group(2)
+        if self._injected_failure():
+            return
+
+        body = json.loads(raw_body or b"{}")
+        if operation == "converse":
+            self._converse(model_id, body, raw_body)
+        elif operation == "converse-stream":
+            self._converse_stream(model_id, body, raw_body)
+        else:
+            self._invoke(model_id, body, raw_body)
+
+    def _output_tokens(self, body):
+        max_tokens = body.get("inferenceConfig", {}).get("maxTokens")
+        if max_tokens:
+            return min(self.config.output_tokens, max_tokens)
+        return self.config.output_tokens
+
+    def _tool_use(self, body, raw_body):
+        tool = body["toolConfig"]["tools"][0]["toolSpec"]
+        rng = random.Random(hashlib.sha256(raw_body).digest())
+        tool_input = synthetic_tool_input(
+            tool["inputSchema"]["json"], rng, _request_text(body)
+        )
+        return {
+            "toolUseId": "tooluse_" + hashlib.sha256(raw_body).hexdigest()[:20],
+            "name": tool["name"],
+            "input": tool_input,
+        }
+
+    def _converse(self, model_id, body, raw_body):
+        latency = self.config.sample(
+            self.config.latency_median, self.config.latency_sigma
+        )
+        time.sleep(latency)
+        input_tokens = estimate_tokens(_request_text(body))
+        output_tokens = self._output_tokens(body)
+
+        if "toolConfig" in body:
+            content = [{"toolUse": self._tool_use(body, raw_body)}]
+            stop_reason = "tool_use"
+        else:
+            content = [{"text": synthetic_text(raw_body, output_tokens)}]
+            stop_reason = "end_turn"
+
+        self._send_json(
+            200,
+            {
+                "output": {"message": {"role": "assistant", "content": content}},
+                "stopReason": stop_reason,
+                "usage": usage_block(input_tokens, output_tokens),
+                "metrics": {"latencyMs": int(latency * 1000)},
+            },
+        )
+
+    def _write_chunk(self, data):
+        self.wfile.write(f"{len(data):x}\r\n".encode("ascii") + data + b"\r\n")
+        self.wfile.flush()
+
+    def _converse_stream(self, model_id, body, raw_body):
+        start_time = time.perf_counter()
+        input_tokens = estimate_tokens(_request_text(body))
+        output_tokens = self._output_tokens(body)
+
+        self.send_response(200)
+        self.send_header("Content-Type", "application/vnd.amazon.eventstream")
+        self.send_header("Transfer-Encoding", "chunked")
+        self.end_headers()
+
+        time.sleep(self.config.sample(self.config.ttft_median, self.config.ttft_sigma))
+        self._write_chunk(encode_event("messageStart", {"role": "assistant"}))
+
+        if "toolConfig" in body:
+            tool_use = self._tool_use(body, raw_body)
+            self._write_chunk(
+                encode_event(
+                    "contentBlockStart",
+                    {
+                        "contentBlockIndex": 0,
+                        "start": {
+                            "toolUse": {
+                                "toolUseId": tool_use["toolUseId"],
+                                "name": tool_use["name"],
+                            }
+                        },
+                    },
+                )
+            )
+            serialized = json.dumps(tool_use["input"])
+            pieces = [serialized[i : i + 16] for i in range(0, len(serialized), 16)]
+            deltas = [{"toolUse": {"input": piece}} for piece in pieces]
+            stop_reason = "tool_use"
+        else:
+            words = synthetic_text(raw_body, output_tokens).split(" ")
+            step = self.config.stream_chunk_tokens
+            deltas = [
+                {"text": (" " if i else "") + " ".join(words[i : i + step])}
+                for i in range(0, len(words), step)
+            ]
+            stop_reason = "end_turn"
+
+        delay = self.config.stream_chunk_tokens / self.config.tokens_per_second
+        for index, delta in enumerate(deltas):
+            if index:
+                time.sleep(delay)
+            self._write_chunk(
+                encode_event(
+                    "contentBlockDelta", {"contentBlockIndex": 0, "delta": delta}
+                )
+            )
+
+        self._write_chunk(encode_event("contentBlockStop", {"contentBlockIndex": 0}))
+        self._write_chunk(encode_event("messageStop", {"stopReason": stop_reason}))
+        self._write_chunk(
+            encode_event(
+                "metadata",
+                {
+                    "usage": usage_block(input_tokens, output_tokens),
+                    "metrics": {
+                        "latencyMs": int((time.perf_counter() - start_time) * 1000)
+                    },
+                },
+            )
+        )
+        self.wfile.write(b"0\r\n\r\n")
+        self.wfile.flush()
+
+    def _invoke(self, model_id, body, raw_body):
+        latency = self.config.sample(
+            self.config.latency_median, self.config.latency_sigma
+        )
+        payload, latency_factor = invoke_response(
+            self.config, model_id, body, raw_body
+        )
+        time.sleep(latency * latency_factor)
+        self._send_json(200, payload)
+
+
+class StandinServer(ThreadingHTTPServer):
+    daemon_threads = True
+    request_queue_size = 1024
+
+    def __init__(self, address, config, batch_job_seconds=1.0):
+        super().__init__(address, StandinHandler)
+        self.config = config
+        # Time a batch job spends in progress before it completes.
+        self.batch_job_seconds = batch_job_seconds
+        self.objects = {}
+        self.jobs = {}
+        self._job_ids = itertools.count(1)
+        self._state_lock = threading.Lock()
+
+    def put_object(self, bucket, key, data):
+        with self._state_lock:
+            self.objects[(bucket, key)] = data
+
+    def get_object(self, bucket, key):
+        with self._state_lock:
+            return self.objects.get((bucket, key))
+
+    def list_objects(self, bucket, prefix=""):
+        """Returns (key, size) of the objects under a prefix, sorted by key."""
+        with self._state_lock:
+            return sorted(
+                (key, len(data))
+                for (object_bucket, key), data in self.objects.items()
+                if object_bucket == bucket and key.startswith(prefix)
+            )
+
+    def create_job(self, request):
+        job_id = f"standin{next(self._job_ids):05d}"
+        job = {
+            "jobArn": f"{JOB_ARN_PREFIX}/{job_id}",
+            "jobName": request["jobName"],
+            "modelId": request["modelId"],
+            "roleArn": request["roleArn"],
+            "status": "Submitted",
+            "submitTime": time.time(),
+            "lastModifiedTime": time.time(),
+            "inputDataConfig": request["inputDataConfig"],
+            "outputDataConfig": request["outputDataConfig"],
+        }
+        with self._state_lock:
+            self.jobs[job_id] = job
+        threading.Thread(target=self._run_job, args=(job_id,), daemon=True).start()
+        return job
+
+    def get_job(self, job_identifier):
+        job_id = job_identifier.rsplit("/", 1)[-1]
+        with self._state_lock:
+            job = self.jobs.get(job_id)
+            return dict(job) if job is not None else None
+
+    def _update_job(self, job_id, **fields):
+        with self._state_lock:
+            self.jobs[job_id].update(fields, lastModifiedTime=time.time())
+
+    def _run_job(self, job_id):
+        """
+        Answers every record of the job's input files, then writes one
+        <file>.out per input file and a manifest under <output>/<job id>/.
+        """
+        job = self.get_job(job_id)
+        self._update_job(job_id, status="InProgress")
+        time.sleep(self.batch_job_seconds)
+
+        input_uri = job["inputDataConfig"]["s3InputDataConfig"]["s3Uri"]
+        output_uri = job["outputDataConfig"]["s3OutputDataConfig"]["s3Uri"]
+        input_bucket, input_prefix = parse_s3_uri(input_uri)
+        output_bucket, output_prefix = parse_s3_uri(output_uri)
+        output_prefix = posixpath.join(output_prefix, job_id)
+
+        counts = {"totalRecordCount": 0, "successRecordCount": 0}
+        for key, _ in self.list_objects(input_bucket, input_prefix):
+            if not key.endswith(".jsonl"):
+                continue
+            lines = []
+            for line in self.get_object(input_bucket, key).splitlines():
+                if not line.strip():
+                    continue
+                record = json.loads(line)
+                raw_body = json.dumps(record["modelInput"]).encode("utf-8")
+                payload, _ = invoke_response(
+                    self.config, job["modelId"], record["modelInput"], raw_body
+                )
+                record["modelOutput"] = payload
+                lines.append(json.dumps(record))
+                counts["totalRecordCount"] += 1
+                counts["successRecordCount"] += 1
+            self.put_object(
+                output_bucket,
+                posixpath.join(output_prefix, posixpath.basename(key) + ".out"),
+                ("\n".join(lines) + "\n").encode("utf-8"),
+            )
+
+        self.put_object(
+            output_bucket,
+            posixpath.join(output_prefix, "manifest.json.out"),
+            json.dumps(dict(counts, errorRecordCount=0)).encode("utf-8"),
+        )
+        self._update_job(
+            job_id,
+            status="Completed",
+            endTime=time.time(),
+            processedRecordCount=counts["totalRecordCount"],
+            errorRecordCount=0,
+            **counts,
+        )
+
+    @property
+    def url(self):
+        host, port = self.server_address[:2]
+        return f"http://{host}:{port}"
+
+
+def serve_in_background(config=None, host="127.0.0.1", port=0):
+    """
+    Starts a stand-in on a daemon thread and returns the server.
+    Point clients at it with BEDROCK_ENDPOINT_URL=server.url, and S3 clients
+    with S3_ENDPOINT_URL=server.url.
+    """
+    server = StandinServer((host, port), config or StandinConfig())
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    return server
+
+
+def add_config_arguments(parser):
+    """Adds the StandinConfig options to an argparse parser."""
+    defaults = StandinConfig()
+    parser.add_argument("--latency-median", type=float, default=defaults.latency_median)
+    parser.add_argument("--latency-sigma", type=float, default=defaults.latency_sigma)
+    parser.add_argument("--ttft-median", type=float, default=defaults.ttft_median)
+    parser.add_argument("--ttft-sigma", type=float, default=defaults.ttft_sigma)
+    parser.add_argument(
+        "--tokens-per-second", type=float, default=defaults.tokens_per_second
+    )
+    parser.add_argument("--output-tokens", type=int, default=defaults.output_tokens)
+    parser.add_argument("--throttle-rate", type=float, default=defaults.throttle_rate)
+    parser.add_argument("--error-rate", type=float, default=defaults.error_rate)
+    parser.add_argument("--seed", type=int, default=defaults.seed)
+
+
+def config_from_arguments(args):
+    return StandinConfig(
+        latency_median=args.latency_median,
+        latency_sigma=args.latency_sigma,
+        ttft_median=args.ttft_median,
+        ttft_sigma=args.ttft_sigma,
+        tokens_per_second=args.tokens_per_second,
+        output_tokens=args.output_tokens,
+        throttle_rate=args.throttle_rate,
+        error_rate=args.error_rate,
+        seed=args.seed,
+    )
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Local stand-in for the Bedrock runtime API."
+    )
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    add_config_arguments(parser)
+    args = parser.parse_args()
+
+    server = StandinServer((args.host, args.port), config_from_arguments(args))
+    print(f"Bedrock stand-in listening on {server.url}")
+    print(f"export BEDROCK_ENDPOINT_URL={server.url}")
+    print(f"export S3_ENDPOINT_URL={server.url}")
+    server.serve_forever()
@@ -0,0 +1,252 @@
+import argparse
+import base64
+import csv
+import io
+import json
+import os
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import redirect_stdout
+
+from bedrock_standin import add_config_arguments, config_from_arguments
+from bedrock_standin import serve_in_background
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+SAMPLE_CSV = os.path.join(REPO_ROOT, "datasets", "well_arch_text_sample.csv")
+
+
+def read_sample_texts(limit=20):
+    """Returns page texts from the Well-Architected sample to use as inputs."""
+    csv.field_size_limit(sys.maxsize)
+    with open(SAMPLE_CSV, newline="", encoding="utf-8") as csv_file:
+        texts = [row["page_content"] for row in csv.DictReader(csv_file)]
+    return [text for text in texts if text.strip()][:limit]
+
+
+def summarize_scenario():
+    import gen_text
+
+    texts = read_sample_texts()
+
+    def run(index):
+        gen_text.summarize_text(texts[index % len(texts)], use_cache=False)
+
+    return run
+
+
+def qa_scenario():
+    import gen_text
+
+    texts = read_sample_texts()
+
+    def run(index):
+        gen_text.perform_qa(
+            "What does this page recommend?", texts[index % len(texts)], use_cache=False
+        )
+
+    return run
+
+
+def stream_summarize_scenario():
+    import gen_text
+
+    texts = read_sample_texts()
+
+    def run(index):
+        start_time = time.perf_counter()
+        time_to_first_token = None
+        for _ in gen_text.summarize_text(texts[index % len(texts)], stream=True):
+            if time_to_first_token is None:
+                time_to_first_token = time.perf_counter() - start_time
+        return time_to_first_token
+
+    return run
+
+
+def rag_scenario():
+    import base_rag
+
+    def run(index):
+        base_rag.rag_with_bedrock("What type of pet do I have?")
+
+    return run
+
+
+def image_scenario():
+    import image_gen_st_full
+
+    def run(index):
+        image_gen_st_full.generate_image_nova(f"A lighthouse at dusk, take {index}")
+
+    return run
+
+
+def video_scenario():
+    import video_understanding_full
+
+    client = video_understanding_full.create_bedrock_client()
+    # A tiny placeholder clip; the stand-in does not decode it.
+    video = base64.b64encode(b"\x00" * 64 * 1024).decode("utf-8")
+    payload = video_understanding_full.create_request_payload(
+        video, "You write catchy titles.", "Provide 3 titles"
+    )
+
+    def run(index):
+        video_understanding_full.invoke_model_and_get_response(
+            client, "us.amazon.nova-pro-v1:0", payload
+        )
+
+    return run
+
+
+# Scenario name -> factory returning run(index). Factories import the
+# workshop module, so a scenario whose dependencies are missing is skipped.
+SCENARIOS = {
+    "summarize": summarize_scenario,
+    "qa": qa_scenario,
+    "stream_summarize": stream_summarize_scenario,
+    "rag": rag_scenario,
+    "image": image_scenario,
+    "video": video_scenario,
+}
+
+
+def run_level(run, concurrency, requests):
+    """
+    Runs `requests` calls with `concurrency` threads.
+    Returns throughput, latency percentiles and errors for the level.
+    """
+    from model_router import percentile
+
+    def timed(index):
+        start_time = time.perf_counter()
+        try:
+            time_to_first_token = run(index)
+        except Exception as error:
+            return time.perf_counter() - start_time, None, type(error).__name__
+        return time.perf_counter() - start_time, time_to_first_token, None
+
+    start_time = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        results = list(executor.map(timed, range(requests)))
+    elapsed = time.perf_counter() - start_time
+
+    latencies = [latency for latency, _, error in results if error is None]
+    first_tokens = [ttft for _, ttft, error in results if ttft is not None]
+    errors = {}
+    for _, _, error in results:
+        if error is not None:
+            errors[error] = errors.get(error, 0) + 1
+
+    report = {
+        "concurrency": concurrency,
+        "requests": requests,
+        "ok": len(latencies),
+        "errors": errors,
+        "elapsed_seconds": elapsed,
+        "throughput": len(latencies) / elapsed if elapsed else 0.0,
+        "p50": percentile(latencies, 0.5),
+        "p95": percentile(latencies, 0.95),
+        "p99": percentile(latencies, 0.99),
+    }
+    if first_tokens:
+        report["ttft_p50"] = percentile(first_tokens, 0.5)
+        report["ttft_p95"] = percentile(first_tokens, 0.95)
+    return report
+
+
+def format_seconds(value):
+    return "-" if value is None else f"{value:.3f}"
+
+
+def print_report(name, report):
+    errors = sum(report["errors"].values())
+    line = (
+        f"{name:<18} c={report['concurrency']:<4} "
+        f"{report['throughput']:8.2f} req/s  "
+        f"p50 {format_seconds(report['p50'])}  "
+        f"p95 {format_seconds(report['p95'])}  "
+        f"p99 {format_seconds(report['p99'])}  "
+        f"errors {errors}"
+    )
+    if "ttft_p50" in report:
+        line += (
+            f"  ttft p50 {format_seconds(report['ttft_p50'])}"
+            f" p95 {format_seconds(report['ttft_p95'])}"
+        )
+    print(line, flush=True)
+
+
+def run_benchmarks(scenarios, concurrency_levels, requests):
+    """
+    Runs every scenario at every concurrency level.
+    Workshop modules print as they go, so their output is discarded.
+    """
+    results = {}
+    for name in scenarios:
+        try:
+            with redirect_stdout(io.StringIO()):
+                run = SCENARIOS[name]()
+                # One untimed call loads tokenizers and opens connections.
+                run(0)
+        except ImportError as error:
+            print(f"Skipping {name}: {error}")
+            continue
+
+        results[name] = []
+        for concurrency in concurrency_levels:
+            with redirect_stdout(io.StringIO()):
+                report = run_level(run, concurrency, max(requests, concurrency))
+            print_report(name, report)
+            results[name].append(report)
+    return results
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Load-test the workshop pipelines against a Bedrock stand-in."
+    )
+    parser.add_argument(
+        "--endpoint-url",
+        help="Use a running stand-in instead of starting one in-process.",
+    )
+    parser.add_argument(
+        "--scenarios", default=",".join(SCENARIOS), help="Comma-separated names."
+    )
+    parser.add_argument("--concurrency", default="1,4,16,64")
+    parser.add_argument(
+        "--requests", type=int, default=64, help="Requests per concurrency level."
+    )
+    parser.add_argument("--output", help="Write the results as JSON to this path.")
+    add_config_arguments(parser)
+    args = parser.parse_args()
+
+    endpoint_url = args.endpoint_url
+    if endpoint_url is None:
+        server = serve_in_background(config_from_arguments(args))
+        endpoint_url = server.url
+        print(f"Bedrock stand-in listening on {endpoint_url}")
+
+    # Must be set before the workshop modules create their clients.
+    os.environ["BEDROCK_ENDPOINT_URL"] = endpoint_url
+    os.environ.setdefault("AWS_ACCESS_KEY_ID", "standin")
+    os.environ.setdefault("AWS_SECRET_ACCESS_KEY", "standin")
+    os.environ.setdefault("AWS_DEFAULT_REGION", "us-east-1")
+    # Use cached tokenizers only; without network they fall back to estimates.
+    os.environ.setdefault("HF_HUB_OFFLINE", "1")
+    sys.path.insert(0, os.path.join(REPO_ROOT, "rag_examples"))
+    sys.path.insert(0, os.path.join(REPO_ROOT, "full_code"))
+
+    scenarios = [name for name in args.scenarios.split(",") if name]
+    unknown = [name for name in scenarios if name not in SCENARIOS]
+    if unknown:
+        parser.error(f"Unknown scenarios: {', '.join(unknown)}")
+    levels = [int(level) for level in args.concurrency.split(",")]
+
+    results = run_benchmarks(scenarios, levels, args.requests)
+
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as output_file:
+            json.dump(results, output_file, indent=2)
+        print(f"Results written to {args.output}")
@@ -0,0 +1,89 @@
+import argparse
+import csv
+import hashlib
+import json
+import os
+import sys
+from contextlib import redirect_stdout
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+SAMPLE_CSV = os.path.join(REPO_ROOT, "datasets", "well_arch_text_sample.csv")
+sys.path.insert(0, os.path.join(REPO_ROOT, "full_code"))
+
+
+def read_sample_document():
+    """Returns the pages of the Well-Architected sample as one document."""
+    csv.field_size_limit(sys.maxsize)
+    with open(SAMPLE_CSV, newline="", encoding="utf-8") as csv_file:
+        pages = [row["page_content"] for row in csv.DictReader(csv_file)]
+    return "\n\n".join(page for page in pages if page.strip())
+
+
+def insert_sentence(text, fraction, sentence):
+    """Inserts sentence at the paragraph break nearest to fraction of the text."""
+    position = text.find("\n\n", int(len(text) * fraction))
+    if position == -1:
+        return text + " " + sentence
+    return text[:position] + " " + sentence + text[position:]
+
+
+def record_requests(gen_text, text, **kwargs):
+    """
+    Runs summarize_long_text without Bedrock and returns the requests it
+    made. Each call returns a hash of its request as the summary, so a merge
+    request only changes when one of the summaries it merges changed, as
+    with the response cache at temperature 0.
+    """
+    requests = []
+
+    def fake_generate_conversation(model_id, system_prompts, messages, **_):
+        request = json.dumps([model_id, system_prompts, messages], sort_keys=True)
+        digest = hashlib.sha256(request.encode("utf-8")).hexdigest()
+        requests.append(digest)
+        return f"Summary {digest}."
+
+    original = gen_text.generate_conversation
+    gen_text.generate_conversation = fake_generate_conversation
+    try:
+        with redirect_stdout(sys.stderr):
+            gen_text.summarize_long_text(text, **kwargs)
+    finally:
+        gen_text.generate_conversation = original
+    return requests
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Count the summarize_long_text calls an edit re-runs."
+    )
+    parser.add_argument("--fraction", type=float, default=0.5)
+    parser.add_argument(
+        "--sentence", default="This sentence was added to the document."
+    )
+    parser.add_argument("--max-chunk-tokens", type=int, default=8000)
+    parser.add_argument("--fan-in", type=int, default=8)
+    args = parser.parse_args()
+
+    import gen_text
+    from token_planner import content_defined_chunks
+
+    document = read_sample_document()
+    edited = insert_sentence(document, args.fraction, args.sentence)
+    options = {"max_chunk_tokens": args.max_chunk_tokens, "fan_in": args.fan_in}
+
+    old_chunks = content_defined_chunks(
+        document, gen_text.SUMMARIZE_MODEL_ID, args.max_chunk_tokens
+    )
+    new_chunks = content_defined_chunks(
+        edited, gen_text.SUMMARIZE_MODEL_ID, args.max_chunk_tokens
+    )
+    before = record_requests(gen_text, document, **options)
+    after = record_requests(gen_text, edited, **options)
+    rerun = [request for request in after if request not in set(before)]
+
+    print(f"Document: {len(document) / 1000:.0f} KB")
+    print(
+        f"Chunks: {len(old_chunks)} before, {len(new_chunks)} after, "
+        f"{len(set(new_chunks) - set(old_chunks))} changed"
+    )
+    print(f"Calls: {len(after)}, re-run after the edit: {len(rerun)}")
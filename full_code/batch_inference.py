@@ -0,0 +1,394 @@
+import argparse
+import json
+import os
+import posixpath
+import time
+
+from bedrock_client import get_client
+from bulk_gen_text import read_records
+from gen_text import (
+    QA_MODEL_ID,
+    SENTIMENT_MODEL_ID,
+    SUMMARIZE_MODEL_ID,
+    qa_request,
+    sentiment_request,
+    summarize_request,
+)
+from token_planner import model_family, plan_request
+
+# Task name -> (model ID, function mapping a record to (system_prompts, messages)).
+# The prompts are the ones summarize_text, sentiment_analysis and perform_qa use.
+BATCH_TASKS = {
+    "summarize": (SUMMARIZE_MODEL_ID, lambda record: summarize_request(record["text"])),
+    "sentiment": (SENTIMENT_MODEL_ID, lambda record: sentiment_request(record["text"])),
+    "qa": (
+        QA_MODEL_ID,
+        lambda record: qa_request(record["question"], record["text"], QA_MODEL_ID),
+    ),
+}
+
+# Bedrock batch inference quotas per input file, and the fewest records a
+# job accepts.
+MAX_RECORDS_PER_SHARD = 50_000
+MAX_SHARD_BYTES = 1_000_000_000
+MIN_RECORDS_PER_JOB = 100
+
+FINISHED_JOB_STATUSES = {
+    "Completed",
+    "PartiallyCompleted",
+    "Failed",
+    "Stopped",
+    "Expired",
+}
+
+
+def _text_only(content_blocks):
+    """Drops cachePoint and other non-text blocks, which invoke bodies reject."""
+    return [block for block in content_blocks if "text" in block]
+
+
+def to_model_input(model_id, system_prompts, messages, max_tokens=None):
+    """
+    Converts a converse request into the invoke_model body used as modelInput
+    in a batch inference record.
+    Args:
+        model_id (str): The model the batch job runs.
+        system_prompts (JSON) : The system prompts for the model to use.
+        messages (JSON) : The messages to send to the model.
+        max_tokens (int) : Output tokens wanted, if the caller has a limit.
+
+    Returns:
+        model_input (dict): The request body in the model's native format.
+    """
+    max_tokens = plan_request(model_id, system_prompts, messages, max_tokens)[
+        "max_tokens"
+    ]
+    family = model_family(model_id)
+
+    if family == "anthropic":
+        return {
+            "anthropic_version": "bedrock-2023-05-31",
+            "max_tokens": max_tokens,
+            "system": "\n".join(block["text"] for block in _text_only(system_prompts)),
+            "messages": [
+                {
+                    "role": message["role"],
+                    "content": [
+                        {"type": "text", "text": block["text"]}
+                        for block in _text_only(message["content"])
+                    ],
+                }
+                for message in messages
+            ],
+        }
+
+    if family.startswith("amazon.nova"):
+        return {
+            "schemaVersion": "messages-v1",
+            "system": _text_only(system_prompts),
+            "messages": [
+                {"role": message["role"], "content": _text_only(message["content"])}
+                for message in messages
+            ],
+            "inferenceConfig": {"maxTokens": max_tokens},
+        }
+
+    raise ValueError(f"No batch modelInput format for {model_id}")
+
+
+def output_text(model_output):
+    """Returns the generated text of a modelOutput in either native format."""
+    if "output" in model_output:
+        return model_output["output"]["message"]["content"][0]["text"]
+    return model_output["content"][0]["text"]
+
+
+def output_usage(model_output):
+    """Returns (input_tokens, output_tokens) of a modelOutput."""
+    usage = model_output.get("usage", {})
+    return (
+        usage.get("inputTokens", usage.get("input_tokens", 0)),
+        usage.get("outputTokens", usage.get("output_tokens", 0)),
+    )
+
+
+class ShardWriter:
+    """
+    Writes the batch input files of one task. Each shard is a JSONL file of
+    {"recordId", "modelInput"} lines with a local .records.jsonl sidecar that
+    maps every recordId back to the source record's id.
+    """
+
+    def __init__(
+        self,
+        task,
+        directory,
+        max_records=MAX_RECORDS_PER_SHARD,
+        max_bytes=MAX_SHARD_BYTES,
+    ):
+        self.task = task
+        self.model_id, self.build_request = BATCH_TASKS[task]
+        self.directory = directory
+        self.max_records = max_records
+        self.max_bytes = max_bytes
+        self.shards = []
+        self.records = 0
+        self._shard_file = None
+        self._sidecar_file = None
+        self._shard_records = 0
+        self._shard_bytes = 0
+
+    def _rotate(self):
+        self.close()
+        path = os.path.join(self.directory, f"{self.task}-{len(self.shards):05d}.jsonl")
+        self.shards.append(path)
+        self._shard_file = open(path, "w", encoding="utf-8")
+        self._sidecar_file = open(
+            path.replace(".jsonl", ".records.jsonl"), "w", encoding="utf-8"
+        )
+        self._shard_records = 0
+        self._shard_bytes = 0
+
+    def write(self, record):
+        system_prompts, messages = self.build_request(record)
+        record_id = f"REC{self.records:08d}"
+        line = (
+            json.dumps(
+                {
+                    "recordId": record_id,
+                    "modelInput": to_model_input(
+                        self.model_id, system_prompts, messages
+                    ),
+                }
+            )
+            + "\n"
+        )
+        size = len(line.encode("utf-8"))
+        if (
+            self._shard_file is None
+            or self._shard_records >= self.max_records
+            or self._shard_bytes + size > self.max_bytes
+        ):
+            self._rotate()
+
+        self._shard_file.write(line)
+        self._sidecar_file.write(
+            json.dumps({"recordId": record_id, "id": record["id"]}) + "\n"
+        )
+        self._shard_records += 1
+        self._shard_bytes += size
+        self.records += 1
+
+    def close(self):
+        if self._shard_file is not None:
+            self._shard_file.close()
+            self._sidecar_file.close()
+            self._shard_file = None
+            self._sidecar_file = None
+
+
+def write_shards(input_path, directory, max_records=MAX_RECORDS_PER_SHARD):
+    """
+    Streams the records of a bulk_gen_text style JSONL file into per-task
+    batch input shards.
+    Returns a dict of task name -> ShardWriter.
+    Raises ValueError if a task has fewer records than a job accepts.
+    """
+    os.makedirs(directory, exist_ok=True)
+    writers = {}
+    try:
+        for record in read_records(input_path):
+            task = record["task"]
+            if task not in writers:
+                writers[task] = ShardWriter(task, directory, max_records=max_records)
+            writers[task].write(record)
+    finally:
+        for writer in writers.values():
+            writer.close()
+
+    too_small = {
+        task: writer.records
+        for task, writer in writers.items()
+        if writer.records < MIN_RECORDS_PER_JOB
+    }
+    if too_small:
+        raise ValueError(
+            f"Bedrock batch jobs need at least {MIN_RECORDS_PER_JOB} records, "
+            f"but these tasks have fewer: {too_small}. "
+            "Run them with bulk_gen_text instead."
+        )
+    return writers
+
+
+def submit_job(bedrock, s3, writer, bucket, prefix, role_arn, run_name):
+    """Uploads a task's shards and creates its batch inference job."""
+    input_prefix = posixpath.join(prefix, run_name, "input", writer.task) + "/"
+    output_prefix = posixpath.join(prefix, run_name, "output", writer.task) + "/"
+    for path in writer.shards:
+        with open(path, "rb") as shard_file:
+            s3.put_object(
+                Bucket=bucket,
+                Key=input_prefix + os.path.basename(path),
+                Body=shard_file,
+            )
+
+    response = bedrock.create_model_invocation_job(
+        jobName=f"{writer.task}-{run_name}",
+        roleArn=role_arn,
+        modelId=writer.model_id,
+        inputDataConfig={
+            "s3InputDataConfig": {"s3Uri": f"s3://{bucket}/{input_prefix}"}
+        },
+        outputDataConfig={
+            "s3OutputDataConfig": {"s3Uri": f"s3://{bucket}/{output_prefix}"}
+        },
+    )
+    print(f"Submitted {writer.records} {writer.task} records as {response['jobArn']}")
+    return response["jobArn"]
+
+
+def wait_for_job(bedrock, job_arn, poll_seconds=60):
+    """Polls a batch inference job until it finishes and returns its details."""
+    status = None
+    while True:
+        job = bedrock.get_model_invocation_job(jobIdentifier=job_arn)
+        if job["status"] != status:
+            status = job["status"]
+            print(f"{job['jobName']}: {status}")
+        if status in FINISHED_JOB_STATUSES:
+            return job
+        time.sleep(poll_seconds)
+
+
+def read_job_outputs(s3, job, shard_path):
+    """
+    Returns recordId -> modelOutput or error for one shard, streamed line by
+    line from its .out file.
+    """
+    output_uri = job["outputDataConfig"]["s3OutputDataConfig"]["s3Uri"]
+    bucket, _, output_prefix = output_uri.removeprefix("s3://").partition("/")
+    job_id = job["jobArn"].rsplit("/", 1)[-1]
+    key = posixpath.join(output_prefix, job_id, os.path.basename(shard_path) + ".out")
+
+    outputs = {}
+    try:
+        body = s3.get_object(Bucket=bucket, Key=key)["Body"]
+    except s3.exceptions.NoSuchKey:
+        return outputs
+    for line in body.iter_lines():
+        if not line.strip():
+            continue
+        result = json.loads(line)
+        outputs[result["recordId"]] = result.get("modelOutput") or {
+            "error": result.get("error", {"errorMessage": "No model output"})
+        }
+    return outputs
+
+
+def join_outputs(s3, job, writer, output_file):
+    """
+    Writes one {"id", "task", "result"} or {"id", "task", "error"} line per
+    source record, shard by shard, so only one shard's outputs are in memory.
+    Returns counts of completed and failed records and tokens used.
+    """
+    stats = {"completed": 0, "failed": 0, "input_tokens": 0, "output_tokens": 0}
+    for shard_path in writer.shards:
+        outputs = read_job_outputs(s3, job, shard_path)
+        sidecar_path = shard_path.replace(".jsonl", ".records.jsonl")
+        with open(sidecar_path, encoding="utf-8") as sidecar_file:
+            for line in sidecar_file:
+                entry = json.loads(line)
+                output = {"id": entry["id"], "task": writer.task}
+                model_output = outputs.get(entry["recordId"])
+                if model_output is None or "error" in model_output:
+                    output["error"] = str(
+                        (model_output or {}).get("error", "No output for record")
+                    )
+                    stats["failed"] += 1
+                else:
+                    output["result"] = output_text(model_output)
+                    input_tokens, output_tokens = output_usage(model_output)
+                    stats["input_tokens"] += input_tokens
+                    stats["output_tokens"] += output_tokens
+                    stats["completed"] += 1
+                output_file.write(json.dumps(output) + "\n")
+    return stats
+
+
+def run_batch(
+    input_path,
+    output_path,
+    bucket,
+    role_arn,
+    prefix="bedrock-batch",
+    work_dir="batch_work",
+    poll_seconds=60,
+    max_records=MAX_RECORDS_PER_SHARD,
+):
+    """
+    Runs the summarize / sentiment / qa records of a JSONL file as Bedrock
+    batch inference jobs, one job per task, and joins the outputs back to the
+    source records.
+    Args:
+        input_path (str): JSONL file of {"id", "task", "text", "question"} records.
+        output_path (str): JSONL file the joined results are appended to.
+        bucket (str): S3 bucket for job inputs and outputs.
+        role_arn (str): Service role that lets Bedrock read and write the bucket.
+        prefix (str): Key prefix for this pipeline's objects.
+        work_dir (str): Local directory for the shard files.
+        poll_seconds (int): Seconds between job status checks.
+        max_records (int): Records per shard file.
+
+    Returns:
+        stats (dict): Per-task job status, record counts and token usage.
+    """
+
+    s3 = get_client("s3")
+    bedrock = get_client("bedrock")
+    run_name = time.strftime("%Y%m%d-%H%M%S")
+
+    writers = write_shards(
+        input_path, os.path.join(work_dir, run_name), max_records=max_records
+    )
+    # Submit every job before waiting, so the tasks run side by side.
+    job_arns = {
+        task: submit_job(bedrock, s3, writer, bucket, prefix, role_arn, run_name)
+        for task, writer in writers.items()
+    }
+
+    stats = {}
+    with open(output_path, "a", encoding="utf-8") as output_file:
+        for task, job_arn in job_arns.items():
+            job = wait_for_job(bedrock, job_arn, poll_seconds=poll_seconds)
+            stats[task] = {"status": job["status"], "job_arn": job_arn}
+            if job["status"] in ("Completed", "PartiallyCompleted"):
+                stats[task].update(join_outputs(s3, job, writers[task], output_file))
+    print(f"Batch run finished: {stats}")
+
+    return stats
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Run summarize / sentiment / qa tasks as Bedrock batch jobs."
+    )
+    parser.add_argument("input", help="Input JSONL file")
+    parser.add_argument("output", help="Output JSONL file")
+    parser.add_argument("--bucket", required=True)
+    parser.add_argument("--role-arn", required=True)
+    parser.add_argument("--prefix", default="bedrock-batch")
+    parser.add_argument("--work-dir", default="batch_work")
+    parser.add_argument("--poll-seconds", type=int, default=60)
+    parser.add_argument("--max-records", type=int, default=MAX_RECORDS_PER_SHARD)
+    args = parser.parse_args()
+
+    run_batch(
+        args.input,
+        args.output,
+        args.bucket,
+        args.role_arn,
+        prefix=args.prefix,
+        work_dir=args.work_dir,
+        poll_seconds=args.poll_seconds,
+        max_records=args.max_records,
+    )
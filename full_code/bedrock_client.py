@@ -0,0 +1,119 @@
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import boto3
+from botocore.config import Config
+from botocore.exceptions import BotoCoreError, ClientError
+
+REGION = "us-east-1"
+
+# Environment variables that point a service's clients at a local stand-in.
+# Services not listed here always use their AWS endpoint.
+ENDPOINT_URL_ENVS = {
+    "bedrock": "BEDROCK_ENDPOINT_URL",
+    "bedrock-runtime": "BEDROCK_ENDPOINT_URL",
+    "s3": "S3_ENDPOINT_URL",
+}
+
+# Config for callers that retry throttled calls themselves. botocore makes a
+# single attempt, so a throttle reaches the caller's backoff and limiter at
+# once instead of after botocore's own retries.
+SINGLE_ATTEMPT = {"retry_mode": "standard", "max_attempts": 1}
+
+_clients = {}
+_clients_lock = threading.Lock()
+
+
+def make_config(
+    max_pool_connections=50,
+    connect_timeout=5,
+    read_timeout=300,
+    retry_mode="adaptive",
+    max_attempts=8,
+):
+    """
+    Returns the botocore config shared by all Bedrock clients.
+    Args:
+        max_pool_connections (int): Size of the HTTP connection pool.
+        connect_timeout (int): Seconds to wait for a TCP/TLS connection.
+        read_timeout (int): Seconds to wait for a response, long enough for
+            long generations.
+        retry_mode (str): botocore retry mode, "adaptive" or "standard".
+        max_attempts (int): Total attempts including retries. Callers with
+            their own retry loop get their client with SINGLE_ATTEMPT, so
+            the two layers do not multiply.
+
+    Returns:
+        config (Config): The botocore client config.
+    """
+    return Config(
+        max_pool_connections=max_pool_connections,
+        connect_timeout=connect_timeout,
+        read_timeout=read_timeout,
+        retries={"mode": retry_mode, "total_max_attempts": max_attempts},
+        tcp_keepalive=True,
+    )
+
+
+def get_client(service_name="bedrock-runtime", region_name=REGION, **config_kwargs):
+    """
+    Returns the shared client for a service, region and config, creating it
+    on first use. boto3 clients are thread-safe, so one client (and one
+    connection pool) is shared by every thread in the process that asks for
+    the same config.
+    Args:
+        service_name (str): The AWS service, e.g. "bedrock-runtime".
+        region_name (str): The AWS Region.
+        config_kwargs: Passed to make_config when the client is created.
+
+    Returns:
+        client: The Boto3 client.
+    """
+    key = (service_name, region_name, tuple(sorted(config_kwargs.items())))
+    client = _clients.get(key)
+    if client is not None:
+        return client
+
+    with _clients_lock:
+        client = _clients.get(key)
+        if client is None:
+            # Sessions are not thread-safe, so each client gets its own.
+            session = boto3.session.Session()
+            endpoint_env = ENDPOINT_URL_ENVS.get(service_name)
+            client = session.client(
+                service_name=service_name,
+                region_name=region_name,
+                endpoint_url=os.environ.get(endpoint_env) if endpoint_env else None,
+                config=make_config(**config_kwargs),
+            )
+            _clients[key] = client
+    return client
+
+
+def warm_up(client, connections=4, operation="list_async_invokes", **params):
+    """
+    Opens connections to the client's endpoint ahead of the first real call so
+    that no request pays the TLS handshake. Any response, including an error,
+    leaves a warm connection in the pool.
+    Args:
+        client: The Boto3 client to warm up.
+        connections (int): Number of connections to open in parallel.
+        operation (str): A cheap, read-only client method to call.
+        params: Parameters for the operation.
+    """
+
+    method = getattr(client, operation, None)
+    if method is None:
+        return
+    if operation == "list_async_invokes":
+        params.setdefault("maxResults", 1)
+
+    def probe(_):
+        try:
+            method(**params)
+        except (BotoCoreError, ClientError):
+            pass
+
+    with ThreadPoolExecutor(max_workers=connections) as executor:
+        list(executor.map(probe, range(connections)))
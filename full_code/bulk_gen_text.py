@@ -0,0 +1,208 @@
+import argparse
+import json
+import random
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+from botocore.exceptions import ClientError
+
+from bedrock_client import SINGLE_ATTEMPT, get_client, warm_up
+from gen_text import (
+    analyze_sentiment,
+    client_scope,
+    perform_qa,
+    sentiment_analysis,
+    summarize_text,
+)
+from metrics import THROTTLING_ERROR_CODES
+
+TASKS = {
+    "summarize": lambda record: summarize_text(record["text"]),
+    "sentiment": lambda record: sentiment_analysis(record["text"]),
+    "sentiment_structured": lambda record: analyze_sentiment(record["text"]).to_dict(),
+    "qa": lambda record: perform_qa(record["question"], record["text"]),
+}
+
+
+def is_throttling_error(error):
+    """Returns True if the error is Bedrock telling us to slow down."""
+    if isinstance(error, ClientError):
+        return error.response.get("Error", {}).get("Code") in THROTTLING_ERROR_CODES
+    return False
+
+
+class AdaptiveLimiter:
+    """
+    Caps the number of calls in flight and adapts the cap to throttling.
+    The cap is halved on every throttle and grows back by one after a run of
+    successful calls, so the workers settle at the account's quota.
+    """
+
+    def __init__(self, max_concurrency, min_concurrency=1, increase_every=10):
+        self.max_concurrency = max_concurrency
+        self.min_concurrency = min_concurrency
+        self.increase_every = increase_every
+        self.limit = max_concurrency
+        self.in_flight = 0
+        self.successes = 0
+        self.throttles = 0
+        self._condition = threading.Condition()
+
+    def acquire(self):
+        with self._condition:
+            while self.in_flight >= self.limit:
+                self._condition.wait()
+            self.in_flight += 1
+
+    def release(self):
+        with self._condition:
+            self.in_flight -= 1
+            self._condition.notify()
+
+    def on_success(self):
+        with self._condition:
+            self.successes += 1
+            if (
+                self.successes >= self.increase_every
+                and self.limit < self.max_concurrency
+            ):
+                self.limit += 1
+                self.successes = 0
+                self._condition.notify()
+
+    def on_throttle(self):
+        with self._condition:
+            self.throttles += 1
+            self.successes = 0
+            self.limit = max(self.min_concurrency, self.limit // 2)
+
+
+def call_with_backoff(fn, limiter, max_attempts=8, base_delay=1.0, max_delay=60.0):
+    """
+    Calls fn() under the limiter, retrying throttled calls with
+    exponential backoff and full jitter. fn should call Bedrock through a
+    SINGLE_ATTEMPT client, so the limiter hears of a throttle at once.
+    """
+    for attempt in range(max_attempts):
+        limiter.acquire()
+        try:
+            result = fn()
+        except Exception as error:
+            if not is_throttling_error(error) or attempt == max_attempts - 1:
+                raise
+            limiter.on_throttle()
+        else:
+            limiter.on_success()
+            return result
+        finally:
+            limiter.release()
+
+        delay = min(max_delay, base_delay * 2**attempt)
+        time.sleep(random.uniform(0, delay))
+
+
+def read_records(input_path):
+    """Yields the records of a JSONL file, one per non-empty line."""
+    with open(input_path, encoding="utf-8") as input_file:
+        for line_number, line in enumerate(input_file):
+            line = line.strip()
+            if not line:
+                continue
+            record = json.loads(line)
+            record.setdefault("id", line_number)
+            yield record
+
+
+def bulk_client():
+    """Returns a runtime client that leaves retrying to call_with_backoff."""
+    return get_client("bedrock-runtime", "us-east-1", **SINGLE_ATTEMPT)
+
+
+def run_record(record, limiter, client):
+    """Runs the task named in the record and returns the output record."""
+    start_time = time.perf_counter()
+    output = {"id": record["id"], "task": record["task"]}
+    try:
+        task = TASKS[record["task"]]
+        with client_scope(client):
+            output["result"] = call_with_backoff(lambda: task(record), limiter)
+    except Exception as error:
+        output["error"] = f"{type(error).__name__}: {error}"
+    output["latency"] = round(time.perf_counter() - start_time, 3)
+    return output
+
+
+def run_bulk(input_path, output_path, max_workers=8, client=None):
+    """
+    Runs every record of input_path with bounded concurrency and writes the
+    results to output_path in the order they finish.
+    Args:
+        input_path (str): JSONL file of {"id", "task", "text", "question"} records.
+        output_path (str): JSONL file the results are appended to.
+        max_workers (int): Upper bound on concurrent Bedrock calls.
+        client: Runtime client for the tasks. Defaults to bulk_client().
+
+    Returns:
+        stats (dict): Counts of completed and failed records and throttles.
+    """
+
+    client = client or bulk_client()
+    limiter = AdaptiveLimiter(max_workers)
+    warm_up(client, connections=max_workers)
+    completed = 0
+    failed = 0
+    start_time = time.perf_counter()
+
+    with ThreadPoolExecutor(max_workers=max_workers) as executor, open(
+        output_path, "a", encoding="utf-8"
+    ) as output_file:
+        pending = set()
+        records = read_records(input_path)
+
+        def drain(return_when):
+            nonlocal pending, completed, failed
+            done, pending = wait(pending, return_when=return_when)
+            for future in done:
+                output = future.result()
+                if "error" in output:
+                    failed += 1
+                else:
+                    completed += 1
+                output_file.write(json.dumps(output) + "\n")
+            output_file.flush()
+
+        for record in records:
+            # Keep the queue short so huge inputs are never read into memory.
+            if len(pending) >= max_workers * 2:
+                drain(FIRST_COMPLETED)
+            pending.add(executor.submit(run_record, record, limiter, client))
+
+        while pending:
+            drain(FIRST_COMPLETED)
+
+    elapsed = time.perf_counter() - start_time
+    stats = {
+        "completed": completed,
+        "failed": failed,
+        "throttles": limiter.throttles,
+        "elapsed": round(elapsed, 3),
+        "records_per_second": (
+            round((completed + failed) / elapsed, 3) if elapsed else 0
+        ),
+    }
+    print(f"Bulk run finished: {stats}")
+
+    return stats
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Run summarize / sentiment / qa tasks over a JSONL file."
+    )
+    parser.add_argument("input", help="Input JSONL file")
+    parser.add_argument("output", help="Output JSONL file")
+    parser.add_argument("--max-workers", type=int, default=8)
+    args = parser.parse_args()
+
+    run_bulk(args.input, args.output, max_workers=args.max_workers)
@@ -0,0 +1,281 @@
+import argparse
+import csv
+import json
+import os
+import sys
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+from bedrock_client import warm_up
+from bulk_gen_text import AdaptiveLimiter, bulk_client, call_with_backoff
+from gen_text import client_scope, summarize_text
+from metrics import metrics
+from model_router import MODEL_PRICES
+
+DEFAULT_INPUT_PATH = os.path.join(
+    os.path.dirname(__file__), "..", "datasets", "well_arch_text_sample.csv"
+)
+
+# Rows may hold whole pages of text.
+csv.field_size_limit(sys.maxsize)
+
+
+class ByteCountingLines:
+    """
+    Iterates over the lines of a binary file as text and counts the bytes
+    consumed, so the CSV can be read as a stream with a known position.
+    """
+
+    def __init__(self, binary_file, offset=0):
+        self.binary_file = binary_file
+        self.offset = offset
+
+    def __iter__(self):
+        for line in self.binary_file:
+            self.offset += len(line)
+            yield line.decode("utf-8")
+
+
+def classify_source(source):
+    """
+    Returns the Well-Architected document a row comes from, e.g. "security"
+    for a page under .../latest/security-pillar/. The URL already carries the
+    label, so no model call is needed.
+    """
+    parts = source.split("/")
+    if "latest" in parts and parts.index("latest") + 1 < len(parts):
+        return parts[parts.index("latest") + 1].removesuffix("-pillar")
+    return "unknown"
+
+
+def read_checkpoint(checkpoint_path):
+    if not os.path.exists(checkpoint_path):
+        return None
+    with open(checkpoint_path, encoding="utf-8") as checkpoint_file:
+        return json.load(checkpoint_file)
+
+
+def write_checkpoint(checkpoint_path, checkpoint):
+    temporary_path = f"{checkpoint_path}.tmp"
+    with open(temporary_path, "w", encoding="utf-8") as checkpoint_file:
+        json.dump(checkpoint, checkpoint_file)
+    os.replace(temporary_path, checkpoint_path)
+
+
+def read_done_rows(output_path):
+    """Returns the rows that already have a result in the output file."""
+    done = set()
+    if not os.path.exists(output_path):
+        return done
+    with open(output_path, encoding="utf-8") as output_file:
+        for line in output_file:
+            try:
+                output = json.loads(line)
+            except json.JSONDecodeError:
+                # A line cut short by a crash; the row is simply redone.
+                continue
+            if "error" not in output:
+                done.add(output["row"])
+    return done
+
+
+def token_spend():
+    """Returns input tokens, output tokens and USD spent so far in the process."""
+    input_tokens = 0
+    output_tokens = 0
+    cost = 0.0
+    for counter in metrics.snapshot()["counters"]:
+        name = counter["name"]
+        if name not in ("bedrock_input_tokens_total", "bedrock_output_tokens_total"):
+            continue
+        input_price, output_price = MODEL_PRICES.get(
+            counter["labels"]["model"], (0.0, 0.0)
+        )
+        if name == "bedrock_input_tokens_total":
+            input_tokens += counter["value"]
+            cost += counter["value"] / 1000 * input_price
+        else:
+            output_tokens += counter["value"]
+            cost += counter["value"] / 1000 * output_price
+    return input_tokens, output_tokens, cost
+
+
+def summarize_row(row_number, row, limiter, client):
+    """Summarizes one CSV row and returns the output record."""
+    start_time = time.perf_counter()
+    output = {
+        "row": row_number,
+        "source": row["source"],
+        "category": classify_source(row["source"]),
+    }
+    try:
+        with client_scope(client):
+            output["summary"] = call_with_backoff(
+                lambda: summarize_text(row["page_content"]), limiter
+            )
+    except Exception as error:
+        output["error"] = f"{type(error).__name__}: {error}"
+    output["latency"] = round(time.perf_counter() - start_time, 3)
+    return output
+
+
+def run_csv_summaries(
+    input_path=DEFAULT_INPUT_PATH,
+    output_path="well_arch_summaries.jsonl",
+    checkpoint_path=None,
+    max_workers=8,
+    report_every=10.0,
+):
+    """
+    Summarizes and classifies every row of a CSV with "source" and
+    "page_content" columns. The file is read as a stream, rows are run with
+    bounded concurrency and results are appended to output_path as they
+    finish. A checkpoint records the byte offset before which every row is
+    done, so a rerun seeks past finished work and skips rows that already
+    have a result.
+    Args:
+        input_path (str): The CSV file to summarize.
+        output_path (str): JSONL file the results are appended to.
+        checkpoint_path (str): Defaults to output_path + ".checkpoint".
+        max_workers (int): Upper bound on concurrent Bedrock calls.
+        report_every (float): Seconds between progress reports.
+
+    Returns:
+        stats (dict): Counts of completed and failed rows, throttles and spend.
+    """
+
+    checkpoint_path = checkpoint_path or output_path + ".checkpoint"
+    checkpoint = read_checkpoint(checkpoint_path)
+    done_rows = read_done_rows(output_path)
+    total_bytes = os.path.getsize(input_path)
+
+    client = bulk_client()
+    limiter = AdaptiveLimiter(max_workers)
+    warm_up(client, connections=max_workers)
+    completed = 0
+    failed = 0
+    skipped = 0
+    start_time = time.perf_counter()
+    last_report = start_time
+
+    with open(input_path, "rb") as input_file, ThreadPoolExecutor(
+        max_workers=max_workers
+    ) as executor, open(output_path, "a", encoding="utf-8") as output_file:
+        if checkpoint:
+            input_file.seek(checkpoint["offset"])
+            lines = ByteCountingLines(input_file, checkpoint["offset"])
+            reader = csv.DictReader(lines, fieldnames=checkpoint["fieldnames"])
+            next_row = checkpoint["row"]
+            print(f"Resuming at row {next_row} ({len(done_rows)} rows already done)")
+        else:
+            lines = ByteCountingLines(input_file)
+            reader = csv.DictReader(lines)
+            # Read the header now, so even the first checkpoint points past it.
+            if reader.fieldnames is None:
+                raise ValueError(f"{input_path} has no header row")
+            next_row = 0
+        start_offset = lines.offset
+
+        # Rows submitted but not yet safely done, with the offset after each.
+        row_offsets = {}
+        finished_rows = set()
+        watermark = {"row": next_row, "offset": lines.offset}
+        pending = set()
+
+        def report():
+            elapsed = time.perf_counter() - start_time
+            rows_per_second = (completed + failed) / elapsed if elapsed else 0.0
+            bytes_per_second = (lines.offset - start_offset) / elapsed if elapsed else 0
+            remaining = total_bytes - lines.offset
+            eta = remaining / bytes_per_second if bytes_per_second else float("inf")
+            input_tokens, output_tokens, cost = token_spend()
+            print(
+                f"{lines.offset / total_bytes:6.1%} | {completed} done, "
+                f"{failed} failed, {skipped} skipped | {rows_per_second:.2f} rows/s"
+                f" | ETA {eta:.0f}s | limit {limiter.limit} | tokens "
+                f"{input_tokens} in / {output_tokens} out (${cost:.4f})",
+                flush=True,
+            )
+
+        def drain(return_when):
+            nonlocal pending, completed, failed, last_report
+            done, pending = wait(pending, return_when=return_when)
+            for future in done:
+                output = future.result()
+                if "error" in output:
+                    failed += 1
+                else:
+                    completed += 1
+                    finished_rows.add(output["row"])
+                output_file.write(json.dumps(output) + "\n")
+            output_file.flush()
+
+            # Move the checkpoint over every row that is now done in order.
+            while watermark["row"] in finished_rows or (
+                watermark["row"] in row_offsets and watermark["row"] in done_rows
+            ):
+                finished_rows.discard(watermark["row"])
+                watermark["offset"] = row_offsets.pop(watermark["row"])
+                watermark["row"] += 1
+            write_checkpoint(
+                checkpoint_path, dict(watermark, fieldnames=reader.fieldnames)
+            )
+
+            if time.perf_counter() - last_report >= report_every:
+                last_report = time.perf_counter()
+                report()
+
+        for row_number, row in enumerate(reader, start=next_row):
+            row_offsets[row_number] = lines.offset
+            if row_number in done_rows:
+                skipped += 1
+                continue
+            # Keep the queue short so huge inputs are never read into memory.
+            if len(pending) >= max_workers * 2:
+                drain(FIRST_COMPLETED)
+            pending.add(
+                executor.submit(summarize_row, row_number, row, limiter, client)
+            )
+
+        while pending:
+            drain(FIRST_COMPLETED)
+        report()
+
+    input_tokens, output_tokens, cost = token_spend()
+    elapsed = time.perf_counter() - start_time
+    stats = {
+        "completed": completed,
+        "failed": failed,
+        "skipped": skipped,
+        "throttles": limiter.throttles,
+        "elapsed": round(elapsed, 3),
+        "rows_per_second": round((completed + failed) / elapsed, 3) if elapsed else 0,
+        "input_tokens": input_tokens,
+        "output_tokens": output_tokens,
+        "cost": round(cost, 4),
+    }
+    print(f"CSV summarization finished: {stats}")
+
+    return stats
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Summarize and classify every row of a page_content CSV."
+    )
+    parser.add_argument("--input", default=DEFAULT_INPUT_PATH, help="Input CSV file")
+    parser.add_argument(
+        "--output", default="well_arch_summaries.jsonl", help="Output JSONL file"
+    )
+    parser.add_argument("--checkpoint", help="Checkpoint file for resuming")
+    parser.add_argument("--max-workers", type=int, default=8)
+    parser.add_argument("--report-every", type=float, default=10.0)
+    args = parser.parse_args()
+
+    run_csv_summaries(
+        args.input,
+        args.output,
+        checkpoint_path=args.checkpoint,
+        max_workers=args.max_workers,
+        report_every=args.report_every,
+    )
@@ -0,0 +1,238 @@
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from gen_text import add_cache_point, generate_conversation
+from metrics import task_scope
+from token_planner import count_request_tokens, count_tokens
+
+
+class ConversationManager:
+    """
+    Multi-turn chat on top of generate_conversation with a bounded prompt.
+    The most recent turns are sent verbatim. When they outgrow the token
+    budget, the oldest ones are folded into a running summary by a
+    background call, so the next reply does not wait for it. The system
+    prompt and summary form a stable prefix that is marked for prompt
+    caching, and so is the history before the newest message.
+    """
+
+    def __init__(
+        self,
+        model_id="us.amazon.nova-pro-v1:0",
+        system_prompt="You are a helpful AI",
+        max_input_tokens=4000,
+        keep_fraction=0.5,
+        summary_model_id="us.amazon.nova-micro-v1:0",
+        summary_max_tokens=400,
+        temperature=0.5,
+    ):
+        """
+        Args:
+            model_id (str): The model that answers.
+            system_prompt (str): The system prompt for every turn.
+            max_input_tokens (int): Budget for the system prompt, summary
+                and verbatim turns. Going over it starts a fold.
+            keep_fraction (float): Share of the budget left to verbatim turns
+                after a fold.
+            summary_model_id (str): The model that writes the running summary.
+            summary_max_tokens (int): Output budget of the running summary.
+            temperature (float): The sampling temperature for replies.
+        """
+        self.model_id = model_id
+        self.system_prompt = system_prompt
+        self.max_input_tokens = max_input_tokens
+        self.keep_fraction = keep_fraction
+        self.summary_model_id = summary_model_id
+        self.summary_max_tokens = summary_max_tokens
+        self.temperature = temperature
+        self.summary = ""
+        self.turns = []
+        self.folds = 0
+        self.fold_errors = 0
+        self.last_usage = {}
+        self._lock = threading.Lock()
+        self._folding = None
+        # One worker, so folds are applied in order.
+        self._executor = ThreadPoolExecutor(max_workers=1)
+
+    def _system_prompts(self, summary):
+        blocks = [{"text": self.system_prompt}]
+        if summary:
+            blocks.append(
+                {"text": f"Summary of the earlier conversation:\n{summary}"}
+            )
+        return add_cache_point(blocks, self.model_id)
+
+    def _request(self, user_text):
+        """Returns (system_prompts, messages) for the next turn."""
+        with self._lock:
+            summary = self.summary
+            turns = list(self.turns)
+
+        history = [dict(message) for message in turns]
+        if history:
+            # Everything before the new message is the same as last turn.
+            history[-1]["content"] = add_cache_point(
+                history[-1]["content"], self.model_id
+            )
+        messages = history + [{"role": "user", "content": [{"text": user_text}]}]
+        return self._system_prompts(summary), messages
+
+    def send(self, user_text):
+        """
+        Sends a user message and returns the model's reply.
+        Args:
+            user_text (str): The user's message.
+
+        Returns:
+            reply (str): The assistant's reply.
+        """
+        self._wait_if_over_budget()
+        system_prompts, messages = self._request(user_text)
+
+        usage = {}
+        with task_scope("chat"):
+            reply = generate_conversation(
+                self.model_id,
+                system_prompts,
+                messages,
+                temperature=self.temperature,
+                usage=usage,
+            )
+
+        with self._lock:
+            self.last_usage = usage
+            self.turns.append({"role": "user", "content": [{"text": user_text}]})
+            self.turns.append({"role": "assistant", "content": [{"text": reply}]})
+        self._maybe_fold()
+        return reply
+
+    def prompt_tokens(self):
+        """Estimates the tokens of the system prompt, summary and turns."""
+        with self._lock:
+            summary = self.summary
+            turns = list(self.turns)
+        return count_request_tokens(
+            self.model_id, self._system_prompts(summary), turns
+        )
+
+    def _maybe_fold(self):
+        """Starts a background fold if the prompt is over budget."""
+        if self._folding is not None and not self._folding.done():
+            return
+        if self.prompt_tokens() <= self.max_input_tokens:
+            return
+
+        with self._lock:
+            turns = list(self.turns)
+        texts = [message["content"][0]["text"] for message in turns]
+        counts = count_tokens(texts, self.model_id)
+
+        # Fold whole user/assistant pairs, oldest first, until what is left
+        # fits in keep_fraction of the budget. The newest pair always stays.
+        keep_budget = self.max_input_tokens * self.keep_fraction
+        remaining = sum(counts)
+        fold_count = 0
+        while fold_count < len(turns) - 2 and remaining > keep_budget:
+            remaining -= counts[fold_count] + counts[fold_count + 1]
+            fold_count += 2
+
+        if fold_count:
+            self._folding = self._executor.submit(self._fold, turns[:fold_count])
+
+    def _fold(self, old_turns):
+        """
+        Merges old_turns into the summary, then drops them from the history.
+        If the summary call fails, the history is left as it was and the
+        fold is tried again after the next turn.
+        """
+        with self._lock:
+            summary = self.summary
+        transcript = "\n".join(
+            f"{message['role']}: {message['content'][0]['text']}"
+            for message in old_turns
+        )
+
+        system_prompts = [
+            {
+                "text": "You keep a running summary of a conversation. Merge the new turns into the summary. Keep facts, decisions, names, numbers and the user's preferences. Answer with the updated summary only, in 200 words or less."
+            }
+        ]
+        message_1 = {
+            "role": "user",
+            "content": [
+                {
+                    "text": f"Summary so far:\n{summary or '(none)'}\n\n"
+                    f"New turns:\n{transcript}"
+                }
+            ],
+        }
+
+        try:
+            with task_scope("chat_summary"):
+                new_summary = generate_conversation(
+                    self.summary_model_id,
+                    system_prompts,
+                    [message_1],
+                    temperature=0,
+                    max_tokens=self.summary_max_tokens,
+                )
+        except Exception as error:
+            print(f"Could not fold the conversation, keeping the history: {error!r}")
+            with self._lock:
+                self.fold_errors += 1
+            return
+
+        with self._lock:
+            # Turns added while the summary was written stay in place.
+            self.turns = self.turns[len(old_turns) :]
+            self.summary = new_summary
+            self.folds += 1
+
+    def _wait_if_over_budget(self):
+        """
+        Waits for a running fold only if the prompt is already over the hard
+        budget, so a fast conversation cannot outrun its summarizer.
+        """
+        folding = self._folding
+        if folding is None or folding.done():
+            return
+        if self.prompt_tokens() > self.max_input_tokens:
+            folding.result()
+
+    def stats(self):
+        """Returns the size of the history and how often it was folded."""
+        with self._lock:
+            return {
+                "turns": len(self.turns) // 2,
+                "folds": self.folds,
+                "fold_errors": self.fold_errors,
+                "summary_chars": len(self.summary),
+                "last_input_tokens": self.last_usage.get("inputTokens", 0),
+                "last_cache_read_tokens": self.last_usage.get(
+                    "cacheReadInputTokens", 0
+                ),
+            }
+
+    def close(self):
+        self._executor.shutdown(wait=True)
+
+
+if __name__ == "__main__":
+    chat = ConversationManager(
+        system_prompt="You are an expert AWS Solutions Architect.",
+        max_input_tokens=2000,
+    )
+    questions = [
+        "We run a web shop on EC2 behind an ALB. What should we look at first?",
+        "Our database is a single MySQL instance. How do we make it resilient?",
+        "How should we back it up?",
+        "What about caching product pages?",
+        "How do we keep costs down at night?",
+        "Remind me, what did you suggest for the database?",
+    ]
+    for question in questions:
+        print(f"\nUser: {question}")
+        print(f"Assistant: {chat.send(question)}")
+        print(f"Stats: {chat.stats()}")
+    chat.close()
@@ -1,15 +1,119 @@
+import contextvars
+import csv
+import json
 import time
-
-import boto3
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+
+from botocore.exceptions import ClientError
+
+from bedrock_client import get_client
+from metrics import metrics, task_scope
+from response_cache import ResponseCache, make_cache_key
+from semantic_cache import SemanticCache
+from structured_output import IncrementalValidator, SchemaValidationError
+from token_planner import (
+    RequestTooLargeError,
+    content_defined_chunks,
+    plan_request,
+)
 
 # Setup bedrock
-bedrock_runtime = boto3.client(
-    service_name="bedrock-runtime",
-    region_name="us-east-1",
-)
+bedrock_runtime = get_client("bedrock-runtime", "us-east-1")
+
+_scoped_client = contextvars.ContextVar("bedrock_runtime", default=None)
+
+
+@contextmanager
+def client_scope(client):
+    """
+    Sends every call made inside the block through client, e.g. one with
+    botocore retries off for a caller that backs off on its own.
+    """
+    token = _scoped_client.set(client)
+    try:
+        yield
+    finally:
+        _scoped_client.reset(token)
+
+
+def runtime_client():
+    """Returns the runtime client of the calling context."""
+    return _scoped_client.get() or bedrock_runtime
+
+
+def map_in_context(executor, fn, items):
+    """
+    Same as executor.map, but each call runs in a copy of the caller's
+    context, so client_scope and task_scope carry over to the workers.
+    """
+    context = contextvars.copy_context()
+    return executor.map(lambda item: context.copy().run(fn, item), items)
+
+
+EMBEDDING_MODEL_ID = "amazon.titan-embed-text-v1"
+
+# Shared converse response cache (in-process LRU backed by SQLite).
+response_cache = ResponseCache()
+
+
+def embed_text(text):
+    """
+    Returns the Titan embedding vector of a piece of text.
+    """
+    response = runtime_client().invoke_model(
+        modelId=EMBEDDING_MODEL_ID,
+        body=json.dumps({"inputText": text}),
+        accept="application/json",
+        contentType="application/json",
+    )
+    return json.loads(response["body"].read())["embedding"]
+
+
+# Answer cache for perform_qa that matches paraphrased questions.
+qa_semantic_cache = SemanticCache(embed_text, threshold=0.9)
+
+# Models that accept cachePoint blocks for Bedrock prompt caching.
+PROMPT_CACHE_MODELS = {
+    "us.anthropic.claude-3-5-haiku-20241022-v1:0",
+    "us.anthropic.claude-3-7-sonnet-20250219-v1:0",
+    "us.amazon.nova-pro-v1:0",
+    "us.amazon.nova-lite-v1:0",
+    "us.amazon.nova-micro-v1:0",
+}
+
+CACHE_POINT = {"cachePoint": {"type": "default"}}
 
+# Set to a HedgedConverse to hedge slow generate_conversation calls.
+hedged_converse = None
 
-def generate_conversation(model_id, system_prompts, messages):
+
+def add_cache_point(content_blocks, model_id):
+    """
+    Marks the end of a stable prefix (system prompt or message content) for
+    prompt caching. Later calls that share the prefix read it from the cache
+    instead of processing it again. Models without prompt caching get the
+    blocks back unchanged.
+    """
+    if model_id not in PROMPT_CACHE_MODELS:
+        return list(content_blocks)
+    return list(content_blocks) + [CACHE_POINT]
+
+
+def error_code(error):
+    """Returns the AWS error code of a ClientError."""
+    return error.response.get("Error", {}).get("Code", "Unknown")
+
+
+def generate_conversation(
+    model_id,
+    system_prompts,
+    messages,
+    temperature=0.5,
+    use_cache=None,
+    max_tokens=None,
+    usage=None,
+):
     """
     Sends messages to a model.
     Args:
@@ -17,46 +121,349 @@ def generate_conversation(model_id, system_prompts, messages):
         model_id (str): The model ID to use.
         system_prompts (JSON) : The system prompts for the model to use.
         messages (JSON) : The messages to send to the model.
+        temperature (float) : The sampling temperature.
+        use_cache (bool) : Whether to serve the call from response_cache. The
+            default (None) only caches deterministic calls with temperature 0.
+        max_tokens (int) : Upper bound on output tokens. The planner lowers it
+            to what fits in the model's context window.
+        usage (dict) : Optional dict that is filled with the token usage. On a
+            response cache hit it holds the usage of the cached call and
+            "cacheHit": True.
 
     Returns:
         response (JSON): The conversation that the model generated.
 
+    Raises:
+        RequestTooLargeError: If the request does not fit the model.
+
     """
 
     print(f"Generating message with model {model_id}")
 
-    # Inference parameters to use.
-    temperature = 0.5
+    if use_cache is None:
+        use_cache = temperature == 0
+
+    if use_cache:
+        # The planned max_tokens follows from the request, so the requested
+        # one is enough for the key and a hit needs no tokenizing.
+        cache_key = make_cache_key(
+            model_id,
+            system_prompts,
+            messages,
+            {"temperature": temperature, "maxTokens": max_tokens},
+        )
+        cached = response_cache.get(cache_key)
+        if cached is not None:
+            print("Served from response cache")
+            if usage is not None:
+                usage.update(cached.get("usage", {}), cacheHit=True)
+            return cached["text"]
+
+    # Check the request size locally before paying for the round trip.
+    plan = plan_request(model_id, system_prompts, messages, max_tokens)
 
     # Base inference parameters to use.
-    inference_config = {"temperature": temperature}
+    inference_config = {"temperature": temperature, "maxTokens": plan["max_tokens"]}
     # Additional inference parameters to use.
     # top_k = 200
     # additional_model_fields = {"top_k": top_k}
 
-    # Send the message.
-    response = bedrock_runtime.converse(
-        modelId=model_id,
-        messages=messages,
-        system=system_prompts,
-        inferenceConfig=inference_config,
-        # additionalModelRequestFields=additional_model_fields,
+    # Send the message, hedged against slow first tokens if enabled.
+    converse = (
+        hedged_converse.converse
+        if hedged_converse is not None
+        else runtime_client().converse
     )
-
-    # Log token usage.
+    start_time = time.perf_counter()
+    try:
+        response = converse(
+            modelId=model_id,
+            messages=messages,
+            system=system_prompts,
+            inferenceConfig=inference_config,
+            # additionalModelRequestFields=additional_model_fields,
+        )
+    except ClientError as error:
+        metrics.record_error(model_id, error_code(error))
+        raise
+
+    # Record latency and token usage.
     token_usage = response["usage"]
-    print(f"Input tokens: {token_usage['inputTokens']}")
-    print(f"Output tokens: {token_usage['outputTokens']}")
-    print(f"Total tokens: {token_usage['totalTokens']}")
-    print(f"Stop reason: {response['stopReason']}")
+    metrics.record_call(
+        model_id,
+        time.perf_counter() - start_time,
+        usage=token_usage,
+        time_to_first_token=response.get("hedge", {}).get("time_to_first_token"),
+        retries=response.get("ResponseMetadata", {}).get("RetryAttempts", 0),
+        stop_reason=response["stopReason"],
+    )
+    if usage is not None:
+        usage.update(token_usage)
 
     text_response = response["output"]["message"]["content"][0]["text"]
 
+    # Truncated output is not replayed.
+    if use_cache and response["stopReason"] != "max_tokens":
+        response_cache.put(cache_key, {"text": text_response, "usage": token_usage})
+
     return text_response
 
 
+def generate_conversation_stream(
+    model_id, system_prompts, messages, stream_metrics=None, task=None, plan=None
+):
+    """
+    Streams a model response as it is generated.
+    Args:
+        model_id (str): The model ID to use.
+        system_prompts (JSON) : The system prompts for the model to use.
+        messages (JSON) : The messages to send to the model.
+        stream_metrics (dict) : Optional dict that is filled with the latency and
+            token usage of the call once the stream is finished.
+        task (str) : Task label for the metrics, e.g. "summarize".
+        plan (dict) : The plan_request result, if the caller already has it.
+
+    Yields:
+        text (str): The text deltas in the order the model generates them.
+
+    """
+
+    print(f"Streaming message with model {model_id}")
+
+    # Inference parameters to use.
+    temperature = 0.5
+
+    # Check the request size locally before paying for the round trip.
+    if plan is None:
+        plan = plan_request(model_id, system_prompts, messages)
+
+    # Base inference parameters to use.
+    inference_config = {"temperature": temperature, "maxTokens": plan["max_tokens"]}
+
+    # Send the message and start the clock for time-to-first-token.
+    start_time = time.perf_counter()
+    first_token_time = None
+    token_usage = {}
+    stop_reason = None
+
+    try:
+        response = runtime_client().converse_stream(
+            modelId=model_id,
+            messages=messages,
+            system=system_prompts,
+            inferenceConfig=inference_config,
+        )
+    except ClientError as error:
+        metrics.record_error(model_id, error_code(error))
+        raise
+
+    for event in response["stream"]:
+        if "contentBlockDelta" in event:
+            text = event["contentBlockDelta"]["delta"].get("text")
+            if text:
+                if first_token_time is None:
+                    first_token_time = time.perf_counter()
+                yield text
+        elif "messageStop" in event:
+            stop_reason = event["messageStop"]["stopReason"]
+        elif "metadata" in event:
+            token_usage = event["metadata"].get("usage", {})
+
+    end_time = time.perf_counter()
+
+    # Record latency and token usage.
+    total_latency = end_time - start_time
+    time_to_first_token = (
+        first_token_time - start_time if first_token_time is not None else None
+    )
+    output_tokens = token_usage.get("outputTokens", 0)
+    generation_time = end_time - (first_token_time or start_time)
+    tokens_per_second = output_tokens / generation_time if generation_time > 0 else 0.0
+
+    metrics.record_call(
+        model_id,
+        total_latency,
+        usage=token_usage,
+        time_to_first_token=time_to_first_token,
+        retries=response.get("ResponseMetadata", {}).get("RetryAttempts", 0),
+        stop_reason=stop_reason,
+        task=task,
+    )
+
+    if stream_metrics is not None:
+        stream_metrics.update(
+            {
+                "model_id": model_id,
+                "time_to_first_token": time_to_first_token,
+                "total_latency": total_latency,
+                "tokens_per_second": tokens_per_second,
+                "input_tokens": token_usage.get("inputTokens", 0),
+                "output_tokens": output_tokens,
+                "total_tokens": token_usage.get("totalTokens", 0),
+                "cache_read_input_tokens": token_usage.get("cacheReadInputTokens", 0),
+                "cache_write_input_tokens": token_usage.get(
+                    "cacheWriteInputTokens", 0
+                ),
+                "stop_reason": stop_reason,
+            }
+        )
+
+
+def generate_tool_use(model_id, system_prompts, messages, tool_spec, temperature=0.5):
+    """
+    Sends messages to a model and forces it to answer through a tool, so the
+    output follows the tool's JSON schema.
+    Args:
+        model_id (str): The model ID to use.
+        system_prompts (JSON) : The system prompts for the model to use.
+        messages (JSON) : The messages to send to the model.
+        tool_spec (JSON) : The toolSpec with name, description and inputSchema.
+        temperature (float) : The sampling temperature.
+
+    Returns:
+        tool_input (JSON): The arguments the model passed to the tool, or None
+            if it did not call the tool.
+        stop_reason (str): Why the model stopped generating.
+
+    """
+
+    print(f"Generating tool use with model {model_id}")
+
+    # Check the request size locally before paying for the round trip.
+    plan = plan_request(model_id, system_prompts, messages)
+
+    start_time = time.perf_counter()
+    try:
+        response = runtime_client().converse(
+            modelId=model_id,
+            messages=messages,
+            system=system_prompts,
+            inferenceConfig={
+                "temperature": temperature,
+                "maxTokens": plan["max_tokens"],
+            },
+            toolConfig={
+                "tools": [{"toolSpec": tool_spec}],
+                "toolChoice": {"any": {}},
+            },
+        )
+    except ClientError as error:
+        metrics.record_error(model_id, error_code(error))
+        raise
+
+    # Record latency and token usage.
+    metrics.record_call(
+        model_id,
+        time.perf_counter() - start_time,
+        usage=response["usage"],
+        retries=response.get("ResponseMetadata", {}).get("RetryAttempts", 0),
+        stop_reason=response["stopReason"],
+    )
+
+    for content_block in response["output"]["message"]["content"]:
+        if "toolUse" in content_block:
+            return content_block["toolUse"]["input"], response["stopReason"]
+
+    return None, response["stopReason"]
+
+
+def generate_tool_use_stream(
+    model_id, system_prompts, messages, tool_spec, temperature=0.0, task=None
+):
+    """
+    Like generate_tool_use, but streams the tool input and validates it
+    against the tool's schema as the deltas arrive. The stream is closed at
+    the first field that breaks the schema, so no tokens are spent on the
+    rest of a bad answer.
+    Args:
+        model_id (str): The model ID to use.
+        system_prompts (JSON) : The system prompts for the model to use.
+        messages (JSON) : The messages to send to the model.
+        tool_spec (JSON) : The toolSpec with name, description and inputSchema.
+        temperature (float) : The sampling temperature.
+        task (str) : Task label for the metrics, e.g. "sentiment".
+
+    Returns:
+        tool_input (JSON): The validated arguments the model passed to the tool.
+
+    Raises:
+        SchemaValidationError: If the output does not match the schema.
+    """
+
+    print(f"Streaming tool use with model {model_id}")
+
+    # Check the request size locally before paying for the round trip.
+    plan = plan_request(model_id, system_prompts, messages)
+
+    start_time = time.perf_counter()
+    first_token_time = None
+    token_usage = {}
+    stop_reason = None
+    validator = IncrementalValidator(tool_spec["inputSchema"]["json"])
+    called_tool = False
+
+    try:
+        response = runtime_client().converse_stream(
+            modelId=model_id,
+            messages=messages,
+            system=system_prompts,
+            inferenceConfig={
+                "temperature": temperature,
+                "maxTokens": plan["max_tokens"],
+            },
+            toolConfig={
+                "tools": [{"toolSpec": tool_spec}],
+                "toolChoice": {"any": {}},
+            },
+        )
+    except ClientError as error:
+        metrics.record_error(model_id, error_code(error), task=task)
+        raise
+
+    stream = response["stream"]
+    try:
+        for event in stream:
+            if "contentBlockStart" in event:
+                start = event["contentBlockStart"].get("start", {})
+                called_tool = called_tool or "toolUse" in start
+            elif "contentBlockDelta" in event:
+                tool_input = event["contentBlockDelta"]["delta"].get("toolUse")
+                if tool_input:
+                    if first_token_time is None:
+                        first_token_time = time.perf_counter()
+                    validator.feed(tool_input["input"])
+            elif "messageStop" in event:
+                stop_reason = event["messageStop"]["stopReason"]
+            elif "metadata" in event:
+                token_usage = event["metadata"].get("usage", {})
+
+        if not called_tool:
+            raise SchemaValidationError("$", "the model did not call the tool")
+        if stop_reason == "max_tokens":
+            raise SchemaValidationError("$", "output was truncated")
+        result = validator.close()
+    except SchemaValidationError:
+        stream.close()
+        metrics.record_error(model_id, "SchemaValidationError", task=task)
+        raise
+
+    metrics.record_call(
+        model_id,
+        time.perf_counter() - start_time,
+        usage=token_usage,
+        time_to_first_token=(
+            first_token_time - start_time if first_token_time is not None else None
+        ),
+        retries=response.get("ResponseMetadata", {}).get("RetryAttempts", 0),
+        stop_reason=stop_reason,
+        task=task,
+    )
+
+    return result
+
+
 model_ids = [
-    "us.anthropic.claude-3-5-sonnet-20241022-v2:0"
+    "us.anthropic.claude-3-5-sonnet-20241022-v2:0",
     "us.anthropic.claude-3-5-haiku-20241022-v1:0",
     "meta.llama3-1-70b-instruct-v1:0",
     "meta.llama3-1-405b-instruct-v1:0",
@@ -68,13 +475,51 @@ model_ids = [
 ]
 
 
-def summarize_text(text):
+# Set to a ModelRouter to pick the model per task instead of the defaults below.
+model_router = None
+
+
+def run_task(task, model_id, build_request, use_cache=None):
     """
-    Function to summarize text using a generative AI model.
+    Runs a task on model_id, or on the model picked by model_router if set.
+    Args:
+        task (str): The task name used for routing, e.g. "summarize".
+        model_id (str): The model to use when no router is set.
+        build_request (callable): Maps a model ID to (system_prompts, messages).
+        use_cache (bool) : Passed to generate_conversation.
+
+    Returns:
+        response (JSON): The conversation that the model generated.
     """
 
-    model_id = "us.amazon.nova-pro-v1:0"
-    # Setup the system prompts and messages to send to the model.
+    def request_fn(candidate_model_id):
+        usage = {}
+        system_prompts, messages = build_request(candidate_model_id)
+        result = generate_conversation(
+            candidate_model_id,
+            system_prompts,
+            messages,
+            use_cache=use_cache,
+            usage=usage,
+        )
+        return result, usage
+
+    with task_scope(task):
+        if model_router is None:
+            system_prompts, messages = build_request(model_id)
+            return generate_conversation(
+                model_id, system_prompts, messages, use_cache=use_cache
+            )
+
+        result, _ = model_router.call(task, request_fn)
+        return result
+
+
+SUMMARIZE_MODEL_ID = "us.amazon.nova-pro-v1:0"
+
+
+def summarize_request(text):
+    """Returns the system prompts and messages that summarize a text."""
     system_prompts = [
         {"text": "You are an app that creates summaries of text in 50 words or less."}
     ]
@@ -83,20 +528,113 @@ def summarize_text(text):
         "content": [{"text": f"Summarize the following text: {text}."}],
     }
 
-    messages = [message_1]
+    return system_prompts, [message_1]
 
-    result = generate_conversation(model_id, system_prompts, messages)
 
-    return result
+def summarize_text(text, stream=False, use_cache=None):
+    """
+    Function to summarize text using a generative AI model.
+    If stream is True, a generator of text deltas is returned instead.
+    """
+
+    model_id = SUMMARIZE_MODEL_ID
+    # Setup the system prompts and messages to send to the model.
+    system_prompts, messages = summarize_request(text)
+
+    # The request is planned once, here for a stream and in
+    # generate_conversation otherwise.
+    try:
+        if stream:
+            plan = plan_request(model_id, system_prompts, messages)
+            return generate_conversation_stream(
+                model_id, system_prompts, messages, task="summarize", plan=plan
+            )
+
+        return run_task(
+            "summarize",
+            model_id,
+            lambda _: (system_prompts, messages),
+            use_cache=use_cache,
+        )
+    except RequestTooLargeError:
+        print("Text is too long for one request, summarizing it in chunks")
+        return summarize_long_text(text, stream=stream, use_cache=use_cache)
+
+
+# Output budget of a section summary in summarize_long_text.
+SECTION_SUMMARY_TOKENS = 400
 
 
-def sentiment_analysis(text):
+def summarize_section(text):
     """
-    Function to return a JSON object of sentiment from a given text.
+    Summarizes one section of a longer document, or a group of section
+    summaries. Results are cached by content, so an unchanged section is
+    never summarized twice.
     """
 
-    model_id = "us.anthropic.claude-3-5-sonnet-20241022-v2:0"
-    # Setup the system prompts and messages to send to the model.
+    system_prompts = [
+        {
+            "text": "You are an app that summarizes one section of a longer document in 150 words or less. Keep the key facts, names and numbers."
+        }
+    ]
+    message_1 = {
+        "role": "user",
+        "content": [{"text": f"Summarize the following section: {text}."}],
+    }
+
+    with task_scope("summarize"):
+        return generate_conversation(
+            SUMMARIZE_MODEL_ID,
+            system_prompts,
+            [message_1],
+            temperature=0,
+            use_cache=True,
+            max_tokens=SECTION_SUMMARY_TOKENS,
+        )
+
+
+def summarize_long_text(
+    text,
+    stream=False,
+    use_cache=None,
+    max_chunk_tokens=8000,
+    fan_in=8,
+    max_workers=8,
+):
+    """
+    Function to summarize a document of any length.
+    The text is split into content-defined chunks that are summarized in
+    parallel. The summaries are merged fan_in at a time, level by level,
+    until at most fan_in remain, and those get the usual 50-word summary.
+    Args:
+        text (str): The document to summarize.
+        stream (bool): Return a generator of text deltas for the final summary.
+        use_cache (bool): Passed to summarize_text for the final summary.
+        max_chunk_tokens (int): Upper bound on the tokens of a chunk.
+        fan_in (int): Summaries merged into one at each level of the tree.
+        max_workers (int): Upper bound on concurrent Bedrock calls.
+    """
+
+    chunks = content_defined_chunks(text, SUMMARIZE_MODEL_ID, max_chunk_tokens)
+    print(f"Summarizing {len(chunks)} chunks with up to {max_workers} workers")
+
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        summaries = list(map_in_context(executor, summarize_section, chunks))
+        while len(summaries) > fan_in:
+            groups = [
+                "\n\n".join(summaries[index : index + fan_in])
+                for index in range(0, len(summaries), fan_in)
+            ]
+            summaries = list(map_in_context(executor, summarize_section, groups))
+
+    return summarize_text("\n\n".join(summaries), stream=stream, use_cache=use_cache)
+
+
+SENTIMENT_MODEL_ID = "us.anthropic.claude-3-5-sonnet-20241022-v2:0"
+
+
+def sentiment_request(text):
+    """Returns the system prompts and messages for sentiment analysis."""
     system_prompts = [
         {
             "text": "You are a bot that takes text and returns a JSON object of sentiment analysis."
@@ -107,35 +645,297 @@ def sentiment_analysis(text):
         "content": [{"text": f"{text}"}],
     }
 
-    messages = [message_1]
+    return system_prompts, [message_1]
+
+
+SENTIMENT_TOOL = {
+    "name": "record_sentiment",
+    "description": "Record the sentiment of the text.",
+    "inputSchema": {
+        "json": {
+            "type": "object",
+            "properties": {
+                "sentiment": {
+                    "type": "string",
+                    "enum": ["positive", "negative", "neutral", "mixed"],
+                },
+                "confidence": {
+                    "type": "number",
+                    "minimum": 0,
+                    "maximum": 1,
+                    "description": "How sure you are of the sentiment.",
+                },
+                "explanation": {
+                    "type": "string",
+                    "description": "One sentence on what drives the sentiment.",
+                },
+            },
+            "required": ["sentiment", "confidence", "explanation"],
+            "additionalProperties": False,
+        }
+    },
+}
+
+
+class SentimentResult:
+    """
+    Parsed output of a structured sentiment analysis.
+    Attributes:
+        sentiment (str): "positive", "negative", "neutral" or "mixed".
+        confidence (float): Between 0 and 1.
+        explanation (str): What drives the sentiment.
+        attempts (int): Model calls it took to get valid output.
+    """
 
-    result = generate_conversation(model_id, system_prompts, messages)
+    def __init__(self, sentiment, confidence, explanation, attempts=1):
+        self.sentiment = sentiment
+        self.confidence = float(confidence)
+        self.explanation = explanation
+        self.attempts = attempts
+
+    def to_dict(self):
+        return {
+            "sentiment": self.sentiment,
+            "confidence": self.confidence,
+            "explanation": self.explanation,
+        }
+
+    def __repr__(self):
+        return (
+            f"SentimentResult(sentiment={self.sentiment!r}, "
+            f"confidence={self.confidence}, explanation={self.explanation!r})"
+        )
+
+
+def analyze_sentiment(text, max_attempts=3):
+    """
+    Function to return the sentiment of a text as a SentimentResult.
+    The model answers through SENTIMENT_TOOL and the answer is validated as
+    it streams. Output that breaks the schema is retried up to max_attempts
+    times.
+    """
+
+    system_prompts, messages = sentiment_request(text)
+    for attempt in range(1, max_attempts + 1):
+        try:
+            tool_input = generate_tool_use_stream(
+                SENTIMENT_MODEL_ID,
+                system_prompts,
+                messages,
+                SENTIMENT_TOOL,
+                task="sentiment",
+            )
+        except SchemaValidationError as error:
+            if attempt == max_attempts:
+                raise
+            print(f"Sentiment output was invalid ({error}), retrying")
+            continue
+        return SentimentResult(**tool_input, attempts=attempt)
+
+
+def analyze_sentiment_bulk(texts, max_workers=8, max_attempts=3):
+    """
+    Function to run analyze_sentiment over many texts in parallel.
+    Each text is retried on its own, so one bad answer does not redo the rest.
+    Returns a list in the same order as texts, with None for texts that had
+    no valid answer after max_attempts.
+    """
+
+    def analyze(text):
+        try:
+            return analyze_sentiment(text, max_attempts=max_attempts)
+        except (SchemaValidationError, ClientError) as error:
+            print(f"Sentiment analysis failed: {error}")
+            return None
+
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        return list(map_in_context(executor, analyze, texts))
+
+
+def sentiment_analysis(text, use_cache=None, structured=False):
+    """
+    Function to return a JSON object of sentiment from a given text.
+    If structured is True, a schema-checked SentimentResult is returned
+    instead of the model's free text.
+    """
+
+    if structured:
+        return analyze_sentiment(text)
+
+    model_id = SENTIMENT_MODEL_ID
+    # Setup the system prompts and messages to send to the model.
+    system_prompts, messages = sentiment_request(text)
+
+    result = run_task(
+        "sentiment",
+        model_id,
+        lambda _: (system_prompts, messages),
+        use_cache=use_cache,
+    )
 
     return result
 
 
-def perform_qa(question, text):
+QA_MODEL_ID = "us.amazon.nova-pro-v1:0"
+
+
+def qa_system_prompts(text, model_id):
+    """
+    Returns the Q&A system prompts for a source text.
+    The document is the same for every question, so it is marked as a
+    cacheable prefix and only the question is processed on repeat calls.
+    """
+    return add_cache_point(
+        [
+            {
+                "text": f"Given the following text, answer the question. If the answer is not in the text, 'say you do not know'. Here is the text: {text}"
+            }
+        ],
+        model_id,
+    )
+
+
+def qa_request(question, text, model_id=QA_MODEL_ID):
+    """Returns the system prompts and messages that ask a question of a text."""
+    message_1 = {
+        "role": "user",
+        "content": [{"text": f"{question}"}],
+    }
+
+    return qa_system_prompts(text, model_id), [message_1]
+
+
+def perform_qa(
+    question, text, stream=False, use_cache=None, use_semantic_cache=False
+):
     """
     Function to perform a Q&A operation based on the provided text.
+    If stream is True, a generator of text deltas is returned instead.
+    If use_semantic_cache is True, answers to paraphrases of earlier
+    questions about the same text are served from qa_semantic_cache.
     """
 
-    model_id = "mistral.mistral-large-2402-v1:0"
+    question_vector = None
+    if use_semantic_cache:
+        answer, similarity, question_vector = qa_semantic_cache.lookup(
+            question, text
+        )
+        if answer is not None:
+            print(f"Served from semantic cache (similarity {similarity:.3f})")
+            return iter([answer]) if stream else answer
+
+    model_id = QA_MODEL_ID
     # Setup the system prompts and messages to send to the model.
-    system_prompts = [
-        {
-            "text": f"Given the following text, answer the question. If the answer is not in the text, 'say you do not know'. Here is the text: {text}"
+    system_prompts, messages = qa_request(question, text, model_id)
+
+    if stream:
+        text_deltas = generate_conversation_stream(
+            model_id, system_prompts, messages, task="qa"
+        )
+        if use_semantic_cache:
+            return _store_streamed_answer(
+                text_deltas, question, text, question_vector
+            )
+        return text_deltas
+
+    result = run_task(
+        "qa",
+        model_id,
+        lambda routed_model_id: qa_request(question, text, routed_model_id),
+        use_cache=use_cache,
+    )
+
+    if use_semantic_cache:
+        qa_semantic_cache.store(question, text, result, question_vector)
+
+    return result
+
+
+def _store_streamed_answer(text_deltas, question, text, question_vector):
+    """Passes the deltas through and caches the full answer at the end."""
+    answer = []
+    for text_delta in text_deltas:
+        answer.append(text_delta)
+        yield text_delta
+    qa_semantic_cache.store(question, text, "".join(answer), question_vector)
+
+
+QA_BATCH_TOOL = {
+    "name": "answer_questions",
+    "description": "Record the answer to every numbered question.",
+    "inputSchema": {
+        "json": {
+            "type": "object",
+            "properties": {
+                "answers": {
+                    "type": "array",
+                    "items": {
+                        "type": "object",
+                        "properties": {
+                            "id": {
+                                "type": "integer",
+                                "description": "The number of the question.",
+                            },
+                            "answer": {"type": "string"},
+                        },
+                        "required": ["id", "answer"],
+                    },
+                }
+            },
+            "required": ["answers"],
         }
-    ]
+    },
+}
+
+
+def perform_qa_batch(questions, text):
+    """
+    Function to answer many questions about the same text in one model call.
+    The answers come back through a tool with a JSON schema and are mapped to
+    the questions by number. If the output is cut off or does not cover every
+    question, the batch is split in half and each half is retried.
+    Returns a list of answers in the same order as questions.
+    """
+
+    if not questions:
+        return []
+    if len(questions) == 1:
+        return [perform_qa(questions[0], text)]
+
+    model_id = QA_MODEL_ID
+    # Same cached document prefix as perform_qa.
+    system_prompts = qa_system_prompts(text, model_id)
+    numbered_questions = "\n".join(
+        f"{number}. {question}" for number, question in enumerate(questions, 1)
+    )
     message_1 = {
         "role": "user",
-        "content": [{"text": f"{question}"}],
+        "content": [
+            {
+                "text": "Answer each of the following questions. Call answer_questions "
+                f"once with one answer per question number.\n{numbered_questions}"
+            }
+        ],
     }
 
     messages = [message_1]
 
-    result = generate_conversation(model_id, system_prompts, messages)
-
-    return result
+    try:
+        with task_scope("qa"):
+            tool_input, stop_reason = generate_tool_use(
+                model_id, system_prompts, messages, QA_BATCH_TOOL
+            )
+        answers = {int(item["id"]): item["answer"] for item in tool_input["answers"]}
+        if stop_reason == "max_tokens":
+            raise ValueError("Output was truncated")
+        return [answers[number] for number in range(1, len(questions) + 1)]
+    except (KeyError, TypeError, ValueError) as error:
+        print(f"Batch of {len(questions)} questions failed ({error!r}), splitting")
+
+    middle = len(questions) // 2
+    return perform_qa_batch(questions[:middle], text) + perform_qa_batch(
+        questions[middle:], text
+    )
 
 
 if __name__ == "__main__":
@@ -150,8 +950,21 @@ if __name__ == "__main__":
     print("\n=== Sentiment Analysis Example ===")
     sentiment_analysis_json = sentiment_analysis(text)
     print(f"Sentiment_Analysis JSON:\n{sentiment_analysis_json}")
+
+    print("\n=== Structured Sentiment Analysis Example ===")
+    print(sentiment_analysis(text, structured=True))
+    time.sleep(2)
+
+    print("\n=== Streaming Summarization Example ===")
+    for text_delta in summarize_text(text, stream=True):
+        print(text_delta, end="", flush=True)
     time.sleep(2)
 
+    print("\n=== Long Document Summarization Example ===")
+    with open("../datasets/well_arch_text_sample.csv", encoding="utf-8") as csv_file:
+        document = "\n\n".join(row["page_content"] for row in csv.DictReader(csv_file))
+    print(f"Summary:\n{summarize_long_text(document)}")
+
     print("\n=== Q&A Example ===")
 
     q1 = "How many companies have models in Amazon Bedrock?"
@@ -170,3 +983,17 @@ if __name__ == "__main__":
     print(q3)
     answer = perform_qa(q3, text)
     print(f"Answer: {answer}\n")
+
+    print("\n=== Batched Q&A Example ===")
+    for question, answer in zip([q1, q2, q3], perform_qa_batch([q1, q2, q3], text)):
+        print(f"{question}\nAnswer: {answer}\n")
+
+    q4 = "Which companies have models in Amazon Bedrock?"
+    print(q4)
+    perform_qa(q1, text, use_semantic_cache=True)
+    answer = perform_qa(q4, text, use_semantic_cache=True)
+    print(f"Answer: {answer}\n")
+
+    print(f"Metrics:\n{json.dumps(metrics.snapshot(), indent=2)}")
+    print(f"Response cache: {response_cache.stats()}")
+    print(f"Semantic cache: {qa_semantic_cache.stats()}")
@@ -0,0 +1,302 @@
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+
+from gen_text import runtime_client
+from metrics import current_task, metrics
+from model_router import percentile
+
+
+class _Attempt:
+    """One streamed converse request taking part in a hedged call."""
+
+    def __init__(self, model_id, start_time):
+        self.model_id = model_id
+        self.start_time = start_time
+        self.run_time = None
+        self.first_token_time = None
+        self.time_to_first_token = None
+        self.deltas = 0
+        self.text = []
+        self.usage = {}
+        self.stop_reason = None
+        self.error = None
+        self.cancelled = False
+        self.stream = None
+        self.future = None
+        self.running = threading.Event()
+        self.done = threading.Event()
+
+    def got_first_token(self):
+        self.first_token_time = time.perf_counter()
+        self.time_to_first_token = self.first_token_time - self.start_time
+
+
+class _Race:
+    """Decides which attempt produced a first token first."""
+
+    def __init__(self):
+        self.attempts = []
+        self.winner = None
+        self._condition = threading.Condition()
+
+    def add(self, attempt):
+        with self._condition:
+            self.attempts.append(attempt)
+
+    def first_token(self, attempt):
+        with self._condition:
+            if self.winner is None:
+                self.winner = attempt
+            self._condition.notify_all()
+            return self.winner is attempt
+
+    def failed(self):
+        with self._condition:
+            self._condition.notify_all()
+
+    def wait(self, timeout=None):
+        """Waits for a winner, or until every attempt has failed."""
+        with self._condition:
+            self._condition.wait_for(
+                lambda: self.winner is not None
+                or all(attempt.error is not None for attempt in self.attempts),
+                timeout,
+            )
+            return self.winner
+
+
+class HedgedConverse:
+    """
+    Drop-in for bedrock_runtime.converse that hedges slow calls.
+    The call is made with converse_stream. If no token has arrived after the
+    hedge_percentile of recent time-to-first-token, a duplicate request is
+    sent to the backup model (e.g. a cross-region inference profile of the
+    same model). Whichever streams a token first wins and the other stream is
+    closed. A token bucket caps hedges at max_hedge_ratio of all requests.
+    The hedge timer starts once the primary stream is running, so time spent
+    waiting for a worker thread does not trigger hedges. The tokens billed
+    for losing streams are recorded in metrics as discarded.
+    """
+
+    def __init__(
+        self,
+        client=None,
+        backup_models=None,
+        hedge_percentile=0.95,
+        max_hedge_ratio=0.05,
+        max_hedge_burst=5,
+        initial_delay=2.0,
+        min_samples=20,
+        window=500,
+        max_workers=32,
+    ):
+        """
+        Args:
+            client: The Boto3 Bedrock runtime client. Defaults to the
+                runtime_client() of each caller, so client_scope applies.
+            backup_models (dict): Maps a model ID to the model or inference
+                profile used for its hedge. Unlisted models hedge to themselves.
+            hedge_percentile (float): Percentile of recent time-to-first-token
+                after which a hedge is sent.
+            max_hedge_ratio (float): Long-run share of requests that may hedge.
+            max_hedge_burst (int): Hedges that may be sent back to back.
+            initial_delay (float): Hedge delay in seconds until min_samples
+                first-token times have been seen.
+            min_samples (int): Samples needed before the percentile is used.
+            window (int): Number of recent first-token times kept.
+            max_workers (int): Threads available for in-flight streams. Set
+                it to at least twice the number of concurrent callers, so
+                neither primaries nor hedges wait for a thread.
+        """
+        self.client = client
+        self.backup_models = backup_models or {}
+        self.hedge_percentile = hedge_percentile
+        self.max_hedge_ratio = max_hedge_ratio
+        self.max_hedge_burst = max_hedge_burst
+        self.initial_delay = initial_delay
+        self.min_samples = min_samples
+        self.requests = 0
+        self.hedges = 0
+        self.hedge_wins = 0
+        self._budget = float(max_hedge_burst)
+        self._first_token_times = deque(maxlen=window)
+        self._lock = threading.Lock()
+        self._executor = ThreadPoolExecutor(max_workers=max_workers)
+
+    def hedge_delay(self):
+        """Returns how long to wait for a first token before hedging."""
+        with self._lock:
+            samples = list(self._first_token_times)
+        if len(samples) < self.min_samples:
+            return self.initial_delay
+        return percentile(samples, self.hedge_percentile)
+
+    def _take_hedge_budget(self):
+        with self._lock:
+            if self._budget < 1:
+                return False
+            self._budget -= 1
+            self.hedges += 1
+            return True
+
+    def _start(self, client, model_id, kwargs, race, start_time):
+        attempt = _Attempt(model_id, start_time)
+        race.add(attempt)
+        attempt.future = self._executor.submit(
+            self._run, client, attempt, kwargs, race
+        )
+        return attempt
+
+    def _run(self, client, attempt, kwargs, race):
+        attempt.run_time = time.perf_counter()
+        attempt.running.set()
+        try:
+            response = client.converse_stream(modelId=attempt.model_id, **kwargs)
+            attempt.stream = response["stream"]
+            if attempt.cancelled:
+                # Cancelled while the request was being sent.
+                return
+            for event in attempt.stream:
+                if attempt.cancelled:
+                    break
+                if "contentBlockDelta" in event:
+                    text = event["contentBlockDelta"]["delta"].get("text")
+                    if text:
+                        attempt.deltas += 1
+                        if attempt.time_to_first_token is None:
+                            attempt.got_first_token()
+                            if not race.first_token(attempt):
+                                break
+                        attempt.text.append(text)
+                elif "messageStop" in event:
+                    attempt.stop_reason = event["messageStop"]["stopReason"]
+                elif "metadata" in event:
+                    attempt.usage = event["metadata"].get("usage", {})
+        except Exception as error:
+            if not attempt.cancelled:
+                attempt.error = error
+                race.failed()
+        finally:
+            if (
+                attempt.error is None
+                and attempt.time_to_first_token is None
+                and not attempt.cancelled
+            ):
+                # A response without any text still finishes the race.
+                attempt.got_first_token()
+                race.first_token(attempt)
+            if attempt.cancelled:
+                # _cancel may have run before the stream was assigned.
+                self._close(attempt)
+            attempt.done.set()
+
+    def _close(self, attempt):
+        if attempt.stream is not None:
+            try:
+                attempt.stream.close()
+            except Exception:
+                pass
+
+    def _cancel(self, attempt):
+        attempt.cancelled = True
+        self._close(attempt)
+
+    def _record_discarded(self, attempt, winner_usage, task):
+        """
+        Records the tokens billed for a losing stream. Its usage is only
+        known if it ran to the end. Otherwise the input is the same prompt
+        as the winner's and each text delta received counts as one token.
+        """
+        if attempt.error is not None or attempt.run_time is None:
+            return
+        usage = attempt.usage or {
+            "inputTokens": winner_usage.get("inputTokens", 0),
+            "outputTokens": attempt.deltas,
+        }
+        metrics.record_discarded(attempt.model_id, usage, task=task)
+
+    def converse(self, modelId, **kwargs):
+        """
+        Same arguments and response shape as bedrock_runtime.converse, with an
+        extra "hedge" key describing what happened.
+        """
+        start_time = time.perf_counter()
+        task = current_task()
+        # Looked up here, as the worker threads do not see client_scope.
+        client = self.client or runtime_client()
+        with self._lock:
+            self.requests += 1
+            self._budget = min(
+                self.max_hedge_burst, self._budget + self.max_hedge_ratio
+            )
+
+        race = _Race()
+        primary = self._start(client, modelId, kwargs, race, start_time)
+        primary.running.wait()
+        winner = race.wait(self.hedge_delay())
+
+        backup = None
+        if winner is None and primary.error is None and self._take_hedge_budget():
+            backup_model_id = self.backup_models.get(modelId, modelId)
+            print(f"Hedging {modelId} with {backup_model_id}")
+            backup = self._start(client, backup_model_id, kwargs, race, start_time)
+            winner = race.wait()
+        elif winner is None:
+            winner = race.wait()
+
+        if winner is None:
+            raise primary.error
+
+        for attempt in race.attempts:
+            if attempt is not winner:
+                self._cancel(attempt)
+
+        winner.done.wait()
+        if winner.error is not None:
+            raise winner.error
+
+        for attempt in race.attempts:
+            if attempt is not winner:
+                attempt.future.add_done_callback(
+                    lambda _, attempt=attempt: self._record_discarded(
+                        attempt, winner.usage, task
+                    )
+                )
+
+        with self._lock:
+            self._first_token_times.append(
+                winner.first_token_time - winner.run_time
+            )
+            if backup is not None and winner is backup:
+                self.hedge_wins += 1
+
+        return {
+            "output": {
+                "message": {
+                    "role": "assistant",
+                    "content": [{"text": "".join(winner.text)}],
+                }
+            },
+            "usage": winner.usage,
+            "stopReason": winner.stop_reason,
+            "hedge": {
+                "hedged": backup is not None,
+                "winner_model_id": winner.model_id,
+                "time_to_first_token": winner.time_to_first_token,
+            },
+        }
+
+    def stats(self):
+        """Returns the hedge rate and the share of hedges that won."""
+        hedge_delay = self.hedge_delay()
+        with self._lock:
+            return {
+                "requests": self.requests,
+                "hedges": self.hedges,
+                "hedge_wins": self.hedge_wins,
+                "hedge_rate": self.hedges / self.requests if self.requests else 0.0,
+                "win_rate": self.hedge_wins / self.hedges if self.hedges else 0.0,
+                "hedge_delay": hedge_delay,
+            }
@@ -2,19 +2,17 @@ import base64
 import json
 from io import BytesIO
 
-import boto3
 import streamlit as st
 
+from bedrock_client import get_client
+
 st.title("Building with Bedrock")  # Title of the application
 st.subheader("Image Generation Demo")
 
 REGION = "us-east-1"
 
 # Define bedrock
-bedrock_runtime = boto3.client(
-    service_name="bedrock-runtime",
-    region_name=REGION,
-)
+bedrock_runtime = get_client("bedrock-runtime", REGION)
 
 
 def base64_to_image(base64_string):
@@ -2,20 +2,18 @@ import base64
 import io
 import json
 
-import boto3
 import streamlit as st
 from PIL import Image
 
+from bedrock_client import get_client
+
 st.title("Building with Bedrock")  # Title of the application
 st.subheader("Image Understanding Demo")
 
 REGION = "us-east-1"
 
 # Define bedrock
-bedrock_runtime = boto3.client(
-    service_name="bedrock-runtime",
-    region_name=REGION,
-)
+bedrock_runtime = get_client("bedrock-runtime", REGION)
 
 
 def call_claude_sonnet(base64_string):
@@ -3,17 +3,15 @@ import io
 import json
 import os
 
-import boto3
 import streamlit as st
 from PIL import Image, ImageOps
 
+from bedrock_client import get_client
+
 REGION = "us-east-1"
 
 # Define bedrock
-bedrock_runtime = boto3.client(
-    service_name="bedrock-runtime",
-    region_name=REGION,
-)
+bedrock_runtime = get_client("bedrock-runtime", REGION)
 
 
 def inpaint_mask(img, box):
@@ -0,0 +1,336 @@
+import contextvars
+import json
+import math
+import os
+import threading
+import time
+import weakref
+from contextlib import contextmanager
+
+# Histogram bucket upper bounds, fixed up front so recording never allocates.
+LATENCY_BUCKETS = (0.1, 0.25, 0.5, 1, 2, 4, 8, 15, 30, 60, 120, math.inf)
+TIME_TO_FIRST_TOKEN_BUCKETS = (0.05, 0.1, 0.2, 0.3, 0.5, 0.75, 1, 2, 4, 8, math.inf)
+TOKENS_PER_SECOND_BUCKETS = (5, 10, 20, 40, 60, 80, 100, 150, 200, 300, math.inf)
+
+HISTOGRAMS = {
+    "bedrock_request_latency_seconds": LATENCY_BUCKETS,
+    "bedrock_time_to_first_token_seconds": TIME_TO_FIRST_TOKEN_BUCKETS,
+    "bedrock_output_tokens_per_second": TOKENS_PER_SECOND_BUCKETS,
+}
+
+HELP = {
+    "bedrock_requests_total": "Completed Bedrock model calls.",
+    "bedrock_errors_total": "Bedrock model calls that raised an error.",
+    "bedrock_throttles_total": "Calls that failed with a throttling error.",
+    "bedrock_retries_total": "Retries made by the botocore retry handler.",
+    "bedrock_discarded_requests_total": "Hedged calls that lost and were closed.",
+    "bedrock_stop_reasons_total": "Completed calls by stop reason.",
+    "bedrock_input_tokens_total": "Input tokens billed.",
+    "bedrock_output_tokens_total": "Output tokens billed.",
+    "bedrock_cache_read_input_tokens_total": "Input tokens read from prompt cache.",
+    "bedrock_cache_write_input_tokens_total": "Input tokens written to prompt cache.",
+    "bedrock_request_latency_seconds": "End-to-end latency of a model call.",
+    "bedrock_time_to_first_token_seconds": "Time until the first streamed token.",
+    "bedrock_output_tokens_per_second": "Output tokens per second after the first.",
+}
+
+# Error codes with which Bedrock tells a caller to slow down.
+THROTTLING_ERROR_CODES = {
+    "ThrottlingException",
+    "TooManyRequestsException",
+    "ServiceUnavailableException",
+}
+
+_current_task = contextvars.ContextVar("bedrock_task", default="other")
+
+
+@contextmanager
+def task_scope(task):
+    """Labels every call made inside the block with the task name."""
+    token = _current_task.set(task)
+    try:
+        yield
+    finally:
+        _current_task.reset(token)
+
+
+def current_task():
+    """Returns the task label of the calling context."""
+    return _current_task.get()
+
+
+class MetricsCollector:
+    """
+    Per-model, per-task counters and histograms for Bedrock calls.
+    Each thread records into its own shard, so the hot path takes no lock and
+    only bumps preallocated list slots. Shards are merged when exporting.
+    When a thread exits, its shard is folded into a retired total, so pools
+    that come and go do not grow the shard list.
+    """
+
+    def __init__(self):
+        self._shards = []
+        self._retired = {}
+        self._shards_lock = threading.RLock()
+        self._local = threading.local()
+        self.started = time.time()
+
+    def _shard(self):
+        shard = getattr(self._local, "shard", None)
+        if shard is None:
+            shard = {}
+            self._local.shard = shard
+            # Dropped with the thread's locals, which retires the shard.
+            self._local.owner = _ShardOwner()
+            weakref.finalize(self._local.owner, self._retire, shard)
+            with self._shards_lock:
+                self._shards.append(shard)
+        return shard
+
+    def _retire(self, shard):
+        with self._shards_lock:
+            self._shards = [other for other in self._shards if other is not shard]
+            _merge_into(self._retired, shard)
+
+    def _add(self, name, labels, value=1):
+        shard = self._shard()
+        key = (name, labels)
+        series = shard.get(key)
+        if series is None:
+            series = shard[key] = [0]
+        series[0] += value
+
+    def _observe(self, name, labels, value):
+        shard = self._shard()
+        key = (name, labels)
+        buckets = HISTOGRAMS[name]
+        series = shard.get(key)
+        if series is None:
+            # Bucket counts, then sum and count.
+            series = shard[key] = [0] * (len(buckets) + 2)
+        for index, upper_bound in enumerate(buckets):
+            if value <= upper_bound:
+                series[index] += 1
+                break
+        series[-2] += value
+        series[-1] += 1
+
+    def record_call(
+        self,
+        model_id,
+        latency,
+        usage=None,
+        time_to_first_token=None,
+        retries=0,
+        stop_reason=None,
+        task=None,
+    ):
+        """
+        Records a completed call.
+        Args:
+            model_id (str): The model that was called.
+            latency (float): Seconds from request to last byte.
+            usage (dict): The usage block of the response.
+            time_to_first_token (float): Seconds to the first token, if streamed.
+            retries (int): RetryAttempts from the response metadata.
+            stop_reason (str): Why the model stopped, e.g. "max_tokens".
+            task (str): Task label; defaults to the enclosing task_scope.
+        """
+        labels = (("model", model_id), ("task", task or current_task()))
+        usage = usage or {}
+        output_tokens = usage.get("outputTokens", 0)
+
+        self._add("bedrock_requests_total", labels)
+        self._add("bedrock_input_tokens_total", labels, usage.get("inputTokens", 0))
+        self._add("bedrock_output_tokens_total", labels, output_tokens)
+        if usage.get("cacheReadInputTokens"):
+            self._add(
+                "bedrock_cache_read_input_tokens_total",
+                labels,
+                usage["cacheReadInputTokens"],
+            )
+        if usage.get("cacheWriteInputTokens"):
+            self._add(
+                "bedrock_cache_write_input_tokens_total",
+                labels,
+                usage["cacheWriteInputTokens"],
+            )
+        if retries:
+            self._add("bedrock_retries_total", labels, retries)
+        if stop_reason:
+            self._add(
+                "bedrock_stop_reasons_total", labels + (("reason", stop_reason),)
+            )
+
+        self._observe("bedrock_request_latency_seconds", labels, latency)
+        generation_time = latency
+        if time_to_first_token is not None:
+            self._observe(
+                "bedrock_time_to_first_token_seconds", labels, time_to_first_token
+            )
+            generation_time = latency - time_to_first_token
+        if output_tokens and generation_time > 0:
+            self._observe(
+                "bedrock_output_tokens_per_second",
+                labels,
+                output_tokens / generation_time,
+            )
+
+    def record_discarded(self, model_id, usage, task=None):
+        """
+        Records a call whose response was thrown away, e.g. the losing stream
+        of a hedged call. Its tokens are still billed.
+        """
+        labels = (("model", model_id), ("task", task or current_task()))
+        self._add("bedrock_discarded_requests_total", labels)
+        self._add("bedrock_input_tokens_total", labels, usage.get("inputTokens", 0))
+        self._add("bedrock_output_tokens_total", labels, usage.get("outputTokens", 0))
+
+    def record_error(self, model_id, error_code, task=None):
+        """Records a call that failed with error_code."""
+        labels = (("model", model_id), ("task", task or current_task()))
+        self._add("bedrock_errors_total", labels + (("code", error_code),))
+        if error_code in THROTTLING_ERROR_CODES:
+            self._add("bedrock_throttles_total", labels)
+
+    def _merged(self):
+        with self._shards_lock:
+            shards = list(self._shards)
+            merged = {key: list(series) for key, series in self._retired.items()}
+        for shard in shards:
+            _merge_into(merged, shard)
+        return merged
+
+    def snapshot(self):
+        """
+        Returns every series as a JSON-serialisable dict. Histograms include
+        their bucket counts and an estimated p50/p95/p99.
+        """
+        counters = []
+        histograms = []
+        for (name, labels), series in sorted(self._merged().items()):
+            entry = {"name": name, "labels": dict(labels)}
+            if name in HISTOGRAMS:
+                buckets = HISTOGRAMS[name]
+                count = series[-1]
+                entry.update(
+                    {
+                        "buckets": {
+                            _format_bound(bound): value
+                            for bound, value in zip(buckets, series)
+                        },
+                        "sum": series[-2],
+                        "count": count,
+                        "p50": _bucket_percentile(buckets, series, 0.5),
+                        "p95": _bucket_percentile(buckets, series, 0.95),
+                        "p99": _bucket_percentile(buckets, series, 0.99),
+                    }
+                )
+                histograms.append(entry)
+            else:
+                entry["value"] = series[0]
+                counters.append(entry)
+        return {
+            "timestamp": time.time(),
+            "uptime_seconds": time.time() - self.started,
+            "counters": counters,
+            "histograms": histograms,
+        }
+
+    def totals(self, name):
+        """Returns the sum of a counter over all labels."""
+        return sum(
+            series[0]
+            for (series_name, _), series in self._merged().items()
+            if series_name == name
+        )
+
+    def to_prometheus(self):
+        """Returns every series in the Prometheus text exposition format."""
+        lines = []
+        seen = set()
+        for (name, labels), series in sorted(self._merged().items()):
+            if name not in seen:
+                seen.add(name)
+                metric_type = "histogram" if name in HISTOGRAMS else "counter"
+                lines.append(f"# HELP {name} {HELP.get(name, name)}")
+                lines.append(f"# TYPE {name} {metric_type}")
+            if name in HISTOGRAMS:
+                cumulative = 0
+                for bound, value in zip(HISTOGRAMS[name], series):
+                    cumulative += value
+                    bucket_labels = labels + (("le", _format_bound(bound)),)
+                    lines.append(
+                        f"{name}_bucket{_format_labels(bucket_labels)} {cumulative}"
+                    )
+                lines.append(f"{name}_sum{_format_labels(labels)} {series[-2]}")
+                lines.append(f"{name}_count{_format_labels(labels)} {series[-1]}")
+            else:
+                lines.append(f"{name}{_format_labels(labels)} {series[0]}")
+        return "\n".join(lines) + "\n"
+
+    def write_prometheus(self, path):
+        """Writes the text format atomically, e.g. for a textfile collector."""
+        _write_atomic(path, self.to_prometheus())
+
+    def write_json(self, path):
+        """Writes a JSON snapshot atomically."""
+        _write_atomic(path, json.dumps(self.snapshot(), indent=2))
+
+
+class _ShardOwner:
+    """Lives as long as the thread that owns a metrics shard."""
+
+
+def _merge_into(total, shard):
+    """Adds every series of a shard into total."""
+    for key, series in list(shard.items()):
+        summed = total.get(key)
+        if summed is None:
+            total[key] = list(series)
+        else:
+            for index, value in enumerate(series):
+                summed[index] += value
+
+
+def _format_bound(bound):
+    return "+Inf" if bound == math.inf else repr(float(bound))
+
+
+def _format_labels(labels):
+    escaped = (
+        (key, str(value).replace("\\", "\\\\").replace('"', '\\"'))
+        for key, value in labels
+    )
+    return "{" + ",".join(f'{key}="{value}"' for key, value in escaped) + "}"
+
+
+def _bucket_percentile(buckets, series, fraction):
+    """Estimates a percentile by linear interpolation inside the bucket."""
+    count = series[-1]
+    if not count:
+        return None
+    rank = fraction * count
+    cumulative = 0
+    lower_bound = 0.0
+    for bound, value in zip(buckets, series):
+        if cumulative + value >= rank:
+            if bound == math.inf:
+                return lower_bound
+            return lower_bound + (bound - lower_bound) * (rank - cumulative) / value
+        cumulative += value
+        lower_bound = bound
+    return lower_bound
+
+
+def _write_atomic(path, content):
+    directory = os.path.dirname(path) or "."
+    os.makedirs(directory, exist_ok=True)
+    temporary_path = f"{path}.{os.getpid()}.tmp"
+    with open(temporary_path, "w", encoding="utf-8") as output_file:
+        output_file.write(content)
+    os.replace(temporary_path, path)
+
+
+# Collector shared by every module in the process.
+metrics = MetricsCollector()
@@ -0,0 +1,275 @@
+import os
+import sqlite3
+import threading
+import time
+
+from botocore.exceptions import BotoCoreError, ClientError
+
+from metrics import THROTTLING_ERROR_CODES
+
+DEFAULT_STATE_PATH = os.path.join(os.path.dirname(__file__), ".cache", "router.db")
+
+# On-demand USD prices per 1,000 input and output tokens in us-east-1.
+MODEL_PRICES = {
+    "us.anthropic.claude-3-5-sonnet-20241022-v2:0": (0.003, 0.015),
+    "us.anthropic.claude-3-5-haiku-20241022-v1:0": (0.0008, 0.004),
+    "meta.llama3-1-70b-instruct-v1:0": (0.00072, 0.00072),
+    "meta.llama3-1-405b-instruct-v1:0": (0.0024, 0.0024),
+    "meta.llama3-1-8b-instruct-v1:0": (0.00022, 0.00022),
+    "mistral.mistral-large-2402-v1:0": (0.004, 0.012),
+    "us.amazon.nova-pro-v1:0": (0.0008, 0.0032),
+    "us.amazon.nova-lite-v1:0": (0.00006, 0.00024),
+    "us.amazon.nova-micro-v1:0": (0.000035, 0.00014),
+}
+
+# Models that are good enough for each task, in no particular order.
+TASK_CANDIDATES = {
+    "summarize": [
+        "us.amazon.nova-micro-v1:0",
+        "us.amazon.nova-lite-v1:0",
+        "us.amazon.nova-pro-v1:0",
+        "us.anthropic.claude-3-5-haiku-20241022-v1:0",
+        "meta.llama3-1-70b-instruct-v1:0",
+    ],
+    "sentiment": [
+        "us.amazon.nova-lite-v1:0",
+        "us.amazon.nova-pro-v1:0",
+        "us.anthropic.claude-3-5-haiku-20241022-v1:0",
+        "us.anthropic.claude-3-5-sonnet-20241022-v2:0",
+    ],
+    "qa": [
+        "us.amazon.nova-lite-v1:0",
+        "us.amazon.nova-pro-v1:0",
+        "us.anthropic.claude-3-5-haiku-20241022-v1:0",
+        "mistral.mistral-large-2402-v1:0",
+        "us.anthropic.claude-3-5-sonnet-20241022-v2:0",
+    ],
+}
+
+
+def percentile(values, fraction):
+    """Returns the nearest-rank percentile of values, e.g. fraction=0.95."""
+    if not values:
+        return None
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, max(0, int(round(fraction * len(ordered))) - 1))
+    return ordered[index]
+
+
+class ModelRouter:
+    """
+    Picks a model per task from rolling latency, error and cost statistics.
+    Every call outcome is written to a SQLite file, so all worker processes
+    that share the path route on the same data.
+
+    Policies:
+        "cheapest_within_slo": cheapest model whose p95 latency is within
+            latency_slo seconds.
+        "fastest_under_cost": lowest p95 latency among models whose average
+            cost per call is within max_cost_per_call USD.
+    """
+
+    def __init__(
+        self,
+        policy="cheapest_within_slo",
+        latency_slo=5.0,
+        max_cost_per_call=0.01,
+        max_error_rate=0.2,
+        window=200,
+        min_samples=5,
+        refresh_seconds=5.0,
+        prune_every=100,
+        path=DEFAULT_STATE_PATH,
+    ):
+        if policy not in ("cheapest_within_slo", "fastest_under_cost"):
+            raise ValueError(f"Unknown routing policy: {policy}")
+        self.policy = policy
+        self.latency_slo = latency_slo
+        self.max_cost_per_call = max_cost_per_call
+        self.max_error_rate = max_error_rate
+        self.window = window
+        self.min_samples = min_samples
+        self.refresh_seconds = refresh_seconds
+        self.prune_every = prune_every
+        self.path = path
+        self._local = threading.local()
+        self._stats_cache = {}
+        self._records = 0
+        self._lock = threading.Lock()
+
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        with self._connection() as connection:
+            connection.execute(
+                "CREATE TABLE IF NOT EXISTS calls ("
+                "model_id TEXT NOT NULL, task TEXT NOT NULL, "
+                "created REAL NOT NULL, latency REAL NOT NULL, "
+                "ok INTEGER NOT NULL, throttled INTEGER NOT NULL, "
+                "input_tokens INTEGER NOT NULL, output_tokens INTEGER NOT NULL)"
+            )
+            connection.execute(
+                "CREATE INDEX IF NOT EXISTS calls_by_model "
+                "ON calls (model_id, task, created)"
+            )
+
+    def _connection(self):
+        connection = getattr(self._local, "connection", None)
+        if connection is None:
+            connection = sqlite3.connect(self.path, timeout=30)
+            connection.execute("PRAGMA journal_mode=WAL")
+            self._local.connection = connection
+        return connection
+
+    def record(self, model_id, task, latency, ok, throttled=False, usage=None):
+        """Records the outcome of one call."""
+        usage = usage or {}
+        with self._connection() as connection:
+            connection.execute(
+                "INSERT INTO calls VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                (
+                    model_id,
+                    task,
+                    time.time(),
+                    latency,
+                    int(ok),
+                    int(throttled),
+                    usage.get("inputTokens", 0),
+                    usage.get("outputTokens", 0),
+                ),
+            )
+
+        with self._lock:
+            self._records += 1
+            prune = self._records % self.prune_every == 0
+        if prune:
+            self.prune(model_id, task)
+
+    def prune(self, model_id, task):
+        """
+        Deletes the calls of a model for a task that fall outside the
+        rolling window, so the state file stays small.
+        """
+        with self._connection() as connection:
+            connection.execute(
+                "DELETE FROM calls WHERE model_id = ? AND task = ? AND created < ("
+                "SELECT created FROM calls WHERE model_id = ? AND task = ? "
+                "ORDER BY created DESC LIMIT 1 OFFSET ?)",
+                (model_id, task, model_id, task, self.window - 1),
+            )
+
+    def model_stats(self, model_id, task):
+        """
+        Returns rolling p50/p95 latency, error and throttle rates and average
+        cost per call over the last `window` calls of a model for a task.
+        """
+        key = (model_id, task)
+        with self._lock:
+            cached = self._stats_cache.get(key)
+            if cached is not None and time.time() - cached[0] < self.refresh_seconds:
+                return cached[1]
+
+        rows = (
+            self._connection()
+            .execute(
+                "SELECT latency, ok, throttled, input_tokens, output_tokens "
+                "FROM calls WHERE model_id = ? AND task = ? "
+                "ORDER BY created DESC LIMIT ?",
+                (model_id, task, self.window),
+            )
+            .fetchall()
+        )
+
+        input_price, output_price = MODEL_PRICES.get(model_id, (0.0, 0.0))
+        successes = [row for row in rows if row[1]]
+        latencies = [row[0] for row in successes]
+        costs = [
+            row[3] / 1000 * input_price + row[4] / 1000 * output_price
+            for row in successes
+        ]
+        stats = {
+            "samples": len(rows),
+            "p50_latency": percentile(latencies, 0.5),
+            "p95_latency": percentile(latencies, 0.95),
+            "error_rate": (len(rows) - len(successes)) / len(rows) if rows else 0.0,
+            "throttle_rate": sum(row[2] for row in rows) / len(rows) if rows else 0.0,
+            "avg_cost": sum(costs) / len(costs) if costs else None,
+            "input_price": input_price,
+            "output_price": output_price,
+        }
+
+        with self._lock:
+            self._stats_cache[key] = (time.time(), stats)
+        return stats
+
+    def rank(self, task, candidates=None):
+        """
+        Returns the candidate models for a task, best first, per the policy.
+        Models with too few samples are ranked by price so they get explored.
+        Models that break the SLO, the cost ceiling or the error budget go to
+        the back of the list so they are only used for failover.
+        """
+        candidates = candidates or TASK_CANDIDATES[task]
+        preferred = []
+        fallback = []
+
+        for model_id in candidates:
+            stats = self.model_stats(model_id, task)
+            price = stats["input_price"] + stats["output_price"]
+            if stats["samples"] < self.min_samples:
+                preferred.append(((0, price), model_id))
+                continue
+
+            p95 = stats["p95_latency"] if stats["p95_latency"] is not None else 1e9
+            cost = stats["avg_cost"] if stats["avg_cost"] is not None else price
+            healthy = stats["error_rate"] <= self.max_error_rate
+
+            if self.policy == "cheapest_within_slo":
+                eligible = healthy and p95 <= self.latency_slo
+                sort_key = (1, cost) if eligible else (2, p95)
+            else:
+                eligible = healthy and cost <= self.max_cost_per_call
+                sort_key = (1, p95) if eligible else (2, cost)
+
+            (preferred if eligible else fallback).append((sort_key, model_id))
+
+        return [model_id for _, model_id in sorted(preferred) + sorted(fallback)]
+
+    def call(self, task, request_fn, candidates=None):
+        """
+        Runs request_fn(model_id) on the best model for the task and fails
+        over to the next candidate on throttling or errors.
+        request_fn must return (result, usage). Calls served from a cache,
+        marked by usage["cacheHit"], are not recorded.
+        Returns (result, model_id).
+        """
+        last_error = ValueError(f"No candidate models for task {task}")
+        for model_id in self.rank(task, candidates):
+            start_time = time.perf_counter()
+            try:
+                result, usage = request_fn(model_id)
+            except (ClientError, BotoCoreError) as error:
+                if isinstance(error, ClientError):
+                    code = error.response.get("Error", {}).get("Code")
+                else:
+                    code = type(error).__name__
+                self.record(
+                    model_id,
+                    task,
+                    time.perf_counter() - start_time,
+                    ok=False,
+                    throttled=code in THROTTLING_ERROR_CODES,
+                )
+                print(f"Routing {task} away from {model_id}: {code}")
+                last_error = error
+                continue
+
+            if not usage.get("cacheHit"):
+                self.record(
+                    model_id,
+                    task,
+                    time.perf_counter() - start_time,
+                    ok=True,
+                    usage=usage,
+                )
+            return result, model_id
+
+        raise last_error
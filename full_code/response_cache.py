@@ -0,0 +1,192 @@
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+
+DEFAULT_CACHE_PATH = os.path.join(os.path.dirname(__file__), ".cache", "responses.db")
+
+
+def make_cache_key(model_id, system_prompts, messages, inference_config):
+    """
+    Returns a stable hash of a converse request. Dict keys are sorted so
+    logically equal requests always map to the same key.
+    """
+    canonical = json.dumps(
+        {
+            "model_id": model_id,
+            "system": system_prompts,
+            "messages": messages,
+            "inference_config": inference_config,
+        },
+        sort_keys=True,
+        separators=(",", ":"),
+        ensure_ascii=False,
+    )
+    return hashlib.sha256(canonical.encode("utf-8")).hexdigest()
+
+
+class ResponseCache:
+    """
+    Two-tier cache of converse responses.
+    Tier one is an in-process LRU with a size and TTL limit, tier two is a
+    SQLite file shared by every process that points at the same path.
+    Expired rows are deleted when the file is opened and every prune_every
+    writes, which also trims it to the newest max_disk_entries rows.
+    Entries are {"text": ..., "usage": {...}} dicts.
+    """
+
+    def __init__(
+        self,
+        path=DEFAULT_CACHE_PATH,
+        max_entries=1024,
+        ttl_seconds=24 * 3600,
+        max_disk_entries=100_000,
+        prune_every=500,
+    ):
+        self.path = path
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self.max_disk_entries = max_disk_entries
+        self.prune_every = prune_every
+        self._writes = 0
+        self.hits = 0
+        self.memory_hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self.saved_input_tokens = 0
+        self.saved_output_tokens = 0
+        self._memory = OrderedDict()
+        self._lock = threading.Lock()
+        self._local = threading.local()
+
+        if path:
+            os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+            with self._connection() as connection:
+                connection.execute(
+                    "CREATE TABLE IF NOT EXISTS responses ("
+                    "key TEXT PRIMARY KEY, value TEXT NOT NULL, created REAL NOT NULL)"
+                )
+                connection.execute(
+                    "CREATE INDEX IF NOT EXISTS responses_by_created "
+                    "ON responses (created)"
+                )
+            self.prune()
+
+    def _connection(self):
+        # sqlite3 connections can't be shared across threads, so keep one per thread.
+        connection = getattr(self._local, "connection", None)
+        if connection is None:
+            connection = sqlite3.connect(self.path, timeout=30)
+            connection.execute("PRAGMA journal_mode=WAL")
+            self._local.connection = connection
+        return connection
+
+    def _is_fresh(self, created):
+        return self.ttl_seconds is None or time.time() - created < self.ttl_seconds
+
+    def get(self, key):
+        """Returns the cached entry for key, or None on a miss."""
+        with self._lock:
+            item = self._memory.get(key)
+            if item is not None:
+                created, entry = item
+                if self._is_fresh(created):
+                    self._memory.move_to_end(key)
+                    self.memory_hits += 1
+                    self._record_hit(entry)
+                    return entry
+                del self._memory[key]
+
+        if self.path:
+            row = (
+                self._connection()
+                .execute("SELECT value, created FROM responses WHERE key = ?", (key,))
+                .fetchone()
+            )
+            if row is not None and self._is_fresh(row[1]):
+                entry = json.loads(row[0])
+                with self._lock:
+                    self._remember(key, row[1], entry)
+                    self.disk_hits += 1
+                    self._record_hit(entry)
+                return entry
+
+        with self._lock:
+            self.misses += 1
+        return None
+
+    def put(self, key, entry):
+        """Stores entry in both tiers."""
+        created = time.time()
+        with self._lock:
+            self._remember(key, created, entry)
+
+        if self.path:
+            with self._connection() as connection:
+                connection.execute(
+                    "INSERT OR REPLACE INTO responses (key, value, created) "
+                    "VALUES (?, ?, ?)",
+                    (key, json.dumps(entry), created),
+                )
+            with self._lock:
+                self._writes += 1
+                prune = self._writes % self.prune_every == 0
+            if prune:
+                self.prune()
+
+    def prune(self):
+        """
+        Deletes the expired rows of the SQLite tier, then the oldest rows
+        beyond max_disk_entries.
+        """
+        with self._connection() as connection:
+            if self.ttl_seconds is not None:
+                connection.execute(
+                    "DELETE FROM responses WHERE created < ?",
+                    (time.time() - self.ttl_seconds,),
+                )
+            if self.max_disk_entries is not None:
+                connection.execute(
+                    "DELETE FROM responses WHERE created < ("
+                    "SELECT created FROM responses "
+                    "ORDER BY created DESC LIMIT 1 OFFSET ?)",
+                    (self.max_disk_entries - 1,),
+                )
+
+    def clear(self):
+        """Drops every entry from both tiers."""
+        with self._lock:
+            self._memory.clear()
+        if self.path:
+            with self._connection() as connection:
+                connection.execute("DELETE FROM responses")
+
+    def stats(self):
+        """Returns the hit/miss counters and the tokens the hits saved."""
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "memory_hits": self.memory_hits,
+                "disk_hits": self.disk_hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+                "saved_input_tokens": self.saved_input_tokens,
+                "saved_output_tokens": self.saved_output_tokens,
+                "memory_entries": len(self._memory),
+            }
+
+    def _remember(self, key, created, entry):
+        self._memory[key] = (created, entry)
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.max_entries:
+            self._memory.popitem(last=False)
+
+    def _record_hit(self, entry):
+        usage = entry.get("usage", {})
+        self.hits += 1
+        self.saved_input_tokens += usage.get("inputTokens", 0)
+        self.saved_output_tokens += usage.get("outputTokens", 0)
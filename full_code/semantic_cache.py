@@ -0,0 +1,137 @@
+import hashlib
+import threading
+from collections import OrderedDict
+
+import faiss
+import numpy as np
+
+
+def document_key(text):
+    """Returns the hash that scopes cache entries to one source text."""
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+
+class _DocumentScope:
+    """The FAISS index and stored answers for a single source text."""
+
+    def __init__(self, dimension):
+        self.index = faiss.IndexIDMap2(faiss.IndexFlatIP(dimension))
+        self.answers = OrderedDict()
+        self.next_id = 0
+
+
+class SemanticCache:
+    """
+    Answer cache that matches paraphrased questions by embedding similarity.
+    Lookups are scoped by a hash of the source text, so an answer is only
+    reused for the same document. Vectors are L2-normalised, which makes the
+    inner product of the flat index the cosine similarity.
+    """
+
+    def __init__(
+        self,
+        embed_fn,
+        threshold=0.9,
+        max_entries_per_document=256,
+        max_documents=128,
+    ):
+        """
+        Args:
+            embed_fn (callable): Maps a question string to an embedding vector.
+            threshold (float): Minimum cosine similarity for a hit.
+            max_entries_per_document (int): Oldest answers are evicted past this.
+            max_documents (int): Least recently used documents are evicted past this.
+        """
+        self.embed_fn = embed_fn
+        self.threshold = threshold
+        self.max_entries_per_document = max_entries_per_document
+        self.max_documents = max_documents
+        self.hits = 0
+        self.misses = 0
+        self._scopes = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _embed(self, question):
+        vector = np.asarray(self.embed_fn(question), dtype="float32").reshape(1, -1)
+        faiss.normalize_L2(vector)
+        return vector
+
+    def lookup(self, question, text):
+        """
+        Returns (answer, similarity, vector) for the closest stored question
+        about text, or (None, similarity, vector) if nothing is above the
+        threshold. vector is the question's embedding, to pass to store on a
+        miss, or None if the question was not embedded.
+        """
+        key = document_key(text)
+        with self._lock:
+            scope = self._scopes.get(key)
+            if scope is None or scope.index.ntotal == 0:
+                self.misses += 1
+                return None, 0.0, None
+
+        vector = self._embed(question)
+
+        with self._lock:
+            scope = self._scopes.get(key)
+            if scope is None or scope.index.ntotal == 0:
+                self.misses += 1
+                return None, 0.0, vector
+            self._scopes.move_to_end(key)
+            similarities, ids = scope.index.search(vector, 1)
+            similarity = float(similarities[0][0])
+            entry_id = int(ids[0][0])
+            if entry_id == -1 or similarity < self.threshold:
+                self.misses += 1
+                return None, similarity, vector
+            self.hits += 1
+            return scope.answers[entry_id][1], similarity, vector
+
+    def store(self, question, text, answer, vector=None):
+        """
+        Stores the answer to question about text. vector is the question's
+        embedding from lookup; the question is embedded if it is None.
+        """
+        if vector is None:
+            vector = self._embed(question)
+        key = document_key(text)
+
+        with self._lock:
+            scope = self._scopes.get(key)
+            if scope is None:
+                scope = _DocumentScope(vector.shape[1])
+                self._scopes[key] = scope
+            self._scopes.move_to_end(key)
+
+            entry_id = scope.next_id
+            scope.next_id += 1
+            scope.index.add_with_ids(vector, np.array([entry_id], dtype="int64"))
+            scope.answers[entry_id] = (question, answer)
+
+            while len(scope.answers) > self.max_entries_per_document:
+                oldest_id, _ = scope.answers.popitem(last=False)
+                scope.index.remove_ids(np.array([oldest_id], dtype="int64"))
+
+            while len(self._scopes) > self.max_documents:
+                self._scopes.popitem(last=False)
+
+    def invalidate(self, text):
+        """Drops every cached answer about text."""
+        self.invalidate_document(document_key(text))
+
+    def invalidate_document(self, key):
+        """Drops every cached answer for a document hash."""
+        with self._lock:
+            self._scopes.pop(key, None)
+
+    def stats(self):
+        """Returns hit/miss counters and the number of cached answers."""
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+                "documents": len(self._scopes),
+                "entries": sum(len(s.answers) for s in self._scopes.values()),
+            }
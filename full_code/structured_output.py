@@ -0,0 +1,157 @@
+import json
+
+JSON_TYPES = {
+    "object": dict,
+    "array": list,
+    "string": str,
+    "integer": int,
+    "number": (int, float),
+    "boolean": bool,
+}
+
+
+class SchemaValidationError(ValueError):
+    """Raised when model output does not match the expected JSON schema."""
+
+    def __init__(self, path, message):
+        self.path = path
+        super().__init__(f"{path or '$'}: {message}")
+
+
+def validate(value, schema, path="$"):
+    """
+    Checks a value against the subset of JSON schema used by tool specs:
+    type, enum, minimum, maximum, properties, required, items and
+    additionalProperties.
+
+    Raises:
+        SchemaValidationError: At the first part of the value that does not fit.
+    """
+    schema_type = schema.get("type")
+    if schema_type is not None:
+        expected = JSON_TYPES[schema_type]
+        # bool is a subclass of int, but true is not a number in JSON.
+        if not isinstance(value, expected) or (
+            isinstance(value, bool) and schema_type != "boolean"
+        ):
+            raise SchemaValidationError(path, f"expected {schema_type}, got {value!r}")
+
+    if "enum" in schema and value not in schema["enum"]:
+        raise SchemaValidationError(path, f"{value!r} is not one of {schema['enum']}")
+    if "minimum" in schema and value < schema["minimum"]:
+        raise SchemaValidationError(path, f"{value} is below {schema['minimum']}")
+    if "maximum" in schema and value > schema["maximum"]:
+        raise SchemaValidationError(path, f"{value} is above {schema['maximum']}")
+
+    if isinstance(value, dict):
+        properties = schema.get("properties", {})
+        for key in schema.get("required", []):
+            if key not in value:
+                raise SchemaValidationError(path, f"missing required field {key!r}")
+        for key, item in value.items():
+            if key in properties:
+                validate(item, properties[key], f"{path}.{key}")
+            elif schema.get("additionalProperties") is False:
+                raise SchemaValidationError(path, f"unexpected field {key!r}")
+
+    if isinstance(value, list) and "items" in schema:
+        for index, item in enumerate(value):
+            validate(item, schema["items"], f"{path}[{index}]")
+
+
+class IncrementalValidator:
+    """
+    Validates a JSON object as its text arrives in pieces, e.g. the toolUse
+    input deltas of converse_stream. Each top-level field is checked as soon
+    as its value is complete, so output that breaks the schema is rejected
+    before the rest of it is generated.
+    """
+
+    def __init__(self, schema):
+        self.schema = schema
+        self.properties = schema.get("properties", {})
+        self.text = []
+        self.fields = {}
+        self._member = []
+        self._depth = 0
+        self._in_string = False
+        self._escaped = False
+        self._started = False
+        self._finished = False
+
+    def feed(self, chunk):
+        """
+        Adds the next piece of JSON text.
+
+        Raises:
+            SchemaValidationError: If a completed field does not fit the schema.
+        """
+        self.text.append(chunk)
+        for character in chunk:
+            if not self._started:
+                if character.isspace():
+                    continue
+                if character != "{":
+                    raise SchemaValidationError("$", "output is not a JSON object")
+                self._started = True
+                self._depth = 1
+                continue
+            if self._finished:
+                if not character.isspace():
+                    raise SchemaValidationError("$", "text after the JSON object")
+                continue
+
+            if self._in_string:
+                if self._escaped:
+                    self._escaped = False
+                elif character == "\\":
+                    self._escaped = True
+                elif character == '"':
+                    self._in_string = False
+            elif character == '"':
+                self._in_string = True
+            elif character in "{[":
+                self._depth += 1
+            elif character in "}]":
+                self._depth -= 1
+                if self._depth == 0:
+                    self._finished = True
+                    self._end_member()
+                    continue
+            elif character == "," and self._depth == 1:
+                self._end_member()
+                continue
+
+            self._member.append(character)
+
+    def _end_member(self):
+        member = "".join(self._member).strip()
+        self._member = []
+        if not member:
+            return
+        try:
+            field = json.loads("{" + member + "}")
+        except json.JSONDecodeError as error:
+            raise SchemaValidationError("$", f"malformed JSON: {error}") from error
+        for key, value in field.items():
+            if key in self.properties:
+                validate(value, self.properties[key], f"$.{key}")
+            elif self.schema.get("additionalProperties") is False:
+                raise SchemaValidationError("$", f"unexpected field {key!r}")
+            self.fields[key] = value
+
+    def close(self):
+        """
+        Checks the complete object and returns it.
+
+        Raises:
+            SchemaValidationError: If the object is unfinished or invalid.
+        """
+        if not self._finished:
+            raise SchemaValidationError("$", "output ended before the object closed")
+        try:
+            value = json.loads("".join(self.text))
+        except json.JSONDecodeError as error:
+            raise SchemaValidationError("$", f"malformed JSON: {error}") from error
+        validate(value, self.schema)
+        return value
@@ -0,0 +1,386 @@
+import argparse
+import hashlib
+import json
+import os
+import time
+from bisect import bisect_left
+from functools import lru_cache
+
+# Context window and maximum output tokens per model family on Bedrock.
+MODEL_LIMITS = {
+    "anthropic": {"context_window": 200_000, "max_output_tokens": 8_192},
+    "meta": {"context_window": 128_000, "max_output_tokens": 2_048},
+    "mistral": {"context_window": 32_000, "max_output_tokens": 8_192},
+    "amazon.nova-pro": {"context_window": 300_000, "max_output_tokens": 5_000},
+    "amazon.nova-lite": {"context_window": 300_000, "max_output_tokens": 5_000},
+    "amazon.nova-micro": {"context_window": 128_000, "max_output_tokens": 5_000},
+}
+
+# Hugging Face tokenizer per model family, and a default factor its counts
+# are scaled by. The factors measured by `python token_planner.py --calibrate`
+# are saved to CALIBRATION_PATH with their source and replace these defaults.
+TOKENIZERS = {
+    # Unmeasured default: the family's own tokenizer.
+    "anthropic": ("Xenova/claude-tokenizer", 1.0),
+    # Unmeasured default: the family's own tokenizer.
+    "meta": ("Xenova/Meta-Llama-3.1-Tokenizer", 1.0),
+    # Unmeasured default: the family's own tokenizer.
+    "mistral": ("Xenova/mistral-tokenizer-v1", 1.0),
+    # Unmeasured default: Nova has no public tokenizer, so a close one is
+    # scaled up by 10% to err on the large side.
+    "amazon.nova": ("Xenova/gpt-4o", 1.1),
+}
+
+CALIBRATION_PATH = os.path.join(os.path.dirname(__file__), "token_calibration.json")
+
+# One model per tokenizer entry, called to calibrate its factor.
+CALIBRATION_MODELS = {
+    "anthropic": "us.anthropic.claude-3-5-haiku-20241022-v1:0",
+    "meta": "meta.llama3-1-8b-instruct-v1:0",
+    "mistral": "mistral.mistral-large-2402-v1:0",
+    "amazon.nova": "us.amazon.nova-micro-v1:0",
+}
+
+# Used when a tokenizer is not in the local Hugging Face cache.
+CHARS_PER_TOKEN = 4
+
+# Tokens the chat template adds around each message and system prompt.
+TOKENS_PER_MESSAGE = 4
+
+# Headroom kept free because the local count is an estimate.
+SAFETY_MARGIN = 0.05
+
+MIN_OUTPUT_TOKENS = 256
+
+
+class RequestTooLargeError(ValueError):
+    """Raised when a request does not fit in the model's context window."""
+
+    def __init__(self, model_id, input_tokens, context_window):
+        self.model_id = model_id
+        self.input_tokens = input_tokens
+        self.context_window = context_window
+        super().__init__(
+            f"Request for {model_id} has about {input_tokens} input tokens, "
+            f"which does not fit in its {context_window} token context window"
+        )
+
+
+def model_family(model_id):
+    """
+    Returns the family of a model ID, e.g. "anthropic" for
+    "us.anthropic.claude-3-5-haiku-20241022-v1:0" or "amazon.nova-pro" for
+    "us.amazon.nova-pro-v1:0".
+    """
+    parts = model_id.split(".")
+    # Drop the cross-region inference profile prefix (us., eu., apac.).
+    if len(parts) > 2 and parts[1] in ("anthropic", "meta", "mistral", "amazon"):
+        parts = parts[1:]
+    provider = parts[0]
+    if provider == "amazon":
+        return "amazon." + parts[1].rsplit("-v", 1)[0]
+    return provider
+
+
+def model_limits(model_id):
+    """Returns the context window and maximum output tokens of a model."""
+    family = model_family(model_id)
+    if family in MODEL_LIMITS:
+        return MODEL_LIMITS[family]
+    return {"context_window": 32_000, "max_output_tokens": 4_096}
+
+
+def _tokenizer_key(family):
+    # Nova models share one tokenizer entry.
+    return family if family in TOKENIZERS else family.split("-")[0]
+
+
+@lru_cache(maxsize=None)
+def load_calibration(path=CALIBRATION_PATH):
+    """Returns the measured factors saved by calibrate, keyed by family."""
+    if not os.path.exists(path):
+        return {}
+    with open(path, encoding="utf-8") as calibration_file:
+        return json.load(calibration_file)
+
+
+def _tokenizer_entry(family):
+    key = _tokenizer_key(family)
+    name, calibration = TOKENIZERS.get(key, (None, 1.0))
+    measured = load_calibration(CALIBRATION_PATH).get(key)
+    if measured is not None:
+        calibration = measured["factor"]
+    return name, calibration
+
+
+@lru_cache(maxsize=None)
+def get_tokenizer(family):
+    """
+    Loads the tokenizer of a model family once per process, from the local
+    Hugging Face cache only, so a request never waits on the network. Run
+    this module once with network access to download the tokenizers.
+    Returns (tokenizer, calibration), with tokenizer None if none is available.
+    """
+    name, calibration = _tokenizer_entry(family)
+    if name is None:
+        return None, 1.0
+    try:
+        from transformers import AutoTokenizer
+
+        return AutoTokenizer.from_pretrained(name, local_files_only=True), calibration
+    except Exception as error:
+        print(f"Using character-based token estimates for {family}: {error}")
+        return None, 1.0
+
+
+def download_tokenizers():
+    """Downloads every tokenizer in TOKENIZERS into the Hugging Face cache."""
+    from transformers import AutoTokenizer
+
+    for family, (name, _) in TOKENIZERS.items():
+        try:
+            AutoTokenizer.from_pretrained(name)
+            print(f"Cached {name} for {family}")
+        except Exception as error:
+            print(f"Could not download {name} for {family}: {error}")
+
+
+def count_tokens(texts, model_id):
+    """
+    Estimates the number of tokens in each text for a model.
+    All texts are encoded in one batch call.
+    """
+    if not texts:
+        return []
+    tokenizer, calibration = get_tokenizer(model_family(model_id))
+    if tokenizer is None:
+        return [-(-len(text) // CHARS_PER_TOKEN) for text in texts]
+    encoded = tokenizer(list(texts), add_special_tokens=False)["input_ids"]
+    return [round(len(ids) * calibration) for ids in encoded]
+
+
+def _text_blocks(system_prompts, messages):
+    texts = [block["text"] for block in system_prompts if "text" in block]
+    for message in messages:
+        texts.extend(block["text"] for block in message["content"] if "text" in block)
+    return texts
+
+
+def count_request_tokens(model_id, system_prompts, messages):
+    """Estimates the input tokens of a converse request before it is sent."""
+    overhead = TOKENS_PER_MESSAGE * (len(messages) + (1 if system_prompts else 0))
+    texts = _text_blocks(system_prompts, messages)
+    return sum(count_tokens(texts, model_id)) + overhead
+
+
+def plan_request(model_id, system_prompts, messages, max_tokens=None):
+    """
+    Checks that a converse request fits the model and picks maxTokens.
+    Args:
+        model_id (str): The model ID to use.
+        system_prompts (JSON) : The system prompts for the model to use.
+        messages (JSON) : The messages to send to the model.
+        max_tokens (int) : Output tokens wanted, if the caller has a limit.
+
+    Returns:
+        plan (dict): The estimated input_tokens and the max_tokens to send.
+
+    Raises:
+        RequestTooLargeError: If the input leaves no room for the output.
+    """
+    limits = model_limits(model_id)
+    input_tokens = count_request_tokens(model_id, system_prompts, messages)
+    usable_window = int(limits["context_window"] * (1 - SAFETY_MARGIN))
+    available = usable_window - input_tokens
+    if available < MIN_OUTPUT_TOKENS:
+        raise RequestTooLargeError(model_id, input_tokens, limits["context_window"])
+
+    planned_max_tokens = min(limits["max_output_tokens"], available)
+    if max_tokens is not None:
+        planned_max_tokens = min(planned_max_tokens, max_tokens)
+
+    return {"input_tokens": input_tokens, "max_tokens": planned_max_tokens}
+
+
+def max_input_tokens(model_id, reserved_output_tokens=None):
+    """Returns how many input tokens fit next to the reserved output tokens."""
+    limits = model_limits(model_id)
+    if reserved_output_tokens is None:
+        reserved_output_tokens = limits["max_output_tokens"]
+    usable_window = int(limits["context_window"] * (1 - SAFETY_MARGIN))
+    return usable_window - reserved_output_tokens
+
+
+def chunk_text(text, model_id, max_chunk_tokens, overlap_tokens=0):
+    """
+    Splits text into pieces of at most max_chunk_tokens tokens for a model.
+    Cuts are moved back to the nearest paragraph or sentence break when there
+    is one in the second half of the piece.
+    """
+    tokenizer, calibration = get_tokenizer(model_family(model_id))
+    if tokenizer is not None and getattr(tokenizer, "is_fast", False):
+        offsets = tokenizer(
+            text, add_special_tokens=False, return_offsets_mapping=True
+        )["offset_mapping"]
+        token_starts = [start for start, _ in offsets]
+        chars_per_token = len(text) / max(1, len(offsets))
+        step = max(1, int(max_chunk_tokens / calibration))
+    else:
+        token_starts = None
+        chars_per_token = CHARS_PER_TOKEN
+        step = max_chunk_tokens
+
+    chunks = []
+    position = 0
+    while position < len(text):
+        if token_starts is not None:
+            last_token = bisect_left(token_starts, position) + step
+            end = (
+                token_starts[last_token]
+                if last_token < len(token_starts)
+                else len(text)
+            )
+        else:
+            end = min(len(text), position + step * CHARS_PER_TOKEN)
+
+        if end < len(text):
+            window = text[position:end]
+            for separator in ("\n\n", "\n", ". ", " "):
+                cut = window.rfind(separator)
+                if cut > len(window) // 2:
+                    end = position + cut + len(separator)
+                    break
+
+        chunks.append(text[position:end])
+        if end >= len(text):
+            break
+        position = max(position + 1, end - int(overlap_tokens * chars_per_token))
+
+    return chunks
+
+
+def content_defined_chunks(text, model_id, max_chunk_tokens, boundary_divisor=4):
+    """
+    Splits text into pieces of at most max_chunk_tokens tokens whose
+    boundaries depend on the content, not on the position in the text.
+    Paragraphs are grouped and a piece ends after any paragraph whose hash is
+    divisible by boundary_divisor, once it holds a quarter of the budget.
+    Editing one paragraph therefore changes only the piece that holds it, and
+    the pieces after it line up again with those of the old text.
+    """
+    paragraphs = []
+    parts = text.split("\n\n")
+    for index, part in enumerate(parts):
+        if index < len(parts) - 1:
+            part += "\n\n"
+        if part:
+            paragraphs.append(part)
+
+    # Paragraphs over the budget are cut by position as a last resort.
+    counts = count_tokens(paragraphs, model_id)
+    pieces = []
+    for paragraph, tokens in zip(paragraphs, counts):
+        if tokens > max_chunk_tokens:
+            pieces.extend(chunk_text(paragraph, model_id, max_chunk_tokens))
+        else:
+            pieces.append(paragraph)
+    counts = count_tokens(pieces, model_id)
+
+    min_chunk_tokens = max_chunk_tokens // 4
+    chunks = []
+    current = []
+    current_tokens = 0
+    for piece, tokens in zip(pieces, counts):
+        if current and current_tokens + tokens > max_chunk_tokens:
+            chunks.append("".join(current))
+            current = []
+            current_tokens = 0
+        current.append(piece)
+        current_tokens += tokens
+        digest = hashlib.sha1(piece.encode("utf-8")).digest()
+        if current_tokens >= min_chunk_tokens and digest[0] % boundary_divisor == 0:
+            chunks.append("".join(current))
+            current = []
+            current_tokens = 0
+
+    if current:
+        chunks.append("".join(current))
+    return chunks
+
+
+def calibrate(client, texts, models=None, path=CALIBRATION_PATH):
+    """
+    Measures the factor of each tokenizer entry as the inputTokens Bedrock
+    reports divided by the uncalibrated local count, over single-message
+    requests for texts, and saves it to path with its source.
+    Args:
+        client: The Boto3 Bedrock runtime client.
+        texts (list): Sample texts, e.g. pages of the Well-Architected sample.
+        models (dict): Maps a TOKENIZERS key to the model to call.
+        path (str): The JSON file the factors are saved to.
+
+    Returns:
+        calibration (dict): The saved entries, keyed by TOKENIZERS key.
+    """
+    calibration = dict(load_calibration(path))
+    for key, model_id in (models or CALIBRATION_MODELS).items():
+        tokenizer, _ = get_tokenizer(model_family(model_id))
+        if tokenizer is None:
+            print(f"Skipping {key}: its tokenizer is not in the local cache")
+            continue
+        local = 0
+        reported = 0
+        for text in texts:
+            local += len(tokenizer(text, add_special_tokens=False)["input_ids"])
+            response = client.converse(
+                modelId=model_id,
+                messages=[{"role": "user", "content": [{"text": text}]}],
+                inferenceConfig={"maxTokens": 1},
+            )
+            reported += response["usage"]["inputTokens"] - TOKENS_PER_MESSAGE
+        calibration[key] = {
+            "factor": round(reported / local, 3),
+            "source": (
+                f"inputTokens of {model_id} over {len(texts)} texts "
+                f"({local} local tokens) at {client.meta.endpoint_url}, "
+                f"{time.strftime('%Y-%m-%d')}"
+            ),
+        }
+        print(f"{key}: {calibration[key]}")
+
+    with open(path, "w", encoding="utf-8") as calibration_file:
+        json.dump(calibration, calibration_file, indent=2, sort_keys=True)
+    load_calibration.cache_clear()
+    get_tokenizer.cache_clear()
+    return calibration
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Download the tokenizers and optionally calibrate them."
+    )
+    parser.add_argument(
+        "--calibrate",
+        action="store_true",
+        help="Measure each factor against Bedrock inputTokens.",
+    )
+    parser.add_argument("--samples", type=int, default=20)
+    args = parser.parse_args()
+
+    download_tokenizers()
+    if args.calibrate:
+        import csv
+        import sys
+
+        from bedrock_client import get_client
+
+        sample_path = os.path.join(
+            os.path.dirname(__file__), "..", "datasets", "well_arch_text_sample.csv"
+        )
+        csv.field_size_limit(sys.maxsize)
+        with open(sample_path, newline="", encoding="utf-8") as sample_file:
+            pages = [row["page_content"] for row in csv.DictReader(sample_file)]
+        calibrate(
+            get_client("bedrock-runtime", "us-east-1"),
+            [page for page in pages if page.strip()][: args.samples],
+        )
@@ -3,15 +3,12 @@
 import base64
 import json
 
-import boto3
+from bedrock_client import get_client
 
 
 def create_bedrock_client(region="us-east-1"):
-    """Create a Bedrock Runtime client in the specified AWS Region."""
-    return boto3.client(
-        "bedrock-runtime",
-        region_name=region,
-    )
+    """Return the shared Bedrock Runtime client for the specified AWS Region."""
+    return get_client("bedrock-runtime", region)
 
 
 def encode_video_to_base64(video_path):
@@ -1,16 +1,13 @@
 import random
 
-import boto3
+from bedrock_client import get_client
 
 AGENT_ID = "INSERT_AGENT_ID"
 QUERY = "What are some features of Amazon S3?"
 REGION = "us-east-1"
 
 # Setup bedrock
-bedrock_agent_runtime = boto3.client(
-    service_name="bedrock-agent-runtime",
-    region_name=REGION,
-)
+bedrock_agent_runtime = get_client("bedrock-agent-runtime", REGION)
 
 
 def generate_random_15digit():
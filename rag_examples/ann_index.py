@@ -0,0 +1,112 @@
+import math
+
+import faiss
+import numpy as np
+
+INDEX_TYPES = ("flat", "ivf_flat", "ivf_pq", "hnsw")
+
+# Options that shape the index when it is built, as opposed to search options.
+BUILD_OPTIONS = ("nlist", "pq_m", "pq_bits", "hnsw_m", "ef_construction")
+
+# faiss asks for about this many training vectors per centroid.
+TRAINING_POINTS_PER_CENTROID = 39
+
+ADD_BLOCK_ROWS = 65_536
+
+
+def default_nlist(rows):
+    """Number of IVF lists for a corpus, about 4 * sqrt(rows)."""
+    return max(1, min(65_536, int(4 * math.sqrt(rows))))
+
+
+def default_pq_m(dimensions):
+    """Largest number of PQ sub-quantizers that leaves at least 8 dimensions each."""
+    for pq_m in (96, 64, 48, 32, 24, 16, 8, 4, 2):
+        if dimensions % pq_m == 0 and dimensions // pq_m >= 8:
+            return pq_m
+    return 1
+
+
+def build_ann_index(
+    vectors,
+    index_type="flat",
+    nlist=None,
+    pq_m=None,
+    pq_bits=8,
+    hnsw_m=32,
+    ef_construction=80,
+    train_size=None,
+    seed=0,
+):
+    """
+    Builds a faiss index over float32 vectors, which may be a memory map.
+    IVF indexes are trained on a random sample of the vectors first.
+    Args:
+        vectors (ndarray): The (rows, dimensions) vectors. Row i gets id i.
+        index_type (str): One of INDEX_TYPES.
+        nlist (int): IVF lists. Defaults to default_nlist(rows).
+        pq_m (int): PQ sub-quantizers. Defaults to default_pq_m(dimensions).
+        pq_bits (int): Bits per PQ code.
+        hnsw_m (int): Neighbours per HNSW node.
+        ef_construction (int): HNSW candidate list size while building.
+        train_size (int): Training sample size. Defaults to what faiss asks
+            for given the number of centroids.
+        seed (int): Seed of the training sample.
+
+    Returns:
+        index (faiss.Index): The trained index, holding every vector.
+    """
+    if index_type not in INDEX_TYPES:
+        raise ValueError(f"Unknown index type {index_type}, use one of {INDEX_TYPES}")
+    rows, dimensions = vectors.shape
+
+    centroids = 0
+    if index_type == "flat":
+        index = faiss.IndexFlatL2(dimensions)
+    elif index_type == "hnsw":
+        index = faiss.IndexHNSWFlat(dimensions, hnsw_m)
+        index.hnsw.efConstruction = ef_construction
+    else:
+        nlist = min(nlist or default_nlist(rows), rows)
+        quantizer = faiss.IndexFlatL2(dimensions)
+        centroids = nlist
+        if index_type == "ivf_flat":
+            index = faiss.IndexIVFFlat(quantizer, dimensions, nlist)
+        else:
+            if rows < 2**pq_bits:
+                raise ValueError(
+                    f"ivf_pq with {pq_bits}-bit codes needs at least "
+                    f"{2**pq_bits} vectors, got {rows}"
+                )
+            pq_m = pq_m or default_pq_m(dimensions)
+            index = faiss.IndexIVFPQ(quantizer, dimensions, nlist, pq_m, pq_bits)
+            centroids = max(nlist, 2**pq_bits)
+
+    if not index.is_trained:
+        train_size = min(rows, train_size or centroids * TRAINING_POINTS_PER_CENTROID)
+        sample = np.random.default_rng(seed).choice(rows, train_size, replace=False)
+        index.train(np.ascontiguousarray(vectors[np.sort(sample)], dtype=np.float32))
+
+    for start in range(0, rows, ADD_BLOCK_ROWS):
+        block = vectors[start : start + ADD_BLOCK_ROWS]
+        index.add(np.ascontiguousarray(block, dtype=np.float32))
+    return index
+
+
+def set_search_params(index, nprobe=None, ef_search=None):
+    """
+    Sets the recall/speed trade-off of a search: nprobe is the number of IVF
+    lists scanned, ef_search the HNSW candidate list size. Options that do
+    not apply to the index are ignored.
+    """
+    if nprobe is not None:
+        ivf_index = faiss.try_extract_index_ivf(index)
+        if ivf_index is not None:
+            ivf_index.nprobe = nprobe
+    if ef_search is not None and hasattr(index, "hnsw"):
+        index.hnsw.efSearch = ef_search
+
+
+def index_bytes(index):
+    """Returns the serialized size of an index, a proxy for its memory use."""
+    return faiss.serialize_index(index).nbytes
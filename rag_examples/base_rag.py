@@ -1,16 +1,17 @@
 import json
+import time
 
-import boto3
 from langchain_community.embeddings import BedrockEmbeddings
 from langchain_community.vectorstores import FAISS
 
+from bedrock_client import get_client
+from embedding_cache import CachedEmbeddings
+from metrics import metrics
+
 REGION = "us-east-1"
 
 # Setup bedrock
-bedrock_runtime = boto3.client(
-    service_name="bedrock-runtime",
-    region_name=REGION,
-)
+bedrock_runtime = get_client("bedrock-runtime", REGION)
 
 sentences = [
     # Pets
@@ -52,6 +53,7 @@ def generate_conversation(model_id, system_prompts, messages):
     # additional_model_fields = {"top_k": top_k}
 
     # Send the message.
+    start_time = time.perf_counter()
     response = bedrock_runtime.converse(
         modelId=model_id,
         messages=messages,
@@ -60,23 +62,117 @@ def generate_conversation(model_id, system_prompts, messages):
         # additionalModelRequestFields=additional_model_fields,
     )
 
-    # Log token usage.
-    token_usage = response["usage"]
-    print(f"Input tokens: {token_usage['inputTokens']}")
-    print(f"Output tokens: {token_usage['outputTokens']}")
-    print(f"Total tokens: {token_usage['totalTokens']}")
-    print(f"Stop reason: {response['stopReason']}")
+    # Record latency and token usage.
+    metrics.record_call(
+        model_id,
+        time.perf_counter() - start_time,
+        usage=response["usage"],
+        retries=response["ResponseMetadata"].get("RetryAttempts", 0),
+        stop_reason=response["stopReason"],
+        task="rag",
+    )
 
     text_response = response["output"]["message"]["content"][0]["text"]
 
     return text_response
 
 
-def rag_with_bedrock(query):
-    embeddings = BedrockEmbeddings(
-        client=bedrock_runtime,
-        model_id="amazon.titan-embed-text-v1",
+def generate_conversation_stream(
+    model_id, system_prompts, messages, stream_metrics=None
+):
+    """
+    Streams a model response as it is generated.
+    Args:
+        model_id (str): The model ID to use.
+        system_prompts (JSON) : The system prompts for the model to use.
+        messages (JSON) : The messages to send to the model.
+        stream_metrics (dict) : Optional dict that is filled with the latency and
+            token usage of the call once the stream is finished.
+
+    Yields:
+        text (str): The text deltas in the order the model generates them.
+
+    """
+
+    print(f"Streaming message with model {model_id}")
+
+    # Inference parameters to use.
+    temperature = 0.5
+
+    # Base inference parameters to use.
+    inference_config = {"temperature": temperature}
+
+    # Send the message and start the clock for time-to-first-token.
+    start_time = time.perf_counter()
+    first_token_time = None
+    token_usage = {}
+    stop_reason = None
+
+    response = bedrock_runtime.converse_stream(
+        modelId=model_id,
+        messages=messages,
+        system=system_prompts,
+        inferenceConfig=inference_config,
+    )
+
+    for event in response["stream"]:
+        if "contentBlockDelta" in event:
+            text = event["contentBlockDelta"]["delta"].get("text")
+            if text:
+                if first_token_time is None:
+                    first_token_time = time.perf_counter()
+                yield text
+        elif "messageStop" in event:
+            stop_reason = event["messageStop"]["stopReason"]
+        elif "metadata" in event:
+            token_usage = event["metadata"].get("usage", {})
+
+    end_time = time.perf_counter()
+
+    # Record latency and token usage.
+    total_latency = end_time - start_time
+    time_to_first_token = (
+        first_token_time - start_time if first_token_time is not None else None
     )
+    output_tokens = token_usage.get("outputTokens", 0)
+    generation_time = end_time - (first_token_time or start_time)
+    tokens_per_second = output_tokens / generation_time if generation_time > 0 else 0.0
+
+    metrics.record_call(
+        model_id,
+        total_latency,
+        usage=token_usage,
+        time_to_first_token=time_to_first_token,
+        retries=response["ResponseMetadata"].get("RetryAttempts", 0),
+        stop_reason=stop_reason,
+        task="rag",
+    )
+
+    if stream_metrics is not None:
+        stream_metrics.update(
+            {
+                "model_id": model_id,
+                "time_to_first_token": time_to_first_token,
+                "total_latency": total_latency,
+                "tokens_per_second": tokens_per_second,
+                "input_tokens": token_usage.get("inputTokens", 0),
+                "output_tokens": output_tokens,
+                "total_tokens": token_usage.get("totalTokens", 0),
+                "stop_reason": stop_reason,
+            }
+        )
+
+
+EMBEDDING_MODEL_ID = "amazon.titan-embed-text-v1"
+
+# Vectors are cached on disk by text and model, so the corpus is embedded once.
+embeddings = CachedEmbeddings(
+    BedrockEmbeddings(client=bedrock_runtime, model_id=EMBEDDING_MODEL_ID),
+    EMBEDDING_MODEL_ID,
+)
+
+
+def rag_with_bedrock(query, stream=False):
     local_vector_store = FAISS.from_texts(sentences, embeddings)
 
     docs = local_vector_store.similarity_search(query)
@@ -102,10 +198,14 @@ def rag_with_bedrock(query):
 
     messages = [message_1]
 
+    if stream:
+        return generate_conversation_stream(model_id, system_prompts, messages)
+
     result = generate_conversation(model_id, system_prompts, messages)
     return result
 
 
-query = "What type of pet do I have?"
-print(query)
-print(rag_with_bedrock(query))
+if __name__ == "__main__":
+    query = "What type of pet do I have?"
+    print(query)
+    print(rag_with_bedrock(query))
@@ -0,0 +1,190 @@
+import json
+import math
+import os
+import re
+from collections import Counter
+
+import numpy as np
+
+TERMS_FILE = "bm25.json"
+POSTINGS_FILE = "bm25_postings.npy"
+OFFSETS_FILE = "bm25_offsets.npy"
+DOC_LENGTHS_FILE = "bm25_doc_lengths.npy"
+
+TOKEN_PATTERN = re.compile(r"[a-z0-9]+")
+STOP_WORDS = frozenset(
+    "a an and are as at be by can for from has have how in is it its of on or "
+    "that the this to was were what when which will with you your".split()
+)
+
+
+def tokenize(text):
+    """Lower-cases text and splits it into words, keeping e.g. "ec2" and "s3"."""
+    tokens = TOKEN_PATTERN.findall(text.lower())
+    return [token for token in tokens if token not in STOP_WORDS]
+
+
+def encode_varints(values):
+    """Encodes non-negative integers as LEB128 varints, 7 bits per byte."""
+    encoded = bytearray()
+    for value in values:
+        while value >= 0x80:
+            encoded.append((value & 0x7F) | 0x80)
+            value >>= 7
+        encoded.append(value)
+    return encoded
+
+
+def decode_varints(data):
+    """Decodes a uint8 array of LEB128 varints into a uint64 array."""
+    data = np.asarray(data, dtype=np.uint8)
+    ends = np.flatnonzero(data < 0x80)
+    starts = np.concatenate(([0], ends[:-1] + 1))
+    shifts = 7 * (np.arange(len(data)) - np.repeat(starts, ends - starts + 1))
+    parts = (data & 0x7F).astype(np.uint64) << shifts.astype(np.uint64)
+    return np.add.reduceat(parts, starts)
+
+
+class BM25Builder:
+    """
+    Collects the terms of documents added in row order and writes a
+    BM25Index. Each term's postings are (row delta, term frequency) pairs
+    encoded as varints into one shared byte array, so a posting usually
+    takes two bytes.
+    """
+
+    def __init__(self):
+        self.postings = {}
+        self.doc_lengths = []
+
+    def add(self, text):
+        row = len(self.doc_lengths)
+        tokens = tokenize(text)
+        self.doc_lengths.append(len(tokens))
+        for term, frequency in Counter(tokens).items():
+            self.postings.setdefault(term, []).append((row, frequency))
+
+    def save(self, folder_path):
+        terms = sorted(self.postings)
+        data = bytearray()
+        offsets = [0]
+        doc_freqs = []
+        for term in terms:
+            values = []
+            previous = 0
+            for row, frequency in self.postings[term]:
+                values += [row - previous, frequency]
+                previous = row
+            data += encode_varints(values)
+            offsets.append(len(data))
+            doc_freqs.append(len(self.postings[term]))
+
+        arrays = {
+            POSTINGS_FILE: np.frombuffer(data, np.uint8),
+            OFFSETS_FILE: np.asarray(offsets, np.int64),
+            DOC_LENGTHS_FILE: np.asarray(self.doc_lengths, np.uint32),
+        }
+        # Written aside and renamed, as readers may have the old files mapped.
+        for name, array in arrays.items():
+            with open(os.path.join(folder_path, f"{name}.tmp"), "wb") as array_file:
+                np.save(array_file, array)
+        terms_path = os.path.join(folder_path, TERMS_FILE)
+        with open(f"{terms_path}.tmp", "w", encoding="utf-8") as terms_file:
+            json.dump({"terms": terms, "doc_freqs": doc_freqs}, terms_file)
+        for name in [*arrays, TERMS_FILE]:
+            path = os.path.join(folder_path, name)
+            os.replace(f"{path}.tmp", path)
+
+
+class BM25Index:
+    """
+    Okapi BM25 over the documents of a BM25Builder. The postings and
+    document lengths are memory-mapped; only the postings of query terms
+    are decoded.
+    """
+
+    def __init__(self, folder_path, k1=1.2, b=0.75):
+        """
+        Args:
+            folder_path (str): Where BM25Builder.save wrote the index.
+            k1 (float): Term frequency saturation.
+            b (float): Document length normalization.
+        """
+        self.k1 = k1
+        self.b = b
+        with open(os.path.join(folder_path, TERMS_FILE), encoding="utf-8") as f:
+            stored = json.load(f)
+        self.term_ids = {term: index for index, term in enumerate(stored["terms"])}
+        self.doc_freqs = stored["doc_freqs"]
+        self.postings = np.load(os.path.join(folder_path, POSTINGS_FILE), mmap_mode="r")
+        self.offsets = np.load(os.path.join(folder_path, OFFSETS_FILE), mmap_mode="r")
+        self.doc_lengths = np.load(
+            os.path.join(folder_path, DOC_LENGTHS_FILE), mmap_mode="r"
+        )
+        # At least 1, so an index of empty chunks still divides cleanly.
+        self.average_length = max(
+            float(self.doc_lengths.mean()) if len(self) else 0.0, 1.0
+        )
+
+    @staticmethod
+    def exists(folder_path):
+        return os.path.exists(os.path.join(folder_path, TERMS_FILE))
+
+    def __len__(self):
+        return len(self.doc_lengths)
+
+    def term_postings(self, term):
+        """Returns the rows containing a term and its frequency in each."""
+        term_id = self.term_ids.get(term)
+        if term_id is None:
+            return np.empty(0, np.int64), np.empty(0, np.uint64)
+        start, end = self.offsets[term_id], self.offsets[term_id + 1]
+        values = decode_varints(self.postings[start:end])
+        return np.cumsum(values[0::2]).astype(np.int64), values[1::2]
+
+    def search(self, query, k=10, exclude=None):
+        """
+        Returns the rows of the k best-scoring documents for a query.
+        Args:
+            query (str): The query text.
+            k (int): Number of rows to return.
+            exclude (set): Rows to leave out, e.g. deleted ones.
+
+        Returns:
+            rows (list): Row numbers, best first.
+        """
+        scores = np.zeros(len(self), dtype=np.float32)
+        for term in set(tokenize(query)):
+            rows, frequencies = self.term_postings(term)
+            if not len(rows):
+                continue
+            doc_freq = self.doc_freqs[self.term_ids[term]]
+            idf = math.log(1 + (len(self) - doc_freq + 0.5) / (doc_freq + 0.5))
+            frequencies = frequencies.astype(np.float32)
+            lengths = self.doc_lengths[rows] / self.average_length
+            scores[rows] += (
+                idf
+                * frequencies
+                * (self.k1 + 1)
+                / (frequencies + self.k1 * (1 - self.b + self.b * lengths))
+            )
+        if exclude:
+            scores[[row for row in exclude if row < len(self)]] = 0
+
+        matched = np.flatnonzero(scores)
+        if len(matched) > k:
+            matched = matched[np.argpartition(-scores[matched], k - 1)[:k]]
+        return matched[np.argsort(-scores[matched], kind="stable")].tolist()
+
+
+def reciprocal_rank_fusion(rankings, k=60):
+    """
+    Merges ranked lists by summing 1 / (k + rank) for every list an item
+    appears in.
+    Returns the items, best first.
+    """
+    scores = {}
+    for ranking in rankings:
+        for rank, item in enumerate(ranking, start=1):
+            scores[item] = scores.get(item, 0.0) + 1.0 / (k + rank)
+    return sorted(scores, key=scores.get, reverse=True)
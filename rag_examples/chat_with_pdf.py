@@ -1,26 +1,105 @@
 import os
+import threading
+import time
 
-import boto3
-from langchain.text_splitter import RecursiveCharacterTextSplitter
-from langchain_aws import BedrockEmbeddings
-from langchain_community.vectorstores import FAISS
-from langchain_unstructured import UnstructuredLoader
+from bedrock_client import SINGLE_ATTEMPT, get_client
+from embedding_engine import EmbeddingEngine
+from incremental_index import IncrementalIndex, convert_pickle_index, is_pickle_index
+from ingest_pipeline import chunk_doc_to_text, find_documents, ingest_paths
+from metrics import metrics
 
 # Setup bedrock
-bedrock_runtime = boto3.client(
-    service_name="bedrock-runtime",
-    region_name="us-east-1",
-)
+bedrock_runtime = get_client("bedrock-runtime", "us-east-1")
 
+# A flat scan is exact and fast enough for one PDF. For large corpora use e.g.
+# {"index_type": "hnsw", "ef_search": 64} or {"index_type": "ivf_pq",
+# "nprobe": 16}; benchmarks/ann_benchmark.py compares them.
+INDEX_OPTIONS = {"index_type": "flat"}
 
-def chunk_doc_to_text(doc_loc: str):
-    loader = UnstructuredLoader(doc_loc)
-    docs = loader.load()
+# PDF and HTML files in this directory are indexed along with well_arch.pdf.
+DOCUMENTS_DIR = "documents"
+PDF_LOC = "well_arch.pdf"
+INDEX_DIR = "local_index"
 
-    text_splitter = RecursiveCharacterTextSplitter(chunk_size=1000, chunk_overlap=20)
-    texts = text_splitter.split_documents(docs)
+# With rerank=True, this many chunks are retrieved and a cross-encoder keeps
+# the best RERANK_TOP_K that score at least RERANK_MIN_SCORE.
+RERANK_CANDIDATES = 50
+RERANK_TOP_K = 4
+RERANK_MIN_SCORE = None
+RERANK_OPTIONS = {"batch_size": 32, "threads": 4, "quantize": True}
 
-    return texts
+_reranker = None
+_reranker_lock = threading.Lock()
+
+_index = None
+_index_lock = threading.Lock()
+
+
+def get_reranker():
+    """
+    Loads the cross-encoder on first use and keeps it for later queries.
+    Streamlit runs sessions on threads, so the first queries may race here.
+    """
+    global _reranker
+    if _reranker is not None:
+        return _reranker
+
+    with _reranker_lock:
+        if _reranker is None:
+            from reranker import Reranker
+
+            _reranker = Reranker(**RERANK_OPTIONS)
+    return _reranker
+
+
+def corpus_paths():
+    """Returns well_arch.pdf and the documents in DOCUMENTS_DIR that exist."""
+    paths = [PDF_LOC] if os.path.exists(PDF_LOC) else []
+    if os.path.isdir(DOCUMENTS_DIR):
+        paths += find_documents(DOCUMENTS_DIR)
+    return paths
+
+
+def get_index():
+    """
+    Opens the index on first use and keeps it for later queries. The
+    pickled index of earlier versions is converted once, never unpickled
+    again. If nothing has been indexed yet, the corpus is ingested here;
+    after that, updates go through ingest_documents or ingest_pipeline.py.
+    """
+    global _index
+    if _index is not None:
+        return _index
+
+    with _index_lock:
+        if _index is None:
+            embeddings = EmbeddingEngine(
+                get_client("bedrock-runtime", "us-east-1", **SINGLE_ATTEMPT),
+                model_id="amazon.titan-embed-text-v1",
+                max_workers=32,
+            )
+            if is_pickle_index(INDEX_DIR):
+                convert_pickle_index(INDEX_DIR, embeddings)
+            index = IncrementalIndex(
+                INDEX_DIR, embeddings, chunk_doc_to_text, index_options=INDEX_OPTIONS
+            )
+            paths = corpus_paths()
+            if index.vector_store is None and paths:
+                ingest_paths(index, paths)
+            _index = index
+    return _index
+
+
+def ingest_documents():
+    """
+    Embeds only the chunks that are new in the corpus since the last run.
+    Call it at startup, not per query.
+    Returns:
+        stats (dict): The counts from ingest_paths.
+    """
+    index = get_index()
+    with _index_lock:
+        return ingest_paths(index, corpus_paths())
 
 
 def generate_conversation(model_id, system_prompts, messages):
@@ -49,6 +128,7 @@ def generate_conversation(model_id, system_prompts, messages):
     # additional_model_fields = {"top_k": top_k}
 
     # Send the message.
+    start_time = time.perf_counter()
     response = bedrock_runtime.converse(
         modelId=model_id,
         messages=messages,
@@ -57,42 +137,148 @@ def generate_conversation(model_id, system_prompts, messages):
         # additionalModelRequestFields=additional_model_fields,
     )
 
-    # Log token usage.
-    token_usage = response["usage"]
-    print(f"Input tokens: {token_usage['inputTokens']}")
-    print(f"Output tokens: {token_usage['outputTokens']}")
-    print(f"Total tokens: {token_usage['totalTokens']}")
-    print(f"Stop reason: {response['stopReason']}")
+    # Record latency and token usage.
+    metrics.record_call(
+        model_id,
+        time.perf_counter() - start_time,
+        usage=response["usage"],
+        retries=response["ResponseMetadata"].get("RetryAttempts", 0),
+        stop_reason=response["stopReason"],
+        task="rag",
+    )
 
     text_response = response["output"]["message"]["content"][0]["text"]
 
     return text_response
 
 
-def rag_with_bedrock(query):
+def generate_conversation_stream(
+    model_id, system_prompts, messages, stream_metrics=None
+):
+    """
+    Streams a model response as it is generated.
+    Args:
+        model_id (str): The model ID to use.
+        system_prompts (JSON) : The system prompts for the model to use.
+        messages (JSON) : The messages to send to the model.
+        stream_metrics (dict) : Optional dict that is filled with the latency and
+            token usage of the call once the stream is finished.
+
+    Yields:
+        text (str): The text deltas in the order the model generates them.
+
+    """
+
+    print(f"Streaming message with model {model_id}")
+
+    # Inference parameters to use.
+    temperature = 0.5
+
+    # Base inference parameters to use.
+    inference_config = {"temperature": temperature}
+
+    # Send the message and start the clock for time-to-first-token.
+    start_time = time.perf_counter()
+    first_token_time = None
+    token_usage = {}
+    stop_reason = None
+
+    response = bedrock_runtime.converse_stream(
+        modelId=model_id,
+        messages=messages,
+        system=system_prompts,
+        inferenceConfig=inference_config,
+    )
 
-    embeddings = BedrockEmbeddings(
-        client=bedrock_runtime,
-        model_id="amazon.titan-embed-text-v1",
+    for event in response["stream"]:
+        if "contentBlockDelta" in event:
+            text = event["contentBlockDelta"]["delta"].get("text")
+            if text:
+                if first_token_time is None:
+                    first_token_time = time.perf_counter()
+                yield text
+        elif "messageStop" in event:
+            stop_reason = event["messageStop"]["stopReason"]
+        elif "metadata" in event:
+            token_usage = event["metadata"].get("usage", {})
+
+    end_time = time.perf_counter()
+
+    # Record latency and token usage.
+    total_latency = end_time - start_time
+    time_to_first_token = (
+        first_token_time - start_time if first_token_time is not None else None
+    )
+    output_tokens = token_usage.get("outputTokens", 0)
+    generation_time = end_time - (first_token_time or start_time)
+    tokens_per_second = output_tokens / generation_time if generation_time > 0 else 0.0
+
+    metrics.record_call(
+        model_id,
+        total_latency,
+        usage=token_usage,
+        time_to_first_token=time_to_first_token,
+        retries=response["ResponseMetadata"].get("RetryAttempts", 0),
+        stop_reason=stop_reason,
+        task="rag",
     )
-    pdf_loc = "well_arch.pdf"
 
-    if os.path.exists("local_index"):
-        local_vector_store = FAISS.load_local(
-            "local_index", embeddings, allow_dangerous_deserialization=True
+    if stream_metrics is not None:
+        stream_metrics.update(
+            {
+                "model_id": model_id,
+                "time_to_first_token": time_to_first_token,
+                "total_latency": total_latency,
+                "tokens_per_second": tokens_per_second,
+                "input_tokens": token_usage.get("inputTokens", 0),
+                "output_tokens": output_tokens,
+                "total_tokens": token_usage.get("totalTokens", 0),
+                "stop_reason": stop_reason,
+            }
         )
-    else:
-        texts = chunk_doc_to_text(pdf_loc)
-        local_vector_store = FAISS.from_documents(
-            texts, embeddings, allow_dangerous_deserialization=True
+
+
+def rag_with_bedrock(query, stream=False, rerank=False, stage_timings=None):
+    """
+    Answers a question from the Well-Architected PDF.
+    Args:
+        query (str): The question.
+        stream (bool): Return a generator of text deltas.
+        rerank (bool): Over-retrieve and keep the chunks a local cross-encoder
+            scores best.
+        stage_timings (dict) : Optional dict that is filled with the seconds
+            spent opening the index, retrieving, reranking and (without stream)
+            generating, and with the size of the context.
+
+    Returns:
+        response (str): The answer, or a generator of it with stream.
+    """
+    timings = {}
+    stage_start = time.perf_counter()
+    local_index = get_index()
+    timings["index_seconds"] = time.perf_counter() - stage_start
+
+    # Keyword matches catch service names that the embeddings can miss.
+    stage_start = time.perf_counter()
+    docs = local_index.hybrid_search(query, k=RERANK_CANDIDATES if rerank else 4)
+    timings["retrieve_seconds"] = time.perf_counter() - stage_start
+    timings["retrieved_chunks"] = len(docs)
+
+    if rerank:
+        stage_start = time.perf_counter()
+        docs = get_reranker().rerank(
+            query, docs, top_k=RERANK_TOP_K, min_score=RERANK_MIN_SCORE
         )
-        local_vector_store.save_local("local_index")
+        timings["rerank_seconds"] = time.perf_counter() - stage_start
 
-    docs = local_vector_store.similarity_search(query)
     context = ""
 
     for doc in docs:
         context += doc.page_content
+    timings["context_chunks"] = len(docs)
+    timings["context_chars"] = len(context)
+    if stage_timings is not None:
+        stage_timings.update(timings)
 
     prompt = f"""Use the following pieces of context to answer the question at the end.
 
@@ -115,11 +301,22 @@ def rag_with_bedrock(query):
 
     messages = [message_1]
 
+    if stream:
+        return generate_conversation_stream(model_id, system_prompts, messages)
+
+    stage_start = time.perf_counter()
     result = generate_conversation(model_id, system_prompts, messages)
+    if stage_timings is not None:
+        stage_timings["generate_seconds"] = time.perf_counter() - stage_start
 
     return result
 
 
-query = "What can you tell me about Amazon RDS?"
-print(query)
-print(rag_with_bedrock(query))
+if __name__ == "__main__":
+    print(f"Ingested: {ingest_documents()}")
+    query = "What can you tell me about Amazon RDS?"
+    print(query)
+    for rerank in (False, True):
+        stage_timings = {}
+        print(rag_with_bedrock(query, rerank=rerank, stage_timings=stage_timings))
+        print(f"rerank={rerank}: {stage_timings}")
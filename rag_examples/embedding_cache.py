@@ -0,0 +1,192 @@
+import fcntl
+import hashlib
+import json
+import os
+import threading
+from collections import OrderedDict
+
+import numpy as np
+from langchain_core.embeddings import Embeddings
+
+DEFAULT_CACHE_DIR = os.path.join(os.path.dirname(__file__), ".cache", "embeddings")
+
+# Bytes of the SHA-256 digest that keys each vector.
+KEY_SIZE = 32
+
+
+def embedding_key(model_id, text):
+    """Returns the content address of a text's embedding under a model."""
+    return hashlib.sha256(f"{model_id}\0{text}".encode("utf-8")).digest()
+
+
+class EmbeddingStore:
+    """
+    Append-only store of float32 vectors for one model, keyed by content hash.
+    vectors.f32 holds the vectors back to back and is read through a memory
+    map. keys.bin is the index sidecar: row i of the vectors belongs to the
+    i-th 32-byte key. Vectors are written before their keys, so a crash can
+    only leave unused vectors behind, never a key without a vector. Appends
+    hold a file lock, so several processes can share one store.
+    """
+
+    def __init__(self, directory, model_id, dimensions=None):
+        self.directory = directory
+        self.model_id = model_id
+        self.dimensions = dimensions
+        self.vectors_path = os.path.join(directory, "vectors.f32")
+        self.keys_path = os.path.join(directory, "keys.bin")
+        self.meta_path = os.path.join(directory, "meta.json")
+        self._rows = {}
+        self._row_count = 0
+        self._vectors = None
+        self._lock = threading.Lock()
+
+        os.makedirs(directory, exist_ok=True)
+        if os.path.exists(self.meta_path):
+            with open(self.meta_path, encoding="utf-8") as meta_file:
+                self.dimensions = json.load(meta_file)["dimensions"]
+        self._load_keys()
+
+    def _load_keys(self, start_row=0):
+        """Reads the keys from start_row on, e.g. ones other processes added."""
+        if not os.path.exists(self.keys_path) or self.dimensions is None:
+            return
+        with open(self.keys_path, "rb") as keys_file:
+            keys_file.seek(start_row * KEY_SIZE)
+            data = keys_file.read()
+        rows = len(data) // KEY_SIZE
+        for row in range(rows):
+            self._rows[data[row * KEY_SIZE : (row + 1) * KEY_SIZE]] = start_row + row
+        self._row_count = start_row + rows
+
+    def _mapped_vectors(self):
+        """Returns a memory map covering every stored vector."""
+        if self._vectors is None or len(self._vectors) < self._row_count:
+            self._vectors = np.memmap(
+                self.vectors_path,
+                dtype=np.float32,
+                mode="r",
+                shape=(self._row_count, self.dimensions),
+            )
+        return self._vectors
+
+    def __len__(self):
+        return len(self._rows)
+
+    def get_many(self, keys):
+        """Returns the stored vector of each key, or None where it is missing."""
+        with self._lock:
+            if not self._rows:
+                return [None] * len(keys)
+            vectors = self._mapped_vectors()
+            return [
+                vectors[self._rows[key]] if key in self._rows else None
+                for key in keys
+            ]
+
+    def put_many(self, keys, vectors):
+        """Appends the vectors of keys that are not stored yet."""
+        vectors = np.asarray(vectors, dtype=np.float32)
+        with self._lock:
+            if self.dimensions is None:
+                self.dimensions = vectors.shape[1]
+                with open(self.meta_path, "w", encoding="utf-8") as meta_file:
+                    json.dump(
+                        {"model_id": self.model_id, "dimensions": self.dimensions},
+                        meta_file,
+                    )
+
+            row_bytes = 4 * self.dimensions
+            with open(self.keys_path, "ab") as keys_file:
+                fcntl.flock(keys_file, fcntl.LOCK_EX)
+                try:
+                    # Keys other processes added count as stored too.
+                    self._load_keys(self._row_count)
+                    new_keys = {}
+                    for key, vector in zip(keys, vectors):
+                        if key not in self._rows:
+                            new_keys.setdefault(key, vector)
+                    if not new_keys:
+                        return
+                    base_row = os.fstat(keys_file.fileno()).st_size // KEY_SIZE
+                    new_vectors = np.stack(list(new_keys.values()))
+                    with open(self.vectors_path, "ab") as vectors_file:
+                        # Drop vectors a crashed writer left without keys.
+                        vectors_file.truncate(base_row * row_bytes)
+                        vectors_file.write(new_vectors.tobytes())
+                        vectors_file.flush()
+                        os.fsync(vectors_file.fileno())
+                    keys_file.truncate(base_row * KEY_SIZE)
+                    keys_file.write(b"".join(new_keys))
+                    keys_file.flush()
+                finally:
+                    fcntl.flock(keys_file, fcntl.LOCK_UN)
+
+            for row, key in enumerate(new_keys, base_row):
+                self._rows[key] = row
+            self._row_count = base_row + len(new_keys)
+
+
+class CachedEmbeddings(Embeddings):
+    """
+    Embeddings that look every text up in an EmbeddingStore first and only
+    send the misses to the wrapped embeddings, e.g. BedrockEmbeddings.
+    Texts that were embedded once, in any process, never reach Bedrock again.
+    Query embeddings are not stored on disk, as every user question would
+    grow the store. The most recent max_queries are kept in memory.
+    """
+
+    def __init__(
+        self, embeddings, model_id, cache_dir=DEFAULT_CACHE_DIR, max_queries=1024
+    ):
+        self.embeddings = embeddings
+        self.model_id = model_id
+        self.max_queries = max_queries
+        self._queries = OrderedDict()
+        self._queries_lock = threading.Lock()
+        safe_model_id = model_id.replace(":", "_").replace("/", "_")
+        self.store = EmbeddingStore(os.path.join(cache_dir, safe_model_id), model_id)
+        self.hits = 0
+        self.misses = 0
+
+    def embed_documents(self, texts):
+        keys = [embedding_key(self.model_id, text) for text in texts]
+        vectors = self.store.get_many(keys)
+
+        missing = {}
+        for index, vector in enumerate(vectors):
+            if vector is None:
+                missing.setdefault(keys[index], texts[index])
+        self.hits += len(texts) - len(missing)
+        self.misses += len(missing)
+
+        if missing:
+            new_vectors = self.embeddings.embed_documents(list(missing.values()))
+            self.store.put_many(list(missing), new_vectors)
+            vectors = self.store.get_many(keys)
+
+        return [vector.tolist() for vector in vectors]
+
+    def embed_query(self, text):
+        key = embedding_key(self.model_id, text)
+        with self._queries_lock:
+            vector = self._queries.get(key)
+            if vector is not None:
+                self._queries.move_to_end(key)
+        if vector is None:
+            stored = self.store.get_many([key])[0]
+            vector = None if stored is None else stored.tolist()
+        if vector is not None:
+            self.hits += 1
+            return list(vector)
+
+        self.misses += 1
+        vector = list(self.embeddings.embed_query(text))
+        with self._queries_lock:
+            self._queries[key] = vector
+            while len(self._queries) > self.max_queries:
+                self._queries.popitem(last=False)
+        return vector
+
+    def stats(self):
+        return {"stored": len(self.store), "hits": self.hits, "misses": self.misses}
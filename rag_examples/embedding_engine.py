@@ -0,0 +1,163 @@
+import json
+import random
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+from botocore.exceptions import BotoCoreError, ClientError
+from langchain_core.embeddings import Embeddings
+
+from metrics import metrics
+
+RETRYABLE_ERROR_CODES = {
+    "ThrottlingException",
+    "TooManyRequestsException",
+    "ServiceUnavailableException",
+    "ModelNotReadyException",
+    "InternalServerException",
+}
+
+
+class RateLimiter:
+    """Token bucket that spaces calls out to at most `rate` per second."""
+
+    def __init__(self, rate, burst=None):
+        self.rate = rate
+        self.capacity = burst or max(1.0, rate)
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self):
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self.tokens = min(
+                    self.capacity, self.tokens + (now - self.updated) * self.rate
+                )
+                self.updated = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                wait_time = (1 - self.tokens) / self.rate
+            time.sleep(wait_time)
+
+
+class EmbeddingEngine(Embeddings):
+    """
+    Embeds many texts with Titan concurrently. Requests fan out over a
+    bounded thread pool, optionally under a requests-per-second limit, and
+    each text is retried on its own when it is throttled or fails. This is
+    the only retry layer, so the client should make a single attempt.
+    iter_embeddings yields (index, vector) pairs as they complete, so an
+    index can be filled while embedding is still going on; embed_documents
+    returns the vectors in input order.
+    """
+
+    def __init__(
+        self,
+        client,
+        model_id="amazon.titan-embed-text-v1",
+        max_workers=16,
+        requests_per_second=None,
+        max_attempts=6,
+        base_delay=0.5,
+        max_delay=20.0,
+    ):
+        """
+        Args:
+            client: The Boto3 Bedrock runtime client, from
+                get_client("bedrock-runtime", **SINGLE_ATTEMPT).
+            model_id (str): The Titan embeddings model.
+            max_workers (int): Upper bound on requests in flight.
+            requests_per_second (float): Optional cap on the request rate.
+            max_attempts (int): Attempts per text before giving up.
+            base_delay (float): First backoff delay in seconds.
+            max_delay (float): Longest backoff delay in seconds.
+        """
+        self.client = client
+        self.model_id = model_id
+        self.max_workers = max_workers
+        self.limiter = RateLimiter(requests_per_second) if requests_per_second else None
+        self.max_attempts = max_attempts
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.requests = 0
+        self.retries = 0
+        self._counts_lock = threading.Lock()
+
+    def _embed_one(self, text):
+        for attempt in range(self.max_attempts):
+            if self.limiter is not None:
+                self.limiter.acquire()
+            start_time = time.perf_counter()
+            try:
+                response = self.client.invoke_model(
+                    modelId=self.model_id,
+                    body=json.dumps({"inputText": text}),
+                    accept="application/json",
+                    contentType="application/json",
+                )
+                body = json.loads(response["body"].read())
+            except (ClientError, BotoCoreError) as error:
+                if isinstance(error, ClientError):
+                    code = error.response.get("Error", {}).get("Code", "Unknown")
+                    retryable = code in RETRYABLE_ERROR_CODES
+                else:
+                    # Timeouts and dropped connections, which botocore no
+                    # longer retries with a single-attempt client.
+                    code = type(error).__name__
+                    retryable = True
+                metrics.record_error(self.model_id, code, task="embed")
+                if not retryable or attempt == self.max_attempts - 1:
+                    raise
+                with self._counts_lock:
+                    self.retries += 1
+                # Exponential backoff with full jitter.
+                delay = min(self.max_delay, self.base_delay * 2**attempt)
+                time.sleep(random.uniform(0, delay))
+                continue
+
+            with self._counts_lock:
+                self.requests += 1
+            metrics.record_call(
+                self.model_id,
+                time.perf_counter() - start_time,
+                usage={"inputTokens": body.get("inputTextTokenCount", 0)},
+                task="embed",
+            )
+            return body["embedding"]
+
+    def iter_embeddings(self, texts):
+        """
+        Yields (index, vector) for every text in the order they complete.
+        At most a few batches of work are queued at a time, so very long
+        inputs are not all submitted at once.
+        """
+        texts = iter(enumerate(texts))
+        max_pending = self.max_workers * 4
+        with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+            pending = {}
+            try:
+                while True:
+                    for index, text in texts:
+                        pending[executor.submit(self._embed_one, text)] = index
+                        if len(pending) >= max_pending:
+                            break
+                    if not pending:
+                        return
+                    done, _ = wait(pending, return_when=FIRST_COMPLETED)
+                    for future in done:
+                        yield pending.pop(future), future.result()
+            finally:
+                for future in pending:
+                    future.cancel()
+
+    def embed_documents(self, texts):
+        vectors = [None] * len(texts)
+        for index, vector in self.iter_embeddings(texts):
+            vectors[index] = vector
+        return vectors
+
+    def embed_query(self, text):
+        return self._embed_one(text)
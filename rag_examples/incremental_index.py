@@ -0,0 +1,503 @@
+import argparse
+import fcntl
+import hashlib
+import json
+import os
+import shutil
+import tempfile
+import time
+
+from mapped_index import MappedIndex, read_pickle_index
+
+# Pointer to the live version directory, replaced atomically on save.
+CURRENT_FILE = "CURRENT"
+# Held while a version is written and CURRENT is swapped.
+LOCK_FILE = "LOCK"
+MANIFEST_FILE = "manifest.json"
+
+INGEST_STATS = ("skipped_sources", "failed_sources", "added", "revived", "tombstoned")
+
+
+def file_hash(path):
+    """Returns the SHA-256 of a file, read in 1 MB blocks."""
+    digest = hashlib.sha256()
+    with open(path, "rb") as source_file:
+        for block in iter(lambda: source_file.read(1 << 20), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def chunk_id(source, text):
+    """Returns the content address of a chunk of a source."""
+    return hashlib.sha256(f"{source}\0{text}".encode("utf-8")).hexdigest()[:32]
+
+
+def add_documents(
+    vector_store,
+    id_documents,
+    embeddings,
+    batch_size=256,
+    index_options=None,
+    progress=None,
+    on_stored=None,
+):
+    """
+    Embeds documents and adds them to a MappedIndex in batches as the vectors
+    complete, creating the store with index_options if it is None.
+    id_documents is read lazily, so it can be a stream that is still being
+    produced. Embeddings with an iter_embeddings method (EmbeddingEngine)
+    are streamed; others are embedded in one embed_documents call.
+    Args:
+        vector_store (MappedIndex): The store to add to, or None.
+        id_documents (iterable): (chunk id, Document) pairs.
+        embeddings: The Embeddings to use.
+        batch_size (int): Vectors written to the store at a time.
+        index_options (dict): The index_options of a new store.
+        progress (callable): Called with the size and write time of every
+            batch written.
+        on_stored (callable): Called with the chunk ids of every batch once
+            they are in the store.
+
+    Returns:
+        vector_store (MappedIndex): The store.
+    """
+    pending = {}
+
+    def texts():
+        for index, (document_id, document) in enumerate(id_documents):
+            pending[index] = (document_id, document)
+            yield document.page_content
+
+    if hasattr(embeddings, "iter_embeddings"):
+        completed = embeddings.iter_embeddings(texts())
+    else:
+        all_texts = list(texts())
+        completed = enumerate(embeddings.embed_documents(all_texts))
+
+    batch = []
+
+    def flush():
+        nonlocal vector_store
+        start_time = time.perf_counter()
+        # Documents are dropped once written, so a long stream stays small.
+        written = [(pending.pop(index), vector) for index, vector in batch]
+        text_embeddings = [
+            (document.page_content, vector) for (_, document), vector in written
+        ]
+        metadatas = [document.metadata for (_, document), _ in written]
+        batch_ids = [document_id for (document_id, _), _ in written]
+        if vector_store is None:
+            vector_store = MappedIndex.from_embeddings(
+                text_embeddings,
+                embeddings,
+                metadatas=metadatas,
+                ids=batch_ids,
+                index_options=index_options,
+            )
+        else:
+            vector_store.add_embeddings(
+                text_embeddings, metadatas=metadatas, ids=batch_ids
+            )
+        batch.clear()
+        if on_stored is not None:
+            on_stored(batch_ids)
+        if progress is not None:
+            progress(len(written), time.perf_counter() - start_time)
+
+    for index, vector in completed:
+        batch.append((index, vector))
+        if len(batch) >= batch_size:
+            flush()
+    if batch:
+        flush()
+
+    return vector_store
+
+
+class IncrementalIndex:
+    """
+    A MappedIndex kept in step with a set of source files.
+    A manifest records the hash of every source and the ids of its chunks,
+    which are content hashes. Re-ingesting a source embeds only its new
+    chunks and tombstones the ones that are gone. Tombstoned vectors are
+    filtered out of searches and physically removed once they make up
+    compact_ratio of the index. Every save writes a new version directory
+    and then swaps the CURRENT pointer, so readers never see a partial index.
+    """
+
+    def __init__(
+        self,
+        directory,
+        embeddings,
+        chunker,
+        compact_ratio=0.2,
+        keep=2,
+        index_options=None,
+    ):
+        """
+        Args:
+            directory (str): Where the versions of the index are saved.
+            embeddings: The Embeddings used for chunks and queries.
+            chunker (callable): Maps a source path to a list of Documents.
+            compact_ratio (float): Share of tombstoned vectors that triggers
+                a compaction.
+            keep (int): Number of saved versions to keep.
+            index_options (dict): The MappedIndex index_options, e.g.
+                {"index_type": "hnsw", "ef_search": 64}.
+        """
+        self.directory = directory
+        self.embeddings = embeddings
+        self.chunker = chunker
+        self.compact_ratio = compact_ratio
+        self.keep = keep
+        self.index_options = index_options
+        self.vector_store = None
+        self.manifest = {"version": 0, "sources": {}, "tombstones": []}
+        self._tombstones = set()
+        # Planned sources whose new chunks are not all stored yet, and the
+        # source of each of those chunks.
+        self._pending = {}
+        self._unstored = {}
+        self.load()
+
+    def _version_path(self, version):
+        return os.path.join(self.directory, f"v{version:06d}")
+
+    def _current_version(self):
+        """Returns the version CURRENT points at on disk, or 0."""
+        current_path = os.path.join(self.directory, CURRENT_FILE)
+        if not os.path.exists(current_path):
+            return 0
+        with open(current_path, encoding="utf-8") as current_file:
+            return int(current_file.read().strip().lstrip("v"))
+
+    def load(self):
+        """Opens the version CURRENT points at, if there is one."""
+        current_path = os.path.join(self.directory, CURRENT_FILE)
+        if not os.path.exists(current_path):
+            return
+        with open(current_path, encoding="utf-8") as current_file:
+            version_path = os.path.join(self.directory, current_file.read().strip())
+        with open(os.path.join(version_path, MANIFEST_FILE), encoding="utf-8") as f:
+            self.manifest = json.load(f)
+        self._tombstones = set(self.manifest["tombstones"])
+        self.vector_store = MappedIndex.load_local(
+            version_path, self.embeddings, index_options=self.index_options
+        )
+
+    def live_chunks(self):
+        sources = self.manifest["sources"].values()
+        return sum(len(entry["chunks"]) for entry in sources)
+
+    def changed_sources(self, paths, stats):
+        """
+        Returns (path, hash) for each path whose content is not indexed yet,
+        and counts the others in stats["skipped_sources"].
+        """
+        changed = []
+        for path in paths:
+            source_hash = file_hash(path)
+            entry = self.manifest["sources"].get(path)
+            if entry is not None and entry["hash"] == source_hash:
+                stats["skipped_sources"] += 1
+            else:
+                changed.append((path, source_hash))
+        return changed
+
+    def plan_source(self, path, source_hash, documents, stats):
+        """
+        Plans the update of a changed source: chunks that are gone are to be
+        tombstoned and ones that came back revived. The plan is applied to
+        the manifest once every new chunk of the source is in the store, so
+        a source that fails part way is planned again by the next ingest.
+        Returns (chunk id, Document) for the chunks that need embedding.
+        """
+        old_entry = self.manifest["sources"].get(path)
+        old_ids = set(old_entry["chunks"]) if old_entry else set()
+        ids = []
+        revived = []
+        new_documents = []
+        for document in documents:
+            document_id = chunk_id(path, document.page_content)
+            if document_id in ids:
+                continue
+            ids.append(document_id)
+            document.metadata["chunk_id"] = document_id
+            if document_id in self._tombstones:
+                # The chunk came back, e.g. an edit was reverted.
+                revived.append(document_id)
+            elif document_id not in old_ids:
+                new_documents.append((document_id, document))
+
+        new_ids = {document_id for document_id, _ in new_documents}
+        self._pending[path] = {
+            "entry": {"hash": source_hash, "chunks": ids},
+            "removed": old_ids - set(ids),
+            "revived": revived,
+            "new": new_ids,
+            "unstored": set(new_ids),
+            "stats": stats,
+        }
+        self._unstored.update(dict.fromkeys(new_ids, path))
+        if not new_ids:
+            self._commit_source(path)
+        return new_documents
+
+    def _chunks_stored(self, ids):
+        """Applies the plan of every source whose new chunks are all stored."""
+        for document_id in ids:
+            path = self._unstored.pop(document_id, None)
+            if path is None:
+                continue
+            unstored = self._pending[path]["unstored"]
+            unstored.discard(document_id)
+            if not unstored:
+                self._commit_source(path)
+
+    def _commit_source(self, path):
+        plan = self._pending.pop(path)
+        self._tombstones.difference_update(plan["revived"])
+        self._tombstones.update(plan["removed"])
+        self.manifest["sources"][path] = plan["entry"]
+        stats = plan["stats"]
+        stats["revived"] += len(plan["revived"])
+        stats["tombstoned"] += len(plan["removed"])
+        stats["added"] += len(plan["new"])
+
+    def _abandon_pending(self):
+        """
+        Drops the plans of sources that did not make it into the store. Any
+        of their chunks that did are tombstoned until the source is ingested
+        again.
+        """
+        for plan in self._pending.values():
+            self._tombstones.update(plan["new"] - plan["unstored"])
+        self._pending.clear()
+        self._unstored.clear()
+
+    def add_chunks(self, id_documents, progress=None):
+        """Embeds (chunk id, Document) pairs, which may be a stream, and stores them."""
+        # Created up front, so batches stored before an error are not lost.
+        if self.vector_store is None:
+            self.vector_store = MappedIndex(
+                self.embeddings, index_options=self.index_options
+            )
+        add_documents(
+            self.vector_store,
+            id_documents,
+            self.embeddings,
+            index_options=self.index_options,
+            progress=progress,
+            on_stored=self._chunks_stored,
+        )
+
+    def finish_ingest(self, paths, stats, remove_missing=True):
+        """
+        Drops the plans of sources that were not stored in full, tombstones
+        sources not in paths, and compacts and saves if anything changed.
+        """
+        self._abandon_pending()
+        sources = self.manifest["sources"]
+        if remove_missing:
+            for path in set(sources) - set(paths):
+                removed = sources.pop(path)["chunks"]
+                self._tombstones.update(removed)
+                stats["tombstoned"] += len(removed)
+
+        if stats["added"] or stats["revived"] or stats["tombstoned"]:
+            self._maybe_compact()
+            self.save()
+
+    def ingest(self, paths, remove_missing=True):
+        """
+        Brings the index up to date with the given source files and saves it.
+        Sources are chunked one after the other; ingest_pipeline.ingest_paths
+        does the same with parallel parsing.
+        Args:
+            paths (list): The source files that make up the corpus.
+            remove_missing (bool): Tombstone sources not in paths.
+
+        Returns:
+            stats (dict): Counts of skipped and failed sources and of added,
+                revived and tombstoned chunks.
+        """
+        stats = dict.fromkeys(INGEST_STATS, 0)
+        try:
+            for path, source_hash in self.changed_sources(paths, stats):
+                try:
+                    documents = self.chunker(path)
+                except Exception as error:
+                    print(f"Skipping {path}, it failed to parse: {error!r}")
+                    stats["failed_sources"] += 1
+                    continue
+                new_documents = self.plan_source(path, source_hash, documents, stats)
+                if new_documents:
+                    start_time = time.perf_counter()
+                    self.add_chunks(new_documents)
+                    print(
+                        f"Embedded {len(new_documents)} new chunks of {path} "
+                        f"in {time.perf_counter() - start_time:.1f}s"
+                    )
+        except BaseException:
+            # Keep the sources that were stored in full before giving up.
+            self.finish_ingest(paths, stats, remove_missing=False)
+            raise
+        self.finish_ingest(paths, stats, remove_missing)
+        return stats
+
+    def _maybe_compact(self):
+        """Removes tombstoned vectors once they are a large share of the index."""
+        total = self.live_chunks() + len(self._tombstones)
+        if self._tombstones and len(self._tombstones) >= total * self.compact_ratio:
+            print(f"Compacting {len(self._tombstones)} deleted chunks")
+            self.vector_store.delete(list(self._tombstones))
+            self._tombstones.clear()
+
+    def save(self):
+        """
+        Writes a new version, points CURRENT at it and reopens the store
+        from it, so compacted rows are gone from memory too.
+        Savers in other threads and processes wait on a lock file. Each takes
+        the version after the newest one on disk, and the last save wins.
+        """
+        os.makedirs(self.directory, exist_ok=True)
+        with open(os.path.join(self.directory, LOCK_FILE), "a") as lock_file:
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
+            try:
+                self._save_locked()
+            finally:
+                fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+    def _save_locked(self):
+        version = max(self.manifest["version"], self._current_version()) + 1
+        self.manifest["version"] = version
+        self.manifest["tombstones"] = sorted(self._tombstones)
+        self.manifest["saved"] = time.time()
+        version_path = self._version_path(version)
+        version_name = os.path.basename(version_path)
+
+        temporary_path = tempfile.mkdtemp(
+            prefix=f"{version_name}.", suffix=".tmp", dir=self.directory
+        )
+        if self.vector_store is not None:
+            self.vector_store.save_local(temporary_path)
+        with open(
+            os.path.join(temporary_path, MANIFEST_FILE), "w", encoding="utf-8"
+        ) as manifest_file:
+            json.dump(self.manifest, manifest_file)
+        if os.path.exists(version_path):
+            # Left by a save that died before it swapped CURRENT.
+            shutil.rmtree(version_path)
+        os.replace(temporary_path, version_path)
+
+        current_path = os.path.join(self.directory, CURRENT_FILE)
+        with open(f"{current_path}.tmp", "w", encoding="utf-8") as current_file:
+            current_file.write(version_name)
+        os.replace(f"{current_path}.tmp", current_path)
+
+        written_store = self.vector_store
+        self.load()
+        if written_store is not None:
+            written_store.close()
+
+        for old_version in range(version - self.keep, 0, -1):
+            old_path = self._version_path(old_version)
+            if not os.path.exists(old_path):
+                break
+            shutil.rmtree(old_path)
+
+    def similarity_search(self, query, k=4):
+        """Returns the k closest live chunks to the query."""
+        if self.vector_store is None:
+            return []
+        tombstones = self._tombstones
+        return self.vector_store.similarity_search(
+            query,
+            k=k,
+            filter=lambda metadata: metadata.get("chunk_id") not in tombstones,
+            fetch_k=k + len(tombstones),
+        )
+
+    def hybrid_search(self, query, k=4, fetch_k=20):
+        """Returns the k live chunks that rank best across BM25 and vectors."""
+        if self.vector_store is None:
+            return []
+        tombstones = self._tombstones
+        return self.vector_store.hybrid_search(
+            query,
+            k=k,
+            filter=lambda metadata: metadata.get("chunk_id") not in tombstones,
+            fetch_k=fetch_k + len(tombstones),
+        )
+
+
+def is_pickle_index(directory):
+    """Returns True if directory holds only a pickled FAISS.save_local index."""
+    pickle_path = os.path.join(directory, "index.pkl")
+    current_path = os.path.join(directory, CURRENT_FILE)
+    return os.path.exists(pickle_path) and not os.path.exists(current_path)
+
+
+def convert_pickle_index(directory, embeddings):
+    """
+    Converts an index saved by langchain's FAISS.save_local in directory
+    into the first version of an IncrementalIndex in the same directory.
+    Chunks are re-keyed by content hash. Sources that still exist on disk
+    are recorded with their current hash, so the next ingest skips them if
+    they have not changed.
+    Args:
+        directory (str): The folder holding index.pkl.
+        embeddings: Used to re-embed the chunks if index.faiss is missing.
+
+    Returns:
+        index (IncrementalIndex): The converted index.
+    """
+    documents, vectors = read_pickle_index(directory)
+    if vectors is None:
+        print(f"No index.faiss in {directory}, embedding {len(documents)} chunks")
+        vectors = embeddings.embed_documents(
+            [document.page_content for _, document in documents]
+        )
+
+    index = IncrementalIndex(directory, embeddings, chunker=None)
+    sources = index.manifest["sources"]
+    text_embeddings, metadatas, ids = [], [], []
+    for (_, document), vector in zip(documents, vectors):
+        source = document.metadata.get("source", "")
+        document_id = chunk_id(source, document.page_content)
+        if source not in sources:
+            source_hash = file_hash(source) if os.path.exists(source) else None
+            sources[source] = {"hash": source_hash, "chunks": []}
+        if document_id in sources[source]["chunks"]:
+            continue
+        sources[source]["chunks"].append(document_id)
+        text_embeddings.append((document.page_content, vector))
+        metadatas.append(dict(document.metadata, chunk_id=document_id))
+        ids.append(document_id)
+
+    index.vector_store = MappedIndex.from_embeddings(
+        text_embeddings, embeddings, metadatas=metadatas, ids=ids
+    )
+    index.save()
+    return index
+
+
+if __name__ == "__main__":
+    from bedrock_client import SINGLE_ATTEMPT, get_client
+    from embedding_engine import EmbeddingEngine
+
+    parser = argparse.ArgumentParser(
+        description="Convert a pickled FAISS index into a memory-mapped one."
+    )
+    parser.add_argument("directory", help="Folder holding index.pkl")
+    parser.add_argument("--model-id", default="amazon.titan-embed-text-v1")
+    args = parser.parse_args()
+
+    engine = EmbeddingEngine(
+        get_client("bedrock-runtime", "us-east-1", **SINGLE_ATTEMPT), args.model_id
+    )
+    converted = convert_pickle_index(args.directory, engine)
+    print(
+        f"Wrote {len(converted.vector_store)} chunks to "
+        f"{converted._version_path(converted.manifest['version'])}"
+    )
@@ -0,0 +1,271 @@
+import argparse
+import multiprocessing
+import os
+import queue
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from concurrent.futures.process import BrokenProcessPool
+
+from langchain.text_splitter import RecursiveCharacterTextSplitter
+from langchain_unstructured import UnstructuredLoader
+
+from incremental_index import INGEST_STATS
+
+SUPPORTED_EXTENSIONS = (".pdf", ".html", ".htm")
+
+# Marks the end of the parsed documents on the queue.
+_DONE = object()
+
+
+def chunk_doc_to_text(doc_loc: str):
+    loader = UnstructuredLoader(doc_loc)
+    text_splitter = RecursiveCharacterTextSplitter(chunk_size=1000, chunk_overlap=20)
+
+    # Elements are split as the loader yields them, not after it is done.
+    texts = []
+    for element in loader.lazy_load():
+        texts.extend(text_splitter.split_documents([element]))
+
+    return texts
+
+
+def find_documents(directory):
+    """Returns the PDF and HTML files under a directory, in a stable order."""
+    paths = []
+    for root, _, names in os.walk(directory):
+        for name in names:
+            if name.lower().endswith(SUPPORTED_EXTENSIONS):
+                paths.append(os.path.join(root, name))
+    return sorted(paths)
+
+
+def _parse(chunker, path):
+    """Runs in a worker process. Returns the chunks and the seconds it took."""
+    start_time = time.perf_counter()
+    documents = chunker(path)
+    return documents, time.perf_counter() - start_time
+
+
+class PipelineProgress:
+    """Thread-safe counters of each ingestion stage, printed as they change."""
+
+    def __init__(self, parse_workers, report_every=10.0):
+        self.parse_workers = parse_workers
+        self.report_every = report_every
+        self.start_time = time.perf_counter()
+        self.last_report = self.start_time
+        self.documents_parsed = 0
+        self.documents_failed = 0
+        self.chunks_parsed = 0
+        self.parse_seconds = 0.0
+        self.chunks_queued = 0
+        self.chunks_written = 0
+        self.write_seconds = 0.0
+        self.queue_depth = 0
+        self._lock = threading.Lock()
+
+    def parsed(self, chunks, seconds, queue_depth):
+        with self._lock:
+            self.documents_parsed += 1
+            self.chunks_parsed += chunks
+            self.parse_seconds += seconds
+            self.queue_depth = queue_depth
+        self.maybe_report()
+
+    def failed(self):
+        with self._lock:
+            self.documents_failed += 1
+
+    def queued(self, chunks):
+        with self._lock:
+            self.chunks_queued += chunks
+
+    def written(self, chunks, seconds):
+        with self._lock:
+            self.chunks_written += chunks
+            self.write_seconds += seconds
+        self.maybe_report()
+
+    def maybe_report(self):
+        now = time.perf_counter()
+        if now - self.last_report >= self.report_every:
+            self.last_report = now
+            self.report()
+
+    def report(self):
+        with self._lock:
+            elapsed = max(time.perf_counter() - self.start_time, 1e-9)
+            busy = self.parse_seconds / (elapsed * self.parse_workers)
+            print(
+                f"[{elapsed:7.1f}s] "
+                f"parse: {self.documents_parsed} docs "
+                f"({self.documents_failed} failed), {self.chunks_parsed} chunks "
+                f"({self.chunks_parsed / elapsed:.1f} chunks/s, "
+                f"workers {busy:.0%} busy, {self.queue_depth} waiting) | "
+                f"embed: {self.chunks_queued} new chunks queued | "
+                f"write: {self.chunks_written} chunks "
+                f"({self.chunks_written / elapsed:.1f} chunks/s, "
+                f"{self.write_seconds:.1f}s writing)",
+                flush=True,
+            )
+
+
+def _put(parsed, item, stop):
+    """Puts item on the queue, giving up if the consumer has stopped."""
+    while not stop.is_set():
+        try:
+            parsed.put(item, timeout=0.5)
+            return
+        except queue.Full:
+            continue
+
+
+def _parse_all(chunker, sources, parse_workers, parsed, progress, stop):
+    """
+    Parses sources in a process pool and puts (path, hash, documents) on the
+    parsed queue as they finish. A source that fails to parse is put as
+    (path, hash, error) and the others carry on. At most two documents per
+    worker are in flight, and none are started while the queue is full.
+    """
+    try:
+        # Spawned rather than forked, as the embedding threads are running.
+        context = multiprocessing.get_context("spawn")
+        with ProcessPoolExecutor(parse_workers, mp_context=context) as executor:
+            sources = iter(sources)
+            pending = {}
+            while not stop.is_set():
+                for path, source_hash in sources:
+                    future = executor.submit(_parse, chunker, path)
+                    pending[future] = (path, source_hash)
+                    if len(pending) >= 2 * parse_workers:
+                        break
+                if not pending:
+                    break
+                done, _ = wait(pending, return_when=FIRST_COMPLETED)
+                for future in done:
+                    path, source_hash = pending.pop(future)
+                    try:
+                        documents, seconds = future.result()
+                    except BrokenProcessPool:
+                        # A worker died, so no later document can be parsed.
+                        raise
+                    except Exception as error:
+                        _put(parsed, (path, source_hash, error), stop)
+                        progress.failed()
+                        continue
+                    _put(parsed, (path, source_hash, documents), stop)
+                    progress.parsed(len(documents), seconds, parsed.qsize())
+            for future in pending:
+                future.cancel()
+        _put(parsed, _DONE, stop)
+    except BaseException as error:
+        _put(parsed, error, stop)
+
+
+def ingest_paths(
+    index,
+    paths,
+    parse_workers=None,
+    queue_size=16,
+    remove_missing=True,
+    report_every=10.0,
+):
+    """
+    Brings an IncrementalIndex up to date with the given files through a
+    staged pipeline. Changed files are parsed and split in a process pool.
+    Their new chunks stream through a bounded queue into the index's
+    embeddings and then into the store, so embedding starts with the first
+    parsed file. Each stage waits when the next one falls behind.
+    Files that fail to parse are skipped and counted. If the ingest stops
+    on an error, the sources stored in full so far are saved first.
+    Args:
+        index (IncrementalIndex): The index to update. Its chunker runs in
+            the worker processes, so it must be a module-level function.
+        paths (list): The source files that make up the corpus.
+        parse_workers (int): Worker processes. Defaults to the CPU count.
+        queue_size (int): Parsed documents that may wait for embedding.
+        remove_missing (bool): Tombstone sources not in paths.
+        report_every (float): Seconds between progress reports.
+
+    Returns:
+        stats (dict): Counts of skipped and failed sources and of added,
+            revived and tombstoned chunks.
+    """
+    stats = dict.fromkeys(INGEST_STATS, 0)
+    changed = index.changed_sources(paths, stats)
+    if changed:
+        parse_workers = min(parse_workers or os.cpu_count() or 1, len(changed))
+        progress = PipelineProgress(parse_workers, report_every)
+        parsed = queue.Queue(maxsize=queue_size)
+        stop = threading.Event()
+        parser = threading.Thread(
+            target=_parse_all,
+            args=(index.chunker, changed, parse_workers, parsed, progress, stop),
+            daemon=True,
+        )
+
+        def new_chunks():
+            while True:
+                item = parsed.get()
+                if item is _DONE:
+                    return
+                if isinstance(item, BaseException):
+                    raise item
+                path, source_hash, documents = item
+                if isinstance(documents, Exception):
+                    print(f"Skipping {path}, it failed to parse: {documents!r}")
+                    stats["failed_sources"] += 1
+                    continue
+                new_documents = index.plan_source(path, source_hash, documents, stats)
+                progress.queued(len(new_documents))
+                yield from new_documents
+
+        parser.start()
+        try:
+            try:
+                index.add_chunks(new_chunks(), progress=progress.written)
+            finally:
+                stop.set()
+                parser.join()
+        except BaseException:
+            # Keep the sources that were stored in full before giving up.
+            index.finish_ingest(paths, stats, remove_missing=False)
+            raise
+        progress.report()
+
+    index.finish_ingest(paths, stats, remove_missing)
+    return stats
+
+
+if __name__ == "__main__":
+    from bedrock_client import SINGLE_ATTEMPT, get_client
+    from embedding_engine import EmbeddingEngine
+    from incremental_index import IncrementalIndex
+
+    parser = argparse.ArgumentParser(
+        description="Index a directory of PDF and HTML files for chat_with_pdf."
+    )
+    parser.add_argument("directory")
+    parser.add_argument("--index", default="local_index")
+    parser.add_argument("--parse-workers", type=int)
+    parser.add_argument("--embed-workers", type=int, default=32)
+    parser.add_argument("--queue-size", type=int, default=16)
+    parser.add_argument("--report-every", type=float, default=10.0)
+    args = parser.parse_args()
+
+    engine = EmbeddingEngine(
+        get_client("bedrock-runtime", "us-east-1", **SINGLE_ATTEMPT),
+        model_id="amazon.titan-embed-text-v1",
+        max_workers=args.embed_workers,
+    )
+    local_index = IncrementalIndex(args.index, engine, chunk_doc_to_text)
+    start_time = time.perf_counter()
+    ingest_stats = ingest_paths(
+        local_index,
+        find_documents(args.directory),
+        parse_workers=args.parse_workers,
+        queue_size=args.queue_size,
+        report_every=args.report_every,
+    )
+    print(f"Ingested in {time.perf_counter() - start_time:.1f}s: {ingest_stats}")
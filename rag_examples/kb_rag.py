@@ -1,4 +1,4 @@
-import boto3
+from bedrock_client import get_client
 
 KB_ID = "TODO"
 QUERY = "What can you tell me about Amazon EC2?"
@@ -7,10 +7,7 @@ MODEL = "us.amazon.nova-lite-v1:0"
 NUM_RESULTS = 10
 
 # Setup bedrock
-bedrock_agent_runtime = boto3.client(
-    service_name="bedrock-agent-runtime",
-    region_name=REGION,
-)
+bedrock_agent_runtime = get_client("bedrock-agent-runtime", REGION)
 
 
 docs_only_response = bedrock_agent_runtime.retrieve(
@@ -0,0 +1,422 @@
+import json
+import os
+import pickle
+import sqlite3
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import faiss
+import numpy as np
+from langchain_core.documents import Document
+
+from ann_index import BUILD_OPTIONS, build_ann_index, set_search_params
+from bm25_index import BM25Builder, BM25Index, reciprocal_rank_fusion
+
+FORMAT_VERSION = 1
+VECTORS_FILE = "vectors.npy"
+DOCSTORE_FILE = "docstore.sqlite"
+MANIFEST_FILE = "index.json"
+ANN_FILE = "ann.faiss"
+
+# Rows of the vector file compared against a query at a time.
+BLOCK_ROWS = 65_536
+
+# ann.faiss is read through a read-only memory map, so processes share its
+# pages like those of vectors.npy. IO_FLAG_MMAP_IFC maps every index type.
+# Older faiss builds only have IO_FLAG_MMAP, which maps the IVF lists; HNSW
+# and flat indexes are then read into memory. IVF-PQ's precomputed distance
+# table is built in each process either way.
+ANN_READ_FLAGS = (
+    getattr(faiss, "IO_FLAG_MMAP_IFC", faiss.IO_FLAG_MMAP) | faiss.IO_FLAG_READ_ONLY
+)
+
+
+def _matches(metadata, filter):
+    if filter is None:
+        return True
+    if callable(filter):
+        return filter(metadata)
+    return all(metadata.get(key) == value for key, value in filter.items())
+
+
+class MappedIndex:
+    """
+    A vector store that is opened, not loaded. The vectors live in a float32
+    .npy file that is memory-mapped, so worker processes share its pages
+    through the OS page cache. Chunk text and metadata live in a SQLite
+    docstore and are only read for the rows a search returns. index.json
+    records the format, row count and dimensions. Opening an index costs
+    the same whatever its size, and nothing is unpickled.
+
+    Vectors added or deleted after opening are kept in memory until
+    save_local writes a new, compacted copy. It follows the parts of the
+    langchain FAISS interface that IncrementalIndex uses, and like FAISS'
+    default index it ranks by L2 distance.
+
+    The default "flat" index_type scans every vector. The other types of
+    ann_index.INDEX_TYPES are built by save_local into ann.faiss and only
+    propose candidates, which are re-ranked by their exact distance.
+
+    save_local also writes a BM25 index of the same rows, which
+    hybrid_search combines with the vector search.
+    """
+
+    def __init__(self, embeddings, folder_path=None, index_options=None):
+        """
+        Args:
+            embeddings: The Embeddings used for queries.
+            folder_path (str): An index written by save_local, or None for
+                an empty index.
+            index_options (dict): index_type, the build options of
+                ann_index.build_ann_index and the nprobe and ef_search search
+                options. They override the ones saved with the index.
+        """
+        self.embeddings = embeddings
+        self.folder_path = folder_path
+        self.dimensions = None
+        self._vectors = None
+        self._docstore = None
+        self._base_rows = 0
+        self._new_vectors = []
+        self._new_documents = []
+        self._new_rows = {}
+        self._deleted = set()
+        self._ann = None
+        self._bm25 = None
+        self._lock = threading.Lock()
+        self.index_options = {"index_type": "flat"}
+
+        if folder_path is not None:
+            with open(os.path.join(folder_path, MANIFEST_FILE), encoding="utf-8") as f:
+                manifest = json.load(f)
+            if manifest["format"] != FORMAT_VERSION:
+                raise ValueError(f"Unsupported index format {manifest['format']}")
+            self.dimensions = manifest["dimensions"]
+            self._base_rows = manifest["rows"]
+            self.index_options.update(manifest.get("index_options", {}))
+            if self._base_rows:
+                self._vectors = np.load(
+                    os.path.join(folder_path, VECTORS_FILE), mmap_mode="r"
+                )
+            if self._base_rows and BM25Index.exists(folder_path):
+                self._bm25 = BM25Index(folder_path)
+            database_path = os.path.abspath(os.path.join(folder_path, DOCSTORE_FILE))
+            self._docstore = sqlite3.connect(
+                f"file:{database_path}?mode=ro", uri=True, check_same_thread=False
+            )
+
+        self.index_options.update(index_options or {})
+        use_ann = folder_path is not None and self.index_options["index_type"] != "flat"
+        if use_ann and os.path.exists(os.path.join(folder_path, ANN_FILE)):
+            self._ann = faiss.read_index(
+                os.path.join(folder_path, ANN_FILE), ANN_READ_FLAGS
+            )
+            set_search_params(
+                self._ann,
+                nprobe=self.index_options.get("nprobe"),
+                ef_search=self.index_options.get("ef_search"),
+            )
+
+    @classmethod
+    def load_local(cls, folder_path, embeddings, index_options=None, **kwargs):
+        return cls(embeddings, folder_path, index_options)
+
+    @classmethod
+    def from_embeddings(
+        cls, text_embeddings, embedding, metadatas=None, ids=None, index_options=None
+    ):
+        index = cls(embedding, index_options=index_options)
+        index.add_embeddings(text_embeddings, metadatas=metadatas, ids=ids)
+        return index
+
+    def __len__(self):
+        return self._base_rows + len(self._new_documents) - len(self._deleted)
+
+    def add_embeddings(self, text_embeddings, metadatas=None, ids=None):
+        """
+        Adds (text, vector) pairs under the given ids. An id that was
+        deleted can be added again; it then names the new row.
+        """
+        text_embeddings = list(text_embeddings)
+        metadatas = metadatas or [{} for _ in text_embeddings]
+        if ids is None:
+            start = self._base_rows + len(self._new_documents)
+            ids = [str(start + index) for index in range(len(text_embeddings))]
+        with self._lock:
+            for (text, vector), metadata, document_id in zip(
+                text_embeddings, metadatas, ids
+            ):
+                if self._live_row(document_id) is not None:
+                    raise ValueError(f"Id {document_id} is already in the index")
+                vector = np.asarray(vector, dtype=np.float32)
+                if self.dimensions is None:
+                    self.dimensions = len(vector)
+                self._new_rows[document_id] = self._base_rows + len(
+                    self._new_documents
+                )
+                self._new_vectors.append(vector)
+                self._new_documents.append((document_id, text, dict(metadata)))
+        return ids
+
+    def _base_row(self, document_id):
+        if self._docstore is None:
+            return None
+        row = self._docstore.execute(
+            "SELECT row FROM chunks WHERE id = ?", (document_id,)
+        ).fetchone()
+        return row[0] if row else None
+
+    def _live_row(self, document_id):
+        """Returns the row an id names, or None if it is unknown or deleted."""
+        row = self._new_rows.get(document_id)
+        if row is None:
+            row = self._base_row(document_id)
+        return None if row is None or row in self._deleted else row
+
+    def delete(self, ids):
+        """Deletes vectors by id. Raises ValueError if an id is unknown."""
+        with self._lock:
+            rows = []
+            for document_id in ids:
+                row = self._live_row(document_id)
+                if row is None:
+                    raise ValueError(f"Id {document_id} is not in the index")
+                rows.append(row)
+            self._deleted.update(rows)
+        return True
+
+    def _nearest(self, query_vector, count):
+        """Returns the rows of the count live vectors closest to the query."""
+        if self._ann is not None:
+            # The ANN index only holds the saved rows; it may return deleted ones.
+            candidates = min(count + len(self._deleted), self._base_rows)
+            _, found = self._ann.search(query_vector[None, :], candidates)
+            rows = found[0][found[0] >= 0]
+            rows = np.sort(rows[~np.isin(rows, list(self._deleted))])
+            distances = ((self._vectors[rows] - query_vector) ** 2).sum(axis=1)
+        else:
+            parts = []
+            if self._vectors is not None:
+                for start in range(0, self._base_rows, BLOCK_ROWS):
+                    block = self._vectors[start : start + BLOCK_ROWS]
+                    parts.append(((block - query_vector) ** 2).sum(axis=1))
+            rows = np.arange(self._base_rows)
+            distances = np.concatenate(parts) if parts else np.empty(0, np.float32)
+
+        if self._new_vectors:
+            new_vectors = np.stack(self._new_vectors)
+            rows = np.concatenate(
+                [rows, np.arange(self._base_rows, self._base_rows + len(new_vectors))]
+            )
+            distances = np.concatenate(
+                [distances, ((new_vectors - query_vector) ** 2).sum(axis=1)]
+            )
+
+        if self._deleted:
+            distances[np.isin(rows, list(self._deleted))] = np.inf
+        count = min(count, int(np.isfinite(distances).sum()))
+        if count <= 0:
+            return []
+        nearest = np.argpartition(distances, count - 1)[:count]
+        nearest = nearest[np.argsort(distances[nearest])]
+        return rows[nearest].tolist()
+
+    def _documents(self, rows):
+        """Reads the documents of the given rows, in the same order."""
+        found = {}
+        base_rows = [int(row) for row in rows if row < self._base_rows]
+        if base_rows:
+            placeholders = ",".join("?" * len(base_rows))
+            for row, text, metadata in self._docstore.execute(
+                f"SELECT row, text, metadata FROM chunks WHERE row IN ({placeholders})",
+                base_rows,
+            ):
+                found[row] = Document(page_content=text, metadata=json.loads(metadata))
+        for row in rows:
+            if row >= self._base_rows:
+                _, text, metadata = self._new_documents[row - self._base_rows]
+                found[row] = Document(page_content=text, metadata=dict(metadata))
+        return [found[row] for row in rows]
+
+    def similarity_search_by_vector(self, embedding, k=4, filter=None, fetch_k=20):
+        """
+        Returns the k documents closest to a vector. With a filter, the
+        fetch_k closest are read and the first k that pass are returned.
+        Args:
+            embedding (list): The query vector.
+            k (int): Number of documents to return.
+            filter: A metadata dict to match, or a callable on the metadata.
+            fetch_k (int): Candidates to read before filtering.
+
+        Returns:
+            documents (list): The closest documents, nearest first.
+        """
+        with self._lock:
+            count = max(k, fetch_k) if filter is not None else k
+            rows = self._nearest(np.asarray(embedding, dtype=np.float32), count)
+            documents = self._documents(rows)
+        return [
+            document for document in documents if _matches(document.metadata, filter)
+        ][:k]
+
+    def similarity_search(self, query, k=4, filter=None, fetch_k=20):
+        return self.similarity_search_by_vector(
+            self.embeddings.embed_query(query), k=k, filter=filter, fetch_k=fetch_k
+        )
+
+    def hybrid_search(self, query, k=4, filter=None, fetch_k=20, rrf_k=60):
+        """
+        Returns the k documents that rank best across BM25 and vector search.
+        The query is embedded while BM25 runs, and the two rankings of
+        max(k, fetch_k) candidates each are merged by reciprocal rank fusion.
+        Rows added since the index was saved are only found by the vectors.
+        Args:
+            query (str): The query text.
+            k (int): Number of documents to return.
+            filter: A metadata dict to match, or a callable on the metadata.
+            fetch_k (int): Candidates taken from each ranking.
+            rrf_k (int): The rank offset of reciprocal rank fusion.
+
+        Returns:
+            documents (list): The best documents, best first.
+        """
+        count = max(k, fetch_k)
+        with ThreadPoolExecutor(max_workers=1) as executor:
+            vector_future = executor.submit(self.embeddings.embed_query, query)
+            with self._lock:
+                sparse_rows = []
+                if self._bm25 is not None:
+                    sparse_rows = self._bm25.search(query, count, self._deleted)
+            query_vector = np.asarray(vector_future.result(), dtype=np.float32)
+
+        with self._lock:
+            dense_rows = self._nearest(query_vector, count)
+            rows = reciprocal_rank_fusion([dense_rows, sparse_rows], k=rrf_k)
+            documents = self._documents(rows[:count])
+        return [
+            document for document in documents if _matches(document.metadata, filter)
+        ][:k]
+
+    def save_local(self, folder_path):
+        """
+        Writes the live rows to folder_path, dropping deleted ones, and
+        builds their BM25 index and, if index_type is not "flat", their ANN
+        index. Files are written under temporary names and then renamed, so
+        a folder that is open elsewhere keeps serving its old contents.
+        """
+        os.makedirs(folder_path, exist_ok=True)
+        with self._lock:
+            rows = len(self)
+            vectors_path = os.path.join(folder_path, VECTORS_FILE)
+            database_path = os.path.join(folder_path, DOCSTORE_FILE)
+            if os.path.exists(f"{database_path}.tmp"):
+                os.remove(f"{database_path}.tmp")
+
+            if rows:
+                vectors = np.lib.format.open_memmap(
+                    f"{vectors_path}.tmp",
+                    mode="w+",
+                    dtype=np.float32,
+                    shape=(rows, self.dimensions),
+                )
+            database = sqlite3.connect(f"{database_path}.tmp")
+            database.execute(
+                "CREATE TABLE chunks (row INTEGER PRIMARY KEY, id TEXT NOT NULL "
+                "UNIQUE, text TEXT NOT NULL, metadata TEXT NOT NULL)"
+            )
+
+            bm25 = BM25Builder()
+            written = 0
+            if self._docstore is not None:
+                for row, document_id, text, metadata in self._docstore.execute(
+                    "SELECT row, id, text, metadata FROM chunks ORDER BY row"
+                ):
+                    if row in self._deleted:
+                        continue
+                    vectors[written] = self._vectors[row]
+                    database.execute(
+                        "INSERT INTO chunks VALUES (?, ?, ?, ?)",
+                        (written, document_id, text, metadata),
+                    )
+                    bm25.add(text)
+                    written += 1
+            for offset, (document_id, text, metadata) in enumerate(
+                self._new_documents
+            ):
+                if self._base_rows + offset in self._deleted:
+                    continue
+                vectors[written] = self._new_vectors[offset]
+                database.execute(
+                    "INSERT INTO chunks VALUES (?, ?, ?, ?)",
+                    (written, document_id, text, json.dumps(metadata)),
+                )
+                bm25.add(text)
+                written += 1
+
+            database.commit()
+            database.close()
+            bm25.save(folder_path)
+
+            ann_path = os.path.join(folder_path, ANN_FILE)
+            index_type = self.index_options["index_type"]
+            if rows and index_type != "flat":
+                build_options = {
+                    name: self.index_options[name]
+                    for name in BUILD_OPTIONS
+                    if name in self.index_options
+                }
+                ann = build_ann_index(vectors, index_type, **build_options)
+                faiss.write_index(ann, f"{ann_path}.tmp")
+
+            if rows:
+                vectors.flush()
+                del vectors
+                os.replace(f"{vectors_path}.tmp", vectors_path)
+            os.replace(f"{database_path}.tmp", database_path)
+            if os.path.exists(f"{ann_path}.tmp"):
+                os.replace(f"{ann_path}.tmp", ann_path)
+            elif os.path.exists(ann_path):
+                os.remove(ann_path)
+
+            manifest_path = os.path.join(folder_path, MANIFEST_FILE)
+            with open(f"{manifest_path}.tmp", "w", encoding="utf-8") as manifest_file:
+                json.dump(
+                    {
+                        "format": FORMAT_VERSION,
+                        "rows": rows,
+                        "dimensions": self.dimensions,
+                        "metric": "l2",
+                        "index_options": self.index_options,
+                    },
+                    manifest_file,
+                )
+            os.replace(f"{manifest_path}.tmp", manifest_path)
+
+    def close(self):
+        if self._docstore is not None:
+            self._docstore.close()
+
+
+def read_pickle_index(folder_path):
+    """
+    Reads an index written by langchain's FAISS.save_local: index.pkl holds
+    the docstore and the row-to-id map, index.faiss the vectors.
+    Only use this on files you wrote yourself, as it unpickles them.
+
+    Returns:
+        documents (list): (id, Document) pairs in row order.
+        vectors (ndarray): The vectors, or None if index.faiss is missing.
+    """
+    with open(os.path.join(folder_path, "index.pkl"), "rb") as pickle_file:
+        docstore, index_to_docstore_id = pickle.load(pickle_file)
+    documents = [
+        (document_id, docstore.search(document_id))
+        for _, document_id in sorted(index_to_docstore_id.items())
+    ]
+
+    vectors = None
+    faiss_path = os.path.join(folder_path, "index.faiss")
+    if os.path.exists(faiss_path):
+        index = faiss.read_index(faiss_path)
+        vectors = index.reconstruct_n(0, index.ntotal)
+    return documents, vectors
@@ -0,0 +1,15 @@
+"""
+Runs full_code/metrics.py in this module, so the RAG examples and the text
+examples share one copy of it.
+"""
+
+import os
+
+_SHARED_PATH = os.path.join(
+    os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+    "full_code",
+    "metrics.py",
+)
+
+with open(_SHARED_PATH, encoding="utf-8") as _shared_file:
+    exec(compile(_shared_file.read(), _SHARED_PATH, "exec"))
@@ -0,0 +1,8 @@
+import os
+import sys
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# The examples are flat scripts that import each other by module name.
+for directory in ("benchmarks", "rag_examples", "full_code"):
+    sys.path.insert(0, os.path.join(REPO_ROOT, directory))
@@ -0,0 +1,53 @@
+"""Stand-ins for the chunker and embeddings of the RAG index tests."""
+
+import hashlib
+import os
+
+import numpy as np
+from langchain_core.documents import Document
+
+DIMENSIONS = 16
+
+
+def fake_vector(text):
+    """A deterministic unit vector for a text."""
+    seed = int.from_bytes(hashlib.sha256(text.encode("utf-8")).digest()[:8], "big")
+    vector = np.random.default_rng(seed).normal(size=DIMENSIONS)
+    return (vector / np.linalg.norm(vector)).astype(np.float32).tolist()
+
+
+class FakeEmbeddings:
+    """Embeds texts with fake_vector and counts the texts it embedded."""
+
+    def __init__(self):
+        self.embedded = 0
+
+    def embed_documents(self, texts):
+        self.embedded += len(texts)
+        return [fake_vector(text) for text in texts]
+
+    def embed_query(self, text):
+        return fake_vector(text)
+
+
+def split_lines(path):
+    """Chunks a text file into one Document per non-empty line."""
+    with open(path, encoding="utf-8") as source_file:
+        lines = [line.strip() for line in source_file]
+    return [
+        Document(page_content=line, metadata={"source": path}) for line in lines if line
+    ]
+
+
+def split_lines_unless_broken(path):
+    """split_lines, except that files named broken* fail to parse."""
+    if os.path.basename(path).startswith("broken"):
+        raise ValueError(f"cannot parse {path}")
+    return split_lines(path)
+
+
+class FailingEmbeddings(FakeEmbeddings):
+    """FakeEmbeddings whose document calls fail, as on a Bedrock outage."""
+
+    def embed_documents(self, texts):
+        raise RuntimeError("embedding service unavailable")
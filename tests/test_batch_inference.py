@@ -0,0 +1,78 @@
+import json
+
+import pytest
+
+import bedrock_client
+from batch_inference import MIN_RECORDS_PER_JOB, run_batch, write_shards
+from bedrock_standin import StandinConfig, serve_in_background
+
+
+@pytest.fixture
+def standin(monkeypatch):
+    server = serve_in_background(StandinConfig(output_tokens=16))
+    server.batch_job_seconds = 0.2
+    monkeypatch.setenv("BEDROCK_ENDPOINT_URL", server.url)
+    monkeypatch.setenv("S3_ENDPOINT_URL", server.url)
+    monkeypatch.setenv("AWS_ACCESS_KEY_ID", "standin")
+    monkeypatch.setenv("AWS_SECRET_ACCESS_KEY", "standin")
+    # Clients made before the endpoints were set must not be reused.
+    monkeypatch.setattr(bedrock_client, "_clients", {})
+    yield server
+    server.shutdown()
+
+
+def write_records(path, records):
+    with open(path, "w", encoding="utf-8") as input_file:
+        for record in records:
+            input_file.write(json.dumps(record) + "\n")
+
+
+def test_batch_run_against_standin(tmp_path, standin):
+    input_path = tmp_path / "records.jsonl"
+    output_path = tmp_path / "results.jsonl"
+    records = [
+        {"id": f"summary-{number}", "task": "summarize", "text": f"Page {number}."}
+        for number in range(150)
+    ] + [
+        {
+            "id": f"qa-{number}",
+            "task": "qa",
+            "question": "What is it about?",
+            "text": f"Page {number}.",
+        }
+        for number in range(100)
+    ]
+    write_records(input_path, records)
+
+    stats = run_batch(
+        str(input_path),
+        str(output_path),
+        bucket="batch-bucket",
+        role_arn="arn:aws:iam::123456789012:role/batch",
+        work_dir=str(tmp_path / "work"),
+        poll_seconds=0.1,
+        max_records=100,
+    )
+
+    assert stats["summarize"] == dict(stats["summarize"], status="Completed")
+    assert stats["summarize"]["completed"] == 150
+    assert stats["qa"]["completed"] == 100
+    with open(output_path, encoding="utf-8") as output_file:
+        outputs = [json.loads(line) for line in output_file]
+    assert sorted(output["id"] for output in outputs) == sorted(
+        record["id"] for record in records
+    )
+    assert all(output["result"] for output in outputs)
+
+
+def test_tasks_below_job_minimum_are_rejected(tmp_path):
+    input_path = tmp_path / "records.jsonl"
+    write_records(
+        input_path,
+        [
+            {"id": number, "task": "summarize", "text": "A page."}
+            for number in range(MIN_RECORDS_PER_JOB - 1)
+        ],
+    )
+    with pytest.raises(ValueError, match="at least 100 records"):
+        write_shards(str(input_path), str(tmp_path / "work"))
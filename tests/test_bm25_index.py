@@ -0,0 +1,22 @@
+from bm25_index import BM25Builder, BM25Index
+
+
+def build(tmp_path, texts):
+    builder = BM25Builder()
+    for text in texts:
+        builder.add(text)
+    builder.save(str(tmp_path))
+    return BM25Index(str(tmp_path))
+
+
+def test_search_ranks_the_matching_rows(tmp_path):
+    index = build(tmp_path, ["Amazon S3 buckets", "EC2 instances", "S3 and S3 again"])
+    assert index.search("s3", k=2) == [2, 0]
+    assert index.search("s3", exclude={2}) == [0]
+    assert index.search("lambda") == []
+
+
+def test_index_of_empty_chunks_returns_no_hits(tmp_path):
+    index = build(tmp_path, ["", "the and of", ""])
+    assert index.average_length == 1.0
+    assert index.search("s3") == []
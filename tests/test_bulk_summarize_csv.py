@@ -0,0 +1,56 @@
+import csv
+import json
+
+import bulk_summarize_csv
+from bulk_summarize_csv import run_csv_summaries
+
+SOURCE = "https://docs.aws.amazon.com/wellarchitected/latest/security-pillar/{}.html"
+
+
+def write_rows(path, count):
+    rows = [
+        {"source": SOURCE.format(f"page-{row}"), "page_content": f"text {row}"}
+        for row in range(count)
+    ]
+    with open(path, "w", newline="", encoding="utf-8") as csv_file:
+        writer = csv.DictWriter(csv_file, fieldnames=["source", "page_content"])
+        writer.writeheader()
+        writer.writerows(rows)
+    return rows
+
+
+def test_resume_from_checkpoint_taken_before_first_row(tmp_path, monkeypatch):
+    input_path = tmp_path / "pages.csv"
+    output_path = tmp_path / "summaries.jsonl"
+    rows = write_rows(input_path, 20)
+
+    def fail_first_row(text):
+        if text == "text 0":
+            raise RuntimeError("model unavailable")
+        return f"summary of {text}"
+
+    monkeypatch.setattr(bulk_summarize_csv, "warm_up", lambda *args, **kwargs: None)
+    monkeypatch.setattr(bulk_summarize_csv, "summarize_text", fail_first_row)
+    first = run_csv_summaries(str(input_path), str(output_path), max_workers=1)
+    assert first["failed"] == 1
+
+    # Row 0 never finished, so the checkpoint is still at row 0, after the header.
+    checkpoint_path = f"{output_path}.checkpoint"
+    with open(checkpoint_path, encoding="utf-8") as checkpoint_file:
+        checkpoint = json.load(checkpoint_file)
+    assert checkpoint["row"] == 0
+    assert checkpoint["offset"] == len(b"source,page_content\r\n")
+
+    monkeypatch.setattr(
+        bulk_summarize_csv, "summarize_text", lambda text: f"summary of {text}"
+    )
+    second = run_csv_summaries(str(input_path), str(output_path), max_workers=1)
+    assert second == dict(second, completed=1, failed=0, skipped=19)
+
+    with open(output_path, encoding="utf-8") as output_file:
+        outputs = [json.loads(line) for line in output_file]
+    done = {output["row"]: output for output in outputs if "error" not in output}
+    assert sorted(done) == list(range(20))
+    for row, output in done.items():
+        assert output["source"] == rows[row]["source"]
+        assert output["summary"] == f"summary of text {row}"
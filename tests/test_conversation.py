@@ -0,0 +1,108 @@
+import threading
+
+import pytest
+
+import gen_text
+from conversation import ConversationManager
+from response_cache import ResponseCache
+
+MODEL_ID = "us.amazon.nova-pro-v1:0"
+SUMMARY_MODEL_ID = "us.amazon.nova-micro-v1:0"
+
+
+class FakeRuntime:
+    """Replies with a long text and summarizes with "Summary N"."""
+
+    def __init__(self, failing_summaries=0):
+        self.failing_summaries = failing_summaries
+        self.requests = []
+        self._lock = threading.Lock()
+
+    def converse(self, modelId, messages, system, inferenceConfig):
+        with self._lock:
+            self.requests.append((modelId, system, messages))
+            if modelId == SUMMARY_MODEL_ID:
+                if self.failing_summaries:
+                    self.failing_summaries -= 1
+                    raise RuntimeError("summarizer unavailable")
+                text = f"Summary {len(self.requests)}"
+            else:
+                text = "reply " * 100
+        return {
+            "output": {"message": {"content": [{"text": text}]}},
+            "usage": {"inputTokens": 10, "outputTokens": 3},
+            "stopReason": "end_turn",
+        }
+
+    def replies(self):
+        return [request for request in self.requests if request[0] == MODEL_ID]
+
+
+@pytest.fixture
+def client(monkeypatch):
+    """Serves every call, including the ones of the fold's worker thread."""
+    client = FakeRuntime()
+    monkeypatch.setattr(gen_text, "response_cache", ResponseCache(path=None))
+    monkeypatch.setattr(gen_text, "bedrock_runtime", client)
+    return client
+
+
+def send(manager, text):
+    """Sends a turn and waits for the fold it may start."""
+    manager.send(text)
+    if manager._folding is not None:
+        manager._folding.result()
+
+
+def new_manager(max_input_tokens=600):
+    return ConversationManager(
+        model_id=MODEL_ID,
+        summary_model_id=SUMMARY_MODEL_ID,
+        max_input_tokens=max_input_tokens,
+    )
+
+
+def test_history_is_folded_past_the_budget(client):
+    manager = new_manager()
+    for turn in range(6):
+        send(manager, f"Question {turn} " + "word " * 50)
+    manager.close()
+
+    stats = manager.stats()
+    assert stats["folds"] >= 1
+    assert manager.summary.startswith("Summary")
+    assert manager.prompt_tokens() <= manager.max_input_tokens
+    # The newest pair is never folded.
+    assert manager.turns[-2]["content"][0]["text"].startswith("Question 5")
+
+
+def test_failed_fold_keeps_the_history_and_is_retried(client):
+    client.failing_summaries = 1
+    manager = new_manager()
+    for turn in range(3):
+        send(manager, f"Question {turn} " + "word " * 50)
+        if manager.fold_errors:
+            break
+    assert manager.fold_errors == 1
+    assert manager.folds == 0
+    kept = len(manager.turns)
+
+    send(manager, "One more question")
+    manager.close()
+    assert manager.folds == 1
+    assert len(manager.turns) < kept + 2
+
+
+def test_cache_points_follow_the_summary_and_the_history(client):
+    manager = new_manager(max_input_tokens=10**6)
+    manager.summary = "Earlier facts."
+    manager.send("First question")
+    manager.send("Second question")
+    manager.close()
+
+    _, system, messages = client.replies()[-1]
+    assert system[-1] == gen_text.CACHE_POINT
+    assert "Earlier facts." in system[1]["text"]
+    # The cache point ends the history before the newest message.
+    assert messages[-2]["content"][-1] == gen_text.CACHE_POINT
+    assert gen_text.CACHE_POINT not in messages[-1]["content"]
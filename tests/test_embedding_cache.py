@@ -0,0 +1,38 @@
+import pytest
+
+pytest.importorskip("langchain_core")
+
+from embedding_cache import CachedEmbeddings, EmbeddingStore, embedding_key
+from fakes import FakeEmbeddings, fake_vector
+
+MODEL_ID = "amazon.titan-embed-text-v2:0"
+
+
+def test_stores_on_one_directory_do_not_duplicate_keys(tmp_path):
+    first = EmbeddingStore(str(tmp_path), MODEL_ID)
+    second = EmbeddingStore(str(tmp_path), MODEL_ID)
+    keys = [embedding_key(MODEL_ID, text) for text in ("a", "b")]
+    vectors = [fake_vector(text) for text in ("a", "b")]
+
+    first.put_many(keys, vectors)
+    second.put_many(keys, vectors)
+
+    reopened = EmbeddingStore(str(tmp_path), MODEL_ID)
+    assert len(reopened) == 2
+    assert len(second) == 2
+    assert reopened.get_many(keys)[1].tolist() == pytest.approx(vectors[1])
+
+
+def test_queries_are_not_persisted(tmp_path):
+    embeddings = CachedEmbeddings(
+        FakeEmbeddings(), MODEL_ID, cache_dir=str(tmp_path), max_queries=2
+    )
+    embeddings.embed_documents(["stored chunk"])
+    for text in ("one", "two", "three", "three", "stored chunk"):
+        embeddings.embed_query(text)
+
+    assert len(embeddings.store) == 1
+    assert list(embeddings._queries) == [
+        embedding_key(MODEL_ID, text) for text in ("two", "three")
+    ]
+    assert embeddings.stats()["hits"] == 2
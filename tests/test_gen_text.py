@@ -0,0 +1,126 @@
+import json
+import threading
+
+import pytest
+
+import gen_text
+from response_cache import ResponseCache
+
+
+class FakeRuntime:
+    """Answers converse calls with a fixed text and counts them."""
+
+    def __init__(self, text="A summary.", stop_reason="end_turn"):
+        self.text = text
+        self.stop_reason = stop_reason
+        self.calls = []
+        self._lock = threading.Lock()
+
+    def converse(self, modelId, messages, **kwargs):
+        with self._lock:
+            self.calls.append(modelId)
+        return {
+            "output": {"message": {"content": [{"text": self.text}]}},
+            "usage": {"inputTokens": 10, "outputTokens": 3},
+            "stopReason": self.stop_reason,
+        }
+
+    def converse_stream(self, modelId, messages, **kwargs):
+        """Streams self.text as the input of a call to the requested tool."""
+        with self._lock:
+            self.calls.append(modelId)
+        stream = [
+            {"contentBlockStart": {"start": {"toolUse": {"name": "tool"}}}},
+            {"contentBlockDelta": {"delta": {"toolUse": {"input": self.text}}}},
+            {"messageStop": {"stopReason": "tool_use"}},
+            {"metadata": {"usage": {"inputTokens": 10, "outputTokens": 3}}},
+        ]
+        return {"stream": FakeStream(stream)}
+
+
+class FakeStream(list):
+    def close(self):
+        pass
+
+
+class Unreachable:
+    def __getattr__(self, name):
+        raise AssertionError("the default runtime client was used")
+
+
+@pytest.fixture(autouse=True)
+def isolated(monkeypatch):
+    monkeypatch.setattr(gen_text, "response_cache", ResponseCache(path=None))
+    monkeypatch.setattr(gen_text, "bedrock_runtime", Unreachable())
+
+
+def test_worker_threads_use_the_scoped_client():
+    client = FakeRuntime()
+    text = "\n\n".join(f"Paragraph {index} " + "word " * 200 for index in range(12))
+    with gen_text.client_scope(client):
+        gen_text.summarize_long_text(text, max_chunk_tokens=400, max_workers=4)
+    assert len(client.calls) > 2
+
+    answer = {"sentiment": "positive", "confidence": 0.9, "explanation": "Good."}
+    client = FakeRuntime(json.dumps(answer))
+    with gen_text.client_scope(client):
+        results = gen_text.analyze_sentiment_bulk(["good", "fine"], max_workers=2)
+    assert [result.to_dict()["sentiment"] for result in results] == ["positive"] * 2
+    assert len(client.calls) == 2
+
+
+def test_cache_hit_fills_usage_without_planning(monkeypatch):
+    client = FakeRuntime()
+    with gen_text.client_scope(client):
+        gen_text.generate_conversation("model", [], [], temperature=0)
+
+        def fail_plan(*args, **kwargs):
+            raise AssertionError("a cache hit was tokenized")
+
+        monkeypatch.setattr(gen_text, "plan_request", fail_plan)
+        usage = {}
+        text = gen_text.generate_conversation(
+            "model", [], [], temperature=0, usage=usage
+        )
+    assert text == "A summary."
+    assert usage == {"inputTokens": 10, "outputTokens": 3, "cacheHit": True}
+    assert len(client.calls) == 1
+
+
+def test_truncated_responses_are_not_cached():
+    client = FakeRuntime(stop_reason="max_tokens")
+    with gen_text.client_scope(client):
+        for _ in range(2):
+            gen_text.generate_conversation("model", [], [], temperature=0)
+    assert len(client.calls) == 2
+
+
+def test_router_skips_cache_hits(tmp_path, monkeypatch):
+    from model_router import ModelRouter
+
+    router = ModelRouter(refresh_seconds=0, path=str(tmp_path / "router.db"))
+    monkeypatch.setattr(gen_text, "model_router", router)
+    client = FakeRuntime()
+    with gen_text.client_scope(client):
+        for _ in range(3):
+            gen_text.run_task("qa", None, lambda model_id: ([], []), use_cache=True)
+    samples = sum(
+        router.model_stats(model_id, "qa")["samples"]
+        for model_id in router.rank("qa")
+    )
+    assert len(client.calls) == 1
+    assert samples == 1
+
+
+def test_summarize_text_plans_the_request_once(monkeypatch):
+    plans = []
+    plan_request = gen_text.plan_request
+
+    def counting_plan(*args, **kwargs):
+        plans.append(args[0])
+        return plan_request(*args, **kwargs)
+
+    monkeypatch.setattr(gen_text, "plan_request", counting_plan)
+    with gen_text.client_scope(FakeRuntime()):
+        assert gen_text.summarize_text("Short text.", use_cache=False) == "A summary."
+    assert plans == [gen_text.SUMMARIZE_MODEL_ID]
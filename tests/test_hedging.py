@@ -0,0 +1,111 @@
+import time
+
+import pytest
+
+import gen_text
+from hedging import HedgedConverse
+
+
+class FakeStream:
+    """Yields text after a delay, or raises error instead."""
+
+    def __init__(self, delay, text, error):
+        self.delay = delay
+        self.text = text
+        self.error = error
+        self.closed = False
+
+    def __iter__(self):
+        time.sleep(self.delay)
+        if self.error is not None:
+            raise self.error
+        for word in self.text.split():
+            if self.closed:
+                return
+            yield {"contentBlockDelta": {"delta": {"text": word + " "}}}
+        yield {"messageStop": {"stopReason": "end_turn"}}
+        yield {"metadata": {"usage": {"inputTokens": 7, "outputTokens": 2}}}
+
+    def close(self):
+        self.closed = True
+
+
+class FakeRuntime:
+    """Streams per model: (seconds to first token, text, error)."""
+
+    def __init__(self, behaviours):
+        self.behaviours = behaviours
+        self.calls = []
+        self.streams = []
+
+    def converse_stream(self, modelId, **kwargs):
+        self.calls.append(modelId)
+        stream = FakeStream(*self.behaviours[modelId])
+        self.streams.append(stream)
+        return {"stream": stream}
+
+
+def hedged(client, **kwargs):
+    options = {"backup_models": {"primary": "backup"}, "initial_delay": 0.05}
+    options.update(kwargs)
+    return HedgedConverse(client, **options)
+
+
+def test_hedge_wins_and_primary_is_closed():
+    client = FakeRuntime(
+        {"primary": (1.0, "slow answer", None), "backup": (0.0, "fast answer", None)}
+    )
+    converse = hedged(client)
+    response = converse.converse("primary", messages=[])
+
+    assert response["output"]["message"]["content"][0]["text"] == "fast answer "
+    assert response["hedge"]["hedged"] is True
+    assert response["hedge"]["winner_model_id"] == "backup"
+    assert converse.stats()["hedge_wins"] == 1
+    assert client.streams[0].closed
+
+
+def test_primary_failing_after_the_hedge_fires():
+    client = FakeRuntime(
+        {
+            "primary": (0.1, "", RuntimeError("primary failed")),
+            "backup": (0.2, "backup answer", None),
+        }
+    )
+    response = hedged(client).converse("primary", messages=[])
+
+    assert response["hedge"]["winner_model_id"] == "backup"
+    assert response["output"]["message"]["content"][0]["text"] == "backup answer "
+
+
+def test_both_failing_raises_the_primary_error():
+    client = FakeRuntime(
+        {
+            "primary": (0.1, "", RuntimeError("primary failed")),
+            "backup": (0.1, "", RuntimeError("backup failed")),
+        }
+    )
+    with pytest.raises(RuntimeError, match="primary failed"):
+        hedged(client).converse("primary", messages=[])
+    assert client.calls == ["primary", "backup"]
+
+
+def test_no_hedge_once_the_budget_is_spent():
+    client = FakeRuntime(
+        {"primary": (0.1, "answer", None), "backup": (0.0, "backup", None)}
+    )
+    converse = hedged(client, max_hedge_burst=1, max_hedge_ratio=0.0)
+    first = converse.converse("primary", messages=[])
+    second = converse.converse("primary", messages=[])
+
+    assert first["hedge"]["hedged"] is True
+    assert second["hedge"]["hedged"] is False
+    assert second["hedge"]["winner_model_id"] == "primary"
+    assert converse.stats()["hedges"] == 1
+
+
+def test_default_client_follows_client_scope():
+    client = FakeRuntime({"primary": (0.0, "scoped", None)})
+    with gen_text.client_scope(client):
+        response = hedged(None).converse("primary", messages=[])
+    assert response["output"]["message"]["content"][0]["text"] == "scoped "
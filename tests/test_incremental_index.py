@@ -0,0 +1,60 @@
+import os
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+pytest.importorskip("langchain_core")
+
+from fakes import FakeEmbeddings, split_lines
+from incremental_index import IncrementalIndex
+
+
+def write_lines(path, lines):
+    path.write_text("\n".join(lines) + "\n", encoding="utf-8")
+    return str(path)
+
+
+def test_chunk_revived_after_compaction(tmp_path):
+    source = tmp_path / "source.txt"
+    lines = [f"line {number}" for number in range(5)]
+    index = IncrementalIndex(
+        str(tmp_path / "index"), FakeEmbeddings(), split_lines, compact_ratio=0.1
+    )
+    index.ingest([write_lines(source, lines)])
+
+    # The edit tombstones "line 0" and compacts it out of the store.
+    edited = index.ingest([write_lines(source, ["edited line"] + lines[1:])])
+    assert edited == dict(edited, added=1, tombstoned=1)
+    assert index.manifest["tombstones"] == []
+    assert len(index.vector_store) == 5
+
+    # Reverting brings "line 0" back as a new chunk.
+    reverted = index.ingest([write_lines(source, lines)])
+    assert reverted == dict(reverted, added=1, tombstoned=1, revived=0)
+    assert len(index.vector_store) == 5
+    found = index.similarity_search("line 0", k=1)
+    assert [document.page_content for document in found] == ["line 0"]
+
+    reopened = IncrementalIndex(str(tmp_path / "index"), FakeEmbeddings(), split_lines)
+    assert reopened.live_chunks() == 5
+    found = reopened.hybrid_search("line 0", k=1)
+    assert [document.page_content for document in found] == ["line 0"]
+
+
+def test_concurrent_saves_each_get_a_version(tmp_path):
+    directory = str(tmp_path / "index")
+    source = write_lines(tmp_path / "source.txt", ["line 0", "line 1"])
+    IncrementalIndex(directory, FakeEmbeddings(), split_lines).ingest([source])
+    indexes = [
+        IncrementalIndex(directory, FakeEmbeddings(), split_lines) for _ in range(4)
+    ]
+
+    with ThreadPoolExecutor(len(indexes)) as executor:
+        list(executor.map(lambda index: index.save(), indexes))
+
+    versions = sorted(index.manifest["version"] for index in indexes)
+    assert versions == [2, 3, 4, 5]
+    reopened = IncrementalIndex(directory, FakeEmbeddings(), split_lines)
+    assert reopened.manifest["version"] == 5
+    assert reopened.live_chunks() == 2
+    assert not [name for name in os.listdir(directory) if name.endswith(".tmp")]
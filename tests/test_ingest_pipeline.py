@@ -0,0 +1,78 @@
+import pytest
+
+pytest.importorskip("langchain")
+pytest.importorskip("langchain_unstructured")
+
+from fakes import (
+    FailingEmbeddings,
+    FakeEmbeddings,
+    split_lines,
+    split_lines_unless_broken,
+)
+from incremental_index import IncrementalIndex
+from ingest_pipeline import ingest_paths
+
+
+def write_sources(directory, sources):
+    paths = []
+    for name, lines in sources.items():
+        path = directory / name
+        path.write_text("\n".join(lines) + "\n", encoding="utf-8")
+        paths.append(str(path))
+    return paths
+
+
+def contents(index, query, k=10):
+    return {document.page_content for document in index.similarity_search(query, k=k)}
+
+
+def test_pipeline_skips_documents_that_fail_to_parse(tmp_path):
+    paths = write_sources(
+        tmp_path,
+        {
+            "a.txt": ["apple one", "apple two"],
+            "broken.txt": ["never indexed"],
+            "b.txt": ["banana one", "banana two", "banana three"],
+        },
+    )
+    index = IncrementalIndex(
+        str(tmp_path / "index"), FakeEmbeddings(), split_lines_unless_broken
+    )
+
+    stats = ingest_paths(index, paths, parse_workers=2, report_every=3600)
+
+    assert stats == dict(stats, failed_sources=1, added=5)
+    assert sorted(index.manifest["sources"]) == sorted([paths[0], paths[2]])
+    reopened = IncrementalIndex(str(tmp_path / "index"), FakeEmbeddings(), split_lines)
+    assert reopened.live_chunks() == 5
+    assert "never indexed" not in contents(reopened, "never indexed")
+
+    # The broken file was not recorded, so it is parsed again next time.
+    stats = ingest_paths(reopened, paths, parse_workers=2, report_every=3600)
+    assert stats == dict(stats, skipped_sources=2, failed_sources=0, added=1)
+    assert "never indexed" in contents(reopened, "never indexed")
+
+
+def test_manifest_only_records_stored_sources(tmp_path):
+    directory = str(tmp_path / "index")
+    paths = write_sources(tmp_path, {"a.txt": ["apple one", "apple two"]})
+    ingest_paths(
+        IncrementalIndex(directory, FakeEmbeddings(), split_lines),
+        paths,
+        parse_workers=1,
+        report_every=3600,
+    )
+
+    paths += write_sources(tmp_path, {"b.txt": ["banana one", "banana two"]})
+    failing = IncrementalIndex(directory, FailingEmbeddings(), split_lines)
+    with pytest.raises(RuntimeError):
+        ingest_paths(failing, paths, parse_workers=1, report_every=3600)
+    assert sorted(failing.manifest["sources"]) == paths[:1]
+
+    embeddings = FakeEmbeddings()
+    index = IncrementalIndex(directory, embeddings, split_lines)
+    assert sorted(index.manifest["sources"]) == paths[:1]
+    stats = ingest_paths(index, paths, parse_workers=1, report_every=3600)
+    assert stats == dict(stats, skipped_sources=1, added=2)
+    assert embeddings.embedded == 2
+    assert {"banana one", "banana two"} <= contents(index, "banana")
@@ -0,0 +1,43 @@
+import pytest
+
+pytest.importorskip("langchain_core")
+
+from fakes import FakeEmbeddings, fake_vector
+from mapped_index import MappedIndex
+
+
+def make_index(texts):
+    return MappedIndex.from_embeddings(
+        [(text, fake_vector(text)) for text in texts],
+        FakeEmbeddings(),
+        ids=list(texts),
+    )
+
+
+def test_deleted_id_can_be_added_again(tmp_path):
+    index = make_index(["alpha", "beta", "gamma"])
+    index.save_local(str(tmp_path))
+    index = MappedIndex.load_local(str(tmp_path), FakeEmbeddings())
+
+    # Once from the saved rows and once from the rows added since.
+    for _ in range(2):
+        index.delete(["beta"])
+        assert len(index) == 2
+        index.add_embeddings([("beta", fake_vector("beta"))], ids=["beta"])
+        assert len(index) == 3
+
+    found = index.similarity_search("beta", k=1)
+    assert [document.page_content for document in found] == ["beta"]
+
+    index.save_local(str(tmp_path))
+    saved = MappedIndex.load_local(str(tmp_path), FakeEmbeddings())
+    assert len(saved) == 3
+
+
+def test_live_id_is_rejected():
+    index = make_index(["alpha"])
+    with pytest.raises(ValueError, match="already in the index"):
+        index.add_embeddings([("alpha", fake_vector("alpha"))], ids=["alpha"])
+    index.delete(["alpha"])
+    with pytest.raises(ValueError, match="not in the index"):
+        index.delete(["alpha"])
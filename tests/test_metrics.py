@@ -0,0 +1,40 @@
+import gc
+from concurrent.futures import ThreadPoolExecutor
+
+from metrics import MetricsCollector
+
+
+def test_shards_of_finished_threads_are_retired():
+    collector = MetricsCollector()
+
+    def record(_):
+        collector.record_call("model", 0.3, usage={"inputTokens": 2})
+
+    for _ in range(20):
+        with ThreadPoolExecutor(4) as executor:
+            list(executor.map(record, range(10)))
+    gc.collect()
+
+    assert collector._shards == []
+    assert collector.totals("bedrock_requests_total") == 200
+    assert collector.totals("bedrock_input_tokens_total") == 400
+
+
+def test_live_and_retired_shards_are_merged():
+    collector = MetricsCollector()
+    collector.record_error("model", "ThrottlingException")
+    with ThreadPoolExecutor(2) as executor:
+        executor.submit(collector.record_error, "model", "ThrottlingException")
+    gc.collect()
+
+    assert len(collector._shards) == 1
+    assert collector.totals("bedrock_throttles_total") == 2
+
+
+def test_every_throttling_code_counts_as_a_throttle():
+    collector = MetricsCollector()
+    for code in ("ThrottlingException", "TooManyRequestsException", "Unknown"):
+        collector.record_error("model", code)
+
+    assert collector.totals("bedrock_errors_total") == 3
+    assert collector.totals("bedrock_throttles_total") == 2
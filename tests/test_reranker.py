@@ -0,0 +1,69 @@
+import pytest
+
+pytest.importorskip("torch")
+pytest.importorskip("sentence_transformers")
+pytest.importorskip("langchain_core")
+
+from langchain_core.documents import Document
+
+import reranker
+from reranker import Reranker
+
+
+class FakeModel:
+    def eval(self):
+        return self
+
+
+class FakeCrossEncoder:
+    """Scores a pair by how many of the query's words the text contains."""
+
+    def __init__(self, model_name, device=None, max_length=None):
+        self.model = FakeModel()
+
+    def predict(self, pairs, batch_size=32, show_progress_bar=False, **kwargs):
+        return [
+            float(sum(word in text.split() for word in query.split()))
+            for query, text in pairs
+        ]
+
+
+@pytest.fixture
+def fake_reranker(monkeypatch):
+    monkeypatch.setattr(reranker, "CrossEncoder", FakeCrossEncoder)
+    return Reranker()
+
+
+def documents(*texts):
+    return [Document(page_content=text, metadata={}) for text in texts]
+
+
+def test_rerank_orders_by_score(fake_reranker):
+    candidates = documents(
+        "nothing relevant here",
+        "cost and reliability",
+        "cost",
+        "reliability cost security",
+    )
+    ranked = fake_reranker.rerank("cost reliability security", candidates, top_k=3)
+    assert [document.page_content for document in ranked] == [
+        "reliability cost security",
+        "cost and reliability",
+        "cost",
+    ]
+    assert [document.metadata["rerank_score"] for document in ranked] == [3, 2, 1]
+    assert all(document.metadata == {} for document in candidates)
+
+
+def test_rerank_drops_documents_below_min_score(fake_reranker):
+    candidates = documents("cost", "nothing", "cost reliability", "reliability")
+    ranked = fake_reranker.rerank(
+        "cost reliability", candidates, top_k=4, min_score=1.0
+    )
+    # "cost" and "reliability" tie, so they keep their retrieval order.
+    assert [document.page_content for document in ranked] == [
+        "cost reliability",
+        "cost",
+        "reliability",
+    ]
+    assert fake_reranker.rerank("security", candidates, min_score=1.0) == []
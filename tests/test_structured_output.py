@@ -0,0 +1,72 @@
+import pytest
+
+from structured_output import IncrementalValidator, SchemaValidationError, validate
+
+SCHEMA = {
+    "type": "object",
+    "properties": {
+        "sentiment": {"type": "string", "enum": ["positive", "negative"]},
+        "score": {"type": "number", "minimum": 0, "maximum": 1},
+        "topics": {"type": "array", "items": {"type": "string"}},
+    },
+    "required": ["sentiment", "score"],
+    "additionalProperties": False,
+}
+
+VALID = '{"sentiment": "positive", "score": 0.9, "topics": ["a, b", "{c}"]}'
+
+
+def feed_in_pieces(validator, text, size=3):
+    for start in range(0, len(text), size):
+        validator.feed(text[start : start + size])
+
+
+def test_validate_accepts_a_matching_value():
+    validate({"sentiment": "negative", "score": 0, "topics": []}, SCHEMA)
+
+
+@pytest.mark.parametrize(
+    "value, path",
+    [
+        ({"sentiment": "neutral", "score": 0.5}, "$.sentiment"),
+        ({"sentiment": "positive", "score": 2}, "$.score"),
+        ({"sentiment": "positive", "score": True}, "$.score"),
+        ({"sentiment": "positive"}, "$"),
+        ({"sentiment": "positive", "score": 0.5, "extra": 1}, "$"),
+        ({"sentiment": "positive", "score": 0.5, "topics": [1]}, "$.topics[0]"),
+    ],
+)
+def test_validate_reports_the_failing_path(value, path):
+    with pytest.raises(SchemaValidationError) as raised:
+        validate(value, SCHEMA)
+    assert raised.value.path == path
+
+
+def test_incremental_validator_returns_the_object():
+    validator = IncrementalValidator(SCHEMA)
+    feed_in_pieces(validator, VALID)
+    assert validator.fields["sentiment"] == "positive"
+    assert validator.close()["topics"] == ["a, b", "{c}"]
+
+
+def test_incremental_validator_rejects_a_field_before_the_end():
+    validator = IncrementalValidator(SCHEMA)
+    with pytest.raises(SchemaValidationError) as raised:
+        feed_in_pieces(validator, '{"sentiment": "neutral", "score": ')
+    assert raised.value.path == "$.sentiment"
+
+
+@pytest.mark.parametrize(
+    "text",
+    [
+        '["positive"]',
+        '{"sentiment": "positive", "score": 0.5',
+        '{"sentiment": "positive", "score": 0.5} x',
+        '{"sentiment": "positive", "score": 0.5,}',
+    ],
+)
+def test_incremental_validator_rejects_malformed_output(text):
+    validator = IncrementalValidator(SCHEMA)
+    with pytest.raises(SchemaValidationError):
+        feed_in_pieces(validator, text)
+        validator.close()
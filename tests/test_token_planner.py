@@ -0,0 +1,48 @@
+from functools import lru_cache
+
+import token_planner
+
+
+class WordTokenizer:
+    """Counts one token per word."""
+
+    def __call__(self, texts, add_special_tokens=False):
+        if isinstance(texts, str):
+            return {"input_ids": texts.split()}
+        return {"input_ids": [text.split() for text in texts]}
+
+
+class FakeRuntime:
+    """Reports two input tokens per word plus the message overhead."""
+
+    class meta:
+        endpoint_url = "http://fake"
+
+    def converse(self, modelId, messages, inferenceConfig):
+        words = len(messages[0]["content"][0]["text"].split())
+        tokens = 2 * words + token_planner.TOKENS_PER_MESSAGE
+        return {"usage": {"inputTokens": tokens}}
+
+
+def test_calibrate_saves_measured_factors_with_their_source(tmp_path, monkeypatch):
+    @lru_cache(maxsize=None)
+    def get_tokenizer(family):
+        name, calibration = token_planner._tokenizer_entry(family)
+        return WordTokenizer(), calibration
+
+    path = str(tmp_path / "calibration.json")
+    monkeypatch.setattr(token_planner, "get_tokenizer", get_tokenizer)
+    monkeypatch.setattr(token_planner, "CALIBRATION_PATH", path)
+
+    saved = token_planner.calibrate(
+        FakeRuntime(),
+        ["one two three", "four five"],
+        models={"meta": "meta.llama3-1-8b-instruct-v1:0"},
+        path=path,
+    )
+
+    assert saved["meta"]["factor"] == 2.0
+    assert "meta.llama3-1-8b-instruct-v1:0 over 2 texts" in saved["meta"]["source"]
+    assert token_planner.load_calibration(path) == saved
+    counts = token_planner.count_tokens(["a b c"], "meta.llama3-1-8b-instruct-v1:0")
+    assert counts == [6]